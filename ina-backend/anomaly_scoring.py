@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Any, List
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Feature order expected by network_anomaly_model.pkl
+FEATURES = ["avg_rtt", "max_rtt", "num_hops"]
+
+# Batches up to this size are scored on a thread; larger ones go to the model server's process pool
+INLINE_MAX = int(os.getenv("INA_BATCH_INLINE_MAX", "256"))
+MAX_SAMPLES = int(os.getenv("INA_BATCH_MAX_SAMPLES", "100000"))
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INA_INFERENCE_WORKERS", "2")),
+    thread_name_prefix="ina-inference"
+)
+
+
+class BatchError(ValueError):
+    """Raised for malformed or oversized batch payloads"""
+
+
+def _row(sample) -> List[float]:
+    if isinstance(sample, dict):
+        try:
+            return [sample[f] for f in FEATURES]
+        except KeyError as e:
+            raise BatchError(f"Sample is missing field {e}")
+    if isinstance(sample, (list, tuple)) and len(sample) == len(FEATURES):
+        return list(sample)
+    raise BatchError(f"Each sample must be an object with {', '.join(FEATURES)} or a 3-element array")
+
+
+def _matrix(rows) -> "np.ndarray":
+    import numpy as np
+
+    try:
+        matrix = np.asarray(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise BatchError("Sample values must be numeric")
+    if matrix.ndim != 2 or matrix.shape[1] != len(FEATURES):
+        raise BatchError(f"Expected samples with {len(FEATURES)} features")
+    if len(matrix) > MAX_SAMPLES:
+        raise BatchError(f"Batch of {len(matrix)} samples exceeds the limit of {MAX_SAMPLES}")
+    return matrix
+
+
+def parse_json_batch(payload: Any) -> "np.ndarray":
+    """Build the feature matrix from {"samples": [...]}, columnar arrays or a bare list"""
+    import numpy as np
+
+    if isinstance(payload, list):
+        return _matrix([_row(s) for s in payload])
+    if not isinstance(payload, dict):
+        raise BatchError("Batch payload must be a JSON object or array")
+    if "samples" in payload:
+        return _matrix([_row(s) for s in payload["samples"]])
+    try:
+        columns = [payload[f] for f in FEATURES]
+    except KeyError as e:
+        raise BatchError(f"Batch payload is missing column {e}")
+    if not all(isinstance(c, list) for c in columns) or len({len(c) for c in columns}) != 1:
+        raise BatchError("Feature columns must be arrays of the same length")
+    try:
+        matrix = np.empty((len(columns[0]), len(FEATURES)), dtype=np.float64)
+        for i, column in enumerate(columns):
+            matrix[:, i] = column
+    except (TypeError, ValueError):
+        raise BatchError("Sample values must be numeric")
+    return _matrix(matrix)
+
+
+def parse_ndjson_batch(body: bytes) -> "np.ndarray":
+    """Build the feature matrix from newline-delimited JSON samples"""
+    try:
+        return _matrix([_row(json.loads(line)) for line in body.splitlines() if line.strip()])
+    except json.JSONDecodeError as e:
+        raise BatchError(f"Invalid NDJSON line: {e.msg}")
+
+
+def score_matrix(model, matrix: "np.ndarray") -> Dict[str, Any]:
+    """Label and score every row with one vectorized call each"""
+    import numpy as np
+
+    if not len(matrix):
+        return {"labels": np.empty(0, dtype=int), "scores": np.empty(0)}
+    scores = model.decision_function(matrix)
+    # IsolationForest.predict is decision_function < 0 -> -1; reuse the scores
+    labels = np.where(scores < 0, -1, 1)
+    return {"labels": labels, "scores": scores}
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-sample predictions into one matrix call"""
+
+    def __init__(self, score, window_ms: float = 2.0, max_batch: int = 256):
+        self.score = score
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.pending: List[tuple] = []
+        self._timer = None
+        self.inflight = 0
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def predict(self, row: List[float]) -> tuple:
+        """Queue one sample and return its (label, score) once its batch is scored"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((row, future))
+        self.requests += 1
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[tuple]):
+        import numpy as np
+
+        self.inflight += 1
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            matrix = np.asarray([row for row, _ in batch], dtype=np.float64)
+            scored = await self.score(matrix)
+            for i, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result((int(scored["labels"][i]), float(scored["scores"][i])))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.inflight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Flush settings plus queue depth and batching efficiency"""
+        return {
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+            "queue_depth": len(self.pending),
+            "inflight_batches": self.inflight,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch
+        }
@@ -0,0 +1,475 @@
+"""Offline benchmarks for the backend hot paths, printed as JSON
+
+Nothing here touches the network: discovery runs against a stub sweeper and
+a stub ping binary, traffic parsing against generated /proc/net tables and a
+recorded-style netstat dump, ingest against a synthetic pcap, and the
+dashboard benchmark against a local uvicorn process. Keep the output of each
+release and diff the metrics to spot regressions.
+
+    python benchmark.py --quick
+    python benchmark.py --suite traffic predict --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BACKEND_DIR, "network_anomaly_model.pkl")
+SUITES = ("discovery", "traffic", "predict", "ingest", "dashboard")
+
+# Stub binaries: deterministic replies, no sockets. Hosts whose last octet ends in 1 answer ping.
+PING_STUB = """#!/bin/sh
+for host; do :; done
+octet=${host##*.}
+if [ $((octet % 10)) -eq 1 ]; then
+  echo "PING $host ($host) 56(84) bytes of data."
+  echo "64 bytes from $host: icmp_seq=1 ttl=64 time=0.412 ms"
+  echo ""
+  echo "--- $host ping statistics ---"
+  echo "1 packets transmitted, 1 received, 0% packet loss, time 0ms"
+  echo "rtt min/avg/max/mdev = 0.412/0.412/0.412/0.000 ms"
+  exit 0
+fi
+echo "PING $host ($host) 56(84) bytes of data."
+echo ""
+echo "--- $host ping statistics ---"
+echo "1 packets transmitted, 0 received, 100% packet loss, time 0ms"
+exit 1
+"""
+NETSTAT_STUB = """#!/bin/sh
+exec cat "$INA_BENCH_NETSTAT_OUTPUT"
+"""
+
+# (state code, netstat name, share of rows)
+STATE_MIX = [("01", "ESTABLISHED", 0.7), ("06", "TIME_WAIT", 0.2), ("02", "SYN_SENT", 0.05),
+             ("0A", "LISTEN", 0.05)]
+SERVICE_PORTS = [443, 80, 22, 53, 3306, 5432, 8080, 6379]
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """min/median/p90 of repeated timings in seconds"""
+    values = np.asarray(samples)
+    return {
+        "runs": len(samples),
+        "min_s": round(float(values.min()), 6),
+        "median_s": round(float(np.median(values)), 6),
+        "p90_s": round(float(np.percentile(values, 90)), 6)
+    }
+
+
+def write_stub(directory: str, name: str, body: str):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(body)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def connection_rows(count: int, distinct: int, seed: int = 7):
+    """(local ip, local port, remote ip, remote port, state index) for count synthetic sockets"""
+    rng = random.Random(seed)
+    remotes = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}" for _ in range(distinct)]
+    weights = [share for _, _, share in STATE_MIX]
+    states = rng.choices(range(len(STATE_MIX)), weights, k=count)
+    for i in range(count):
+        yield ("192.168.1.10", rng.randrange(32768, 61000), remotes[rng.randrange(distinct)],
+               SERVICE_PORTS[i % len(SERVICE_PORTS)], states[i])
+
+
+def write_proc_net(directory: str, count: int, distinct: int):
+    """A /proc/net/tcp table in the kernel's format (addresses as little-endian hex words)"""
+    os.makedirs(directory, exist_ok=True)
+    hex_ip = {}
+
+    def encode(ip):
+        if ip not in hex_ip:
+            hex_ip[ip] = socket.inet_aton(ip)[::-1].hex().upper()
+        return hex_ip[ip]
+
+    with open(os.path.join(directory, "tcp"), "w") as f:
+        f.write("  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n")
+        for i, (lip, lport, rip, rport, state) in enumerate(connection_rows(count, distinct)):
+            f.write(f"{i:6d}: {encode(lip)}:{lport:04X} {encode(rip)}:{rport:04X} {STATE_MIX[state][0]} "
+                    f"00000000:00000000 00:00000000 00000000  1000        0 {100000 + i} 1 "
+                    f"0000000000000000 20 4 30 10 -1\n")
+
+
+def write_netstat(path: str, count: int, distinct: int):
+    """netstat -tn output for the same synthetic sockets"""
+    with open(path, "w") as f:
+        f.write("Active Internet connections (w/o servers)\n")
+        f.write("Proto Recv-Q Send-Q Local Address           Foreign Address         State\n")
+        for lip, lport, rip, rport, state in connection_rows(count, distinct):
+            f.write(f"tcp        0      0 {lip}:{lport:<10} {rip}:{rport:<10} {STATE_MIX[state][1]}\n")
+
+
+def write_pcap(path: str, packets: int, seed: int = 11):
+    """Ethernet/IPv4/TCP pcap with SYN / SYN-ACK handshakes followed by data segments"""
+    rng = random.Random(seed)
+    clients = [socket.inet_aton(f"192.168.{rng.randrange(4)}.{rng.randrange(1, 255)}") for _ in range(200)]
+    servers = [socket.inet_aton(f"10.0.{rng.randrange(64)}.{rng.randrange(1, 255)}") for _ in range(500)]
+    record = struct.Struct("<IIII")
+    ts = 1_700_000_000.0
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i in range(packets):
+            # Eight packets per connection, so each SYN-ACK answers the SYN before it
+            connection, phase = divmod(i, 8)
+            if phase == 0:
+                server = servers[rng.randrange(len(servers))]
+            client = clients[connection % len(clients)]
+            sport, dport = 40000 + connection % 20000, SERVICE_PORTS[connection % len(SERVICE_PORTS)]
+            if phase == 1:  # SYN-ACK back from the server, a few hops away
+                src, dst, sport, dport, flags, ttl, payload = server, client, dport, sport, 0x12, 58, 0
+            else:
+                src, dst, flags, ttl = client, server, 0x02 if phase == 0 else 0x18, 64
+                payload = 0 if phase == 0 else rng.choice((64, 512, 1400))
+            tcp = struct.pack("!HHIIBBHHH", sport, dport, i, 0, 5 << 4, flags, 65535, 0, 0)
+            ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 40 + payload, i & 0xFFFF, 0, ttl, 6, 0, src, dst)
+            frame = b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + ip + tcp + bytes(payload)
+            ts += 0.0005 + (0.02 if phase == 1 else 0)
+            f.write(record.pack(int(ts), int(ts % 1 * 1e6), len(frame), len(frame)) + frame)
+
+
+class StubSweeper:
+    """Stands in for IcmpSweeper: every tenth host answers at once, nothing goes on the wire"""
+
+    def __init__(self, icmp: bool = True):
+        self.icmp = icmp
+
+    def available(self) -> bool:
+        return self.icmp
+
+    async def sweep(self, hosts, rate=None, timeout=None, progress=None):
+        progress = progress if progress is not None else {}
+        progress.update({"sent": 0, "answered": 0, "done": False})
+        for ip in hosts:
+            progress["sent"] += 1
+            if progress["sent"] % 256 == 0:
+                await asyncio.sleep(0)
+            if ip.endswith("1"):
+                progress["answered"] += 1
+                yield ip, 0.412
+        progress["done"] = True
+
+
+async def bench_discovery(quick: bool, workdir: str) -> List[Dict[str, Any]]:
+    from network_discovery import NetworkDiscovery
+    from reverse_dns import ReverseResolver
+
+    results = []
+    cases = [("icmp", prefix) for prefix in ((24, 22) if quick else (24, 22, 20, 18))]
+    cases += [("subprocess", prefix) for prefix in ((26,) if quick else (26, 24))]
+    for mode, prefix in cases:
+        subnet = f"10.{prefix}.0.0/{prefix}"
+        # Fresh resolver per run so every lookup misses the cache
+        resolver = ReverseResolver(lookup=lambda ip: f"host-{ip.replace('.', '-')}.bench")
+        discovery = NetworkDiscovery(sweeper=StubSweeper(icmp=mode == "icmp"), resolver=resolver)
+        log(f"discovery: {mode} sweep of {subnet}")
+        started = time.perf_counter()
+        result = await discovery.discover_network(subnet)
+        elapsed = time.perf_counter() - started
+        resolver.executor.shutdown(wait=False)
+        if "error" in result:
+            raise RuntimeError(f"discover_network failed: {result['error']}")
+        results.append({
+            "suite": "discovery",
+            "case": f"discover_network_{mode}",
+            "params": {"subnet": subnet, "hosts": result["total_hosts"]},
+            "metrics": {
+                "elapsed_s": round(elapsed, 4),
+                "hosts_per_s": round(result["total_hosts"] / elapsed, 1),
+                "discovered": result["discovered_hosts"]
+            }
+        })
+    return results
+
+
+async def bench_traffic(quick: bool, workdir: str) -> List[Dict[str, Any]]:
+    from proc_net import ProcNetCollector
+    from packet_capture import PacketCapture
+    from traffic_analysis import TrafficAnalyzer
+
+    results = []
+    sizes = (1_000, 10_000, 100_000) if quick else (1_000, 10_000, 100_000, 1_000_000)
+    for rows in sizes:
+        distinct = min(rows, 5000)
+        proc_dir = os.path.join(workdir, f"proc_net_{rows}")
+        write_proc_net(proc_dir, rows, distinct)
+        cases = [("proc_net", ProcNetCollector(proc_dir))]
+        if rows <= 100_000:
+            netstat_path = os.path.join(workdir, f"netstat_{rows}.txt")
+            write_netstat(netstat_path, rows, distinct)
+            cases.append(("netstat", ProcNetCollector(os.path.join(workdir, "no_proc_net"))))
+        for source, collector in cases:
+            if source == "netstat":
+                os.environ["INA_BENCH_NETSTAT_OUTPUT"] = netstat_path
+            analyzer = TrafficAnalyzer(collector=collector, capture=PacketCapture())
+            log(f"traffic: analyze_network_traffic over {rows} rows via {source}")
+            timings = []
+            for _ in range(max(3, min(20, 200_000 // rows))):
+                started = time.perf_counter()
+                result = await analyzer.analyze_network_traffic()
+                timings.append(time.perf_counter() - started)
+                if "error" in result:
+                    raise RuntimeError(f"analyze_network_traffic failed: {result['error']}")
+            summary = summarize(timings)
+            results.append({
+                "suite": "traffic",
+                "case": f"analyze_network_traffic_{source}",
+                "params": {"connections": rows, "distinct_remotes": distinct},
+                "metrics": {**summary, "rows_per_s": round(rows / summary["median_s"], 1)}
+            })
+    return results
+
+
+async def bench_predict(quick: bool, workdir: str) -> List[Dict[str, Any]]:
+    from anomaly_scoring import MicroBatcher
+    from model_server import ModelServer
+
+    server = ModelServer(MODEL_PATH, workers=2)
+    if not server.load():
+        raise RuntimeError(server.last_error)
+    rng = np.random.default_rng(3)
+    samples = 500 if quick else 2000
+    matrix = np.column_stack([rng.gamma(2, 10, 65536), rng.gamma(3, 15, 65536), rng.integers(1, 30, 65536)])
+    matrix = matrix.astype(np.float64)
+    results = []
+    try:
+        await server.score(matrix[:4096])  # Warm up the pool workers
+
+        log(f"predict: {samples} single-sample calls")
+        started = time.perf_counter()
+        for i in range(samples):
+            await server.score(matrix[i:i + 1])
+        elapsed = time.perf_counter() - started
+        results.append({
+            "suite": "predict",
+            "case": "single",
+            "params": {"samples": samples},
+            "metrics": {"elapsed_s": round(elapsed, 4), "samples_per_s": round(samples / elapsed, 1),
+                        "latency_ms": round(elapsed / samples * 1000, 4)}
+        })
+
+        for batch in (64, 1024, 16384) if quick else (64, 1024, 16384, 65536):
+            log(f"predict: batches of {batch}")
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                await server.score(matrix[:batch])
+                timings.append(time.perf_counter() - started)
+            summary = summarize(timings)
+            results.append({
+                "suite": "predict",
+                "case": "batched",
+                "params": {"batch": batch, "pool": batch > 256},
+                "metrics": {**summary, "samples_per_s": round(batch / summary["median_s"], 1)}
+            })
+
+        # Concurrent single-sample requests coalesced the way /predict-anomalies/ serves them
+        batcher = MicroBatcher(server.score)
+        log(f"predict: {samples * 5} concurrent micro-batched calls")
+        started = time.perf_counter()
+        await asyncio.gather(*(batcher.predict(list(row)) for row in matrix[:samples * 5]))
+        elapsed = time.perf_counter() - started
+        results.append({
+            "suite": "predict",
+            "case": "micro_batched",
+            "params": {"samples": samples * 5, "window_ms": batcher.window_ms, "max_batch": batcher.max_batch},
+            "metrics": {"elapsed_s": round(elapsed, 4), "samples_per_s": round(samples * 5 / elapsed, 1),
+                        "batches": batcher.batches, "largest_batch": batcher.largest_batch}
+        })
+    finally:
+        server.pool.shutdown(wait=False)
+    return results
+
+
+async def bench_ingest(quick: bool, workdir: str) -> List[Dict[str, Any]]:
+    from bulk_ingest import ingest_file
+
+    results = []
+    for packets in (100_000,) if quick else (100_000, 1_000_000):
+        path = os.path.join(workdir, f"bench_{packets}.pcap")
+        write_pcap(path, packets)
+        log(f"ingest: pcap with {packets} packets")
+        report = await asyncio.to_thread(ingest_file, path, None, 60.0, 10, None)
+        results.append({
+            "suite": "ingest",
+            "case": "pcap",
+            "params": {"packets": packets, "file_bytes": report["file_bytes"]},
+            "metrics": {"elapsed_s": report["elapsed_s"], "records_per_s": report["records_per_s"],
+                        "mb_per_s": report["mb_per_s"]}
+        })
+    return results
+
+
+async def _client(port: int, path: str, deadline: float, latencies: List[float], errors: List[str]):
+    """One keep-alive connection issuing requests back to back until the deadline"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(str(status))
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        errors.append(type(e).__name__)
+    finally:
+        writer.close()
+
+
+async def bench_dashboard(quick: bool, workdir: str, duration: float) -> List[Dict[str, Any]]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ,
+               INA_JOURNAL_PATH=os.path.join(workdir, "journal.db"),
+               INA_TOPOLOGY_PATH=os.path.join(workdir, "topology.json"),
+               INA_INVENTORY_PATH=os.path.join(workdir, "inventory.json"),
+               INA_INVENTORY_REFRESH_INTERVAL="0")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                               "--port", str(port), "--log-level", "warning"],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        started = time.perf_counter()
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                latencies, errors = [], []
+                await _client(port, "/dashboard/summary", 0, latencies, errors)
+                if not errors:
+                    break
+            except OSError:
+                pass
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("uvicorn did not come up within 60s")
+            await asyncio.sleep(0.2)
+        startup = time.perf_counter() - started
+
+        for clients in (1, 8, 32) if quick else (1, 8, 32, 128):
+            log(f"dashboard: {clients} concurrent clients for {duration}s")
+            latencies, errors = [], []
+            deadline = time.perf_counter() + duration
+            began = time.perf_counter()
+            await asyncio.gather(*(_client(port, "/dashboard/summary", deadline, latencies, errors)
+                                   for _ in range(clients)))
+            elapsed = time.perf_counter() - began
+            ms = np.asarray(latencies) * 1000
+            results.append({
+                "suite": "dashboard",
+                "case": "dashboard_summary",
+                "params": {"clients": clients, "duration_s": duration},
+                "metrics": {
+                    "requests": len(latencies),
+                    "rps": round(len(latencies) / elapsed, 1),
+                    "p50_ms": round(float(np.percentile(ms, 50)), 3) if len(ms) else None,
+                    "p99_ms": round(float(np.percentile(ms, 99)), 3) if len(ms) else None,
+                    "errors": len(errors),
+                    "server_ready_s": round(startup, 3)
+                }
+            })
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        commit = None
+    try:
+        import sklearn
+        sklearn_version: Optional[str] = sklearn.__version__
+    except ImportError:
+        sklearn_version = None
+    return {
+        "timestamp": time.time(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "sklearn": sklearn_version
+    }
+
+
+async def run(suites: List[str], quick: bool, duration: float) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="ina-bench-")
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir)
+    write_stub(bin_dir, "ping", PING_STUB)
+    write_stub(bin_dir, "netstat", NETSTAT_STUB)
+    # Stub binaries shadow the real ones for this process and the dashboard server
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    report = {"environment": environment(), "quick": quick, "results": [], "failed": {}}
+    try:
+        for suite in suites:
+            try:
+                if suite == "dashboard":
+                    results = await bench_dashboard(quick, workdir, duration)
+                else:
+                    results = await globals()[f"bench_{suite}"](quick, workdir)
+                report["results"].extend(results)
+            except Exception as e:
+                log(f"{suite}: failed: {e}")
+                report["failed"][suite] = str(e)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for discovery, traffic parsing, "
+                                                 "inference, ingest and the dashboard endpoint")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for CI")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per dashboard load level")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    report = asyncio.run(run(args.suite, args.quick, args.duration))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    sys.exit(1 if report["failed"] else 0)
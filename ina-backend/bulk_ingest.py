@@ -0,0 +1,387 @@
+"""Offline analytics over captured traffic: pcap/pcapng files and NetFlow/CSV flow logs
+
+Usage: python bulk_ingest.py FILE [--format pcap|csv] [--interval 60] [--top 10] [--model PATH]
+"""
+import argparse
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from anomaly_scoring import FEATURES, score_matrix
+from packet_capture import PROTOCOL_NAMES, format_address, parse_packet
+
+CHUNK_RECORDS = int(os.getenv("INA_INGEST_CHUNK_RECORDS", "200000"))
+MAX_KEYS = int(os.getenv("INA_INGEST_MAX_KEYS", "1000000"))
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6), b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9), b"\xa1\xb2\x3c\x4d": (">", 1e-9)
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+
+# Flow log column names (nfdump -o csv, softflowd/nfcapd exports, generic CSV) -> canonical name
+CSV_COLUMNS = {
+    "ts": "ts", "start": "ts", "first": "ts", "first_seen": "ts", "timestamp": "ts", "stime": "ts", "time": "ts",
+    "sa": "src", "src": "src", "src_ip": "src", "srcaddr": "src", "source": "src", "saddr": "src",
+    "da": "dst", "dst": "dst", "dst_ip": "dst", "dstaddr": "dst", "destination": "dst", "daddr": "dst",
+    "sp": "sport", "sport": "sport", "src_port": "sport", "srcport": "sport",
+    "dp": "dport", "dport": "dport", "dst_port": "dport", "dstport": "dport",
+    "pr": "protocol", "proto": "protocol", "protocol": "protocol",
+    "ibyt": "bytes", "byt": "bytes", "bytes": "bytes", "in_bytes": "bytes", "doctets": "bytes", "octets": "bytes",
+    "ipkt": "packets", "pkt": "packets", "packets": "packets", "in_pkts": "packets", "dpkts": "packets", "pkts": "packets"
+}
+
+# SYN-ACK TTLs are counted down from the nearest common initial value
+INITIAL_TTLS = (32, 64, 128, 255)
+
+
+class IngestError(ValueError):
+    """Raised for unreadable or unsupported capture files"""
+
+
+def detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic in PCAP_MAGIC:
+        return "pcap"
+    if magic == PCAPNG_MAGIC:
+        return "pcapng"
+    return "csv"
+
+
+class IngestAggregator:
+    """Chunked group-by of flow records into top hosts, protocol mix and an interval time series"""
+
+    def __init__(self, interval: float = 60.0, top: int = 10, max_keys: int = MAX_KEYS,
+                 address: Callable[[Any], str] = str):
+        self.interval = interval
+        self.top = top
+        self.max_keys = max_keys
+        self.address = address
+        self.sources: Dict[Any, np.ndarray] = {}
+        self.destinations: Dict[Any, np.ndarray] = {}
+        self.ports: Dict[Any, np.ndarray] = {}
+        self.protocols: Dict[Any, np.ndarray] = {}
+        self.buckets: Dict[int, np.ndarray] = {}
+        self.records = 0
+        self.untimed = 0
+        self.total_bytes = 0
+        self.total_packets = 0
+        self.approximate = False
+
+    def _fold(self, table: Dict[Any, np.ndarray], grouped: pd.DataFrame):
+        for key, values in zip(grouped.index, grouped.to_numpy()):
+            entry = table.get(key)
+            if entry is None:
+                table[key] = values.copy()
+            else:
+                entry += values
+        if len(table) > self.max_keys:
+            # Keep memory bounded on scans with millions of distinct hosts
+            keep = heapq.nlargest(self.max_keys // 2, table.items(), key=lambda item: item[1][0])
+            table.clear()
+            table.update(keep)
+            self.approximate = True
+
+    def add(self, frame: pd.DataFrame):
+        """Fold a chunk with ts, src, dst, dport, protocol, bytes and packets columns"""
+        if frame.empty:
+            return
+        counters = ["bytes", "packets"]
+        self.records += len(frame)
+        self.total_bytes += int(frame["bytes"].sum())
+        self.total_packets += int(frame["packets"].sum())
+        self._fold(self.sources, frame.groupby("src", sort=False)[counters].sum())
+        self._fold(self.destinations, frame.groupby("dst", sort=False)[counters].sum())
+        self._fold(self.ports, frame.groupby(["protocol", "dport"], sort=False)[counters].sum())
+        self._fold(self.protocols, frame.groupby("protocol", sort=False)[counters].sum())
+        # Records without a usable timestamp count everywhere but the time series
+        timed = frame["ts"].notna()
+        self.untimed += int((~timed).sum())
+        buckets = (frame.loc[timed, "ts"] // self.interval).astype(np.int64)
+        self._fold(self.buckets, frame.loc[timed, counters].groupby(buckets, sort=False).sum())
+
+    def _top(self, table: Dict[Any, np.ndarray]) -> List[tuple]:
+        return heapq.nlargest(self.top, table.items(), key=lambda item: item[1][0])
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "untimed_records": self.untimed,
+            "interval": self.interval,
+            "approximate": self.approximate,
+            "totals": {"bytes": self.total_bytes, "packets": self.total_packets},
+            "protocols": [{"name": k, "bytes": int(v[0]), "packets": int(v[1])}
+                          for k, v in sorted(self.protocols.items(), key=lambda item: -item[1][0])],
+            "topSources": [{"ip": self.address(k), "bytes": int(v[0]), "packets": int(v[1])}
+                           for k, v in self._top(self.sources)],
+            "topDestinations": [{"ip": self.address(k), "bytes": int(v[0]), "packets": int(v[1])}
+                                for k, v in self._top(self.destinations)],
+            "topPorts": [{"protocol": k[0], "port": int(k[1]), "bytes": int(v[0]), "packets": int(v[1])}
+                         for k, v in self._top(self.ports)],
+            "timeseries": [{"start": k * self.interval, "bytes": int(v[0]), "packets": int(v[1])}
+                           for k, v in sorted(self.buckets.items())]
+        }
+
+
+class HandshakeTracker:
+    """Per-server TCP handshake RTT and hop count (from the SYN-ACK TTL), the model's feature set"""
+
+    def __init__(self, max_pending: int = 100000):
+        self.max_pending = max_pending
+        self.pending: Dict[tuple, float] = {}
+        # server -> [count, rtt sum, rtt max, hops]
+        self.servers: Dict[bytes, List[float]] = {}
+
+    def observe(self, src: bytes, dst: bytes, sport: int, dport: int, ttl: int, flags: int, ts: float):
+        syn, ack = flags & 0x02, flags & 0x10
+        if syn and not ack:
+            if len(self.pending) >= self.max_pending:
+                self.pending.clear()
+            self.pending[(src, sport, dst, dport)] = ts
+        elif syn and ack:
+            sent = self.pending.pop((dst, dport, src, sport), None)
+            if sent is None:
+                return
+            rtt = (ts - sent) * 1000
+            hops = next(t for t in INITIAL_TTLS if t >= ttl) - ttl + 1
+            entry = self.servers.get(src)
+            if entry is None:
+                self.servers[src] = [1, rtt, rtt, hops]
+            else:
+                entry[0] += 1
+                entry[1] += rtt
+                entry[2] = max(entry[2], rtt)
+                entry[3] = hops
+
+    def features(self):
+        """(servers, matrix of [avg_rtt, max_rtt, num_hops])"""
+        servers = list(self.servers)
+        matrix = np.array([[e[1] / e[0], e[2], e[3]] for e in self.servers.values()], dtype=np.float64)
+        return servers, matrix.reshape(-1, len(FEATURES))
+
+
+def score_rows(model, labels: List[str], matrix: np.ndarray, top: int) -> Dict[str, Any]:
+    """Score feature rows with the anomaly model and keep the most anomalous"""
+    scored = score_matrix(model, matrix)
+    worst = np.argsort(scored["scores"])[:top]
+    return {
+        "features": FEATURES,
+        "scored": int(len(matrix)),
+        "anomalous": int((scored["labels"] == -1).sum()),
+        "top": [{
+            "target": labels[i],
+            **{f: float(matrix[i, j]) for j, f in enumerate(FEATURES)},
+            "score": float(scored["scores"][i]),
+            "label": int(scored["labels"][i])
+        } for i in worst]
+    }
+
+
+def _pcap_records(path: str):
+    """Yield (linktype, ts, wire length, frame) from a pcap (mmap) or pcapng (scapy reader) file"""
+    fmt = detect_format(path)
+    if fmt == "pcapng":
+        from scapy.utils import RawPcapNgReader
+
+        reader = RawPcapNgReader(path)
+        try:
+            for data, meta in reader:
+                yield meta.linktype, ((meta.tshigh << 32) + meta.tslow) / meta.tsresol, meta.wirelen, data
+        finally:
+            reader.close()
+        return
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 24:
+            raise IngestError("Truncated pcap header")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if buf[:4] not in PCAP_MAGIC:
+                raise IngestError("Not a pcap file")
+            endian, resolution = PCAP_MAGIC[buf[:4]]
+            linktype, = struct.unpack_from(endian + "I", buf, 20)
+            record = struct.Struct(endian + "IIII")
+            offset, size = 24, len(buf)
+            while offset + 16 <= size:
+                sec, frac, caplen, wirelen = record.unpack_from(buf, offset)
+                offset += 16
+                # Headers only: the link, IP and transport headers fit in the first 128 bytes
+                yield linktype, sec + frac * resolution, wirelen, buf[offset:offset + min(caplen, 128)]
+                offset += caplen
+
+
+def ingest_pcap(path: str, interval: float = 60.0, top: int = 10, model=None) -> Dict[str, Any]:
+    """Aggregate a pcap/pcapng file in fixed-size chunks"""
+    aggregator = IngestAggregator(interval, top, address=format_address)
+    handshakes = HandshakeTracker()
+    columns = {"ts": [], "src": [], "dst": [], "dport": [], "protocol": [], "bytes": []}
+    non_ip = 0
+
+    def flush():
+        frame = pd.DataFrame(columns)
+        frame["packets"] = 1
+        frame["protocol"] = frame["protocol"].map(lambda p: PROTOCOL_NAMES.get(p, str(p)))
+        aggregator.add(frame)
+        for values in columns.values():
+            values.clear()
+
+    for linktype, ts, wirelen, data in _pcap_records(path):
+        fields = parse_packet(data, linktype)
+        if fields is None:
+            non_ip += 1
+            continue
+        protocol, src, dst, sport, dport, ttl, flags = fields
+        columns["ts"].append(ts)
+        columns["src"].append(src)
+        columns["dst"].append(dst)
+        columns["dport"].append(dport)
+        columns["protocol"].append(protocol)
+        columns["bytes"].append(wirelen)
+        if flags & 0x02:
+            handshakes.observe(src, dst, sport, dport, ttl, flags, ts)
+        if len(columns["ts"]) >= CHUNK_RECORDS:
+            flush()
+    flush()
+
+    result = aggregator.result()
+    result["non_ip_packets"] = non_ip
+    result["anomalies"] = None
+    servers, matrix = handshakes.features()
+    if model is not None and len(matrix):
+        result["anomalies"] = {"source": "tcp-handshakes",
+                               **score_rows(model, [format_address(s) for s in servers], matrix, top)}
+    return result
+
+
+def _csv_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Normalize a flow-log chunk to the aggregator's columns"""
+    chunk = chunk.rename(columns=lambda c: CSV_COLUMNS.get(str(c).strip().lower(), str(c).strip().lower()))
+    if "src" not in chunk or "dst" not in chunk:
+        raise IngestError("Flow log needs source and destination address columns")
+    frame = pd.DataFrame({
+        "src": chunk["src"].astype(str).str.strip(),
+        "dst": chunk["dst"].astype(str).str.strip(),
+        "dport": pd.to_numeric(chunk["dport"], errors="coerce").fillna(0).astype(np.int64) if "dport" in chunk else 0,
+        "bytes": pd.to_numeric(chunk["bytes"], errors="coerce").fillna(0).astype(np.int64) if "bytes" in chunk else 0,
+        "packets": pd.to_numeric(chunk["packets"], errors="coerce").fillna(1).astype(np.int64) if "packets" in chunk else 1
+    })
+    if "protocol" in chunk:
+        protocol = chunk["protocol"].astype(str).str.strip().str.upper()
+        numeric = pd.to_numeric(protocol, errors="coerce")
+        frame["protocol"] = numeric.map(lambda p: PROTOCOL_NAMES.get(int(p), str(int(p))), na_action="ignore") \
+            .fillna(protocol)
+    else:
+        frame["protocol"] = "UNKNOWN"
+    if "ts" in chunk:
+        ts = pd.to_numeric(chunk["ts"], errors="coerce")
+        if ts.isna().all():
+            # Whatever resolution pandas picked; unparseable values stay NaN instead of NaT's int64 minimum
+            dt = pd.to_datetime(chunk["ts"], errors="coerce", utc=True)
+            ts = (dt - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+        elif ts.max() > 1e11:
+            ts = ts / 1000  # Epoch milliseconds
+        frame["ts"] = ts
+    else:
+        frame["ts"] = 0.0
+    for feature in FEATURES:
+        if feature in chunk:
+            frame[feature] = pd.to_numeric(chunk[feature], errors="coerce")
+    return frame
+
+
+def ingest_csv(path: str, interval: float = 60.0, top: int = 10, model=None) -> Dict[str, Any]:
+    """Aggregate a NetFlow/CSV flow log read memory-mapped in chunks"""
+    aggregator = IngestAggregator(interval, top)
+    anomalies = None
+    worst: List[tuple] = []
+    try:
+        chunks = pd.read_csv(path, chunksize=CHUNK_RECORDS, memory_map=True, skipinitialspace=True,
+                             on_bad_lines="skip")
+        for chunk in chunks:
+            frame = _csv_chunk(chunk)
+            aggregator.add(frame)
+            # Flow logs that carry the model's features are scored row by row, chunk by chunk
+            if model is not None and all(f in frame for f in FEATURES):
+                rows = frame.dropna(subset=FEATURES)
+                if rows.empty:
+                    continue
+                matrix = rows[FEATURES].to_numpy(dtype=np.float64)
+                scored = score_matrix(model, matrix)
+                anomalies = anomalies or {"source": "csv-columns", "features": FEATURES, "scored": 0, "anomalous": 0}
+                anomalies["scored"] += len(matrix)
+                anomalies["anomalous"] += int((scored["labels"] == -1).sum())
+                for i in np.argsort(scored["scores"])[:top]:
+                    entry = (-float(scored["scores"][i]), f"{rows['src'].iat[i]} -> {rows['dst'].iat[i]}",
+                             [float(v) for v in matrix[i]], int(scored["labels"][i]))
+                    if len(worst) < top:
+                        heapq.heappush(worst, entry)
+                    else:
+                        heapq.heappushpop(worst, entry)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise IngestError(f"Unreadable flow log: {str(e)}")
+
+    result = aggregator.result()
+    if anomalies is not None:
+        anomalies["top"] = [{"target": target, **dict(zip(FEATURES, values)), "score": -score, "label": label}
+                            for score, target, values, label in sorted(worst, reverse=True)]
+    result["anomalies"] = anomalies
+    return result
+
+
+def ingest_file(path: str, fmt: Optional[str] = None, interval: float = 60.0, top: int = 10,
+                model=None) -> Dict[str, Any]:
+    """Ingest a capture or flow log and report analytics plus throughput"""
+    if not os.path.exists(path):
+        raise IngestError(f"File not found: {path}")
+    if interval <= 0:
+        raise IngestError("interval must be positive")
+    fmt = fmt or detect_format(path)
+    size = os.path.getsize(path)
+    started = time.perf_counter()
+    if fmt in ("pcap", "pcapng"):
+        result = ingest_pcap(path, interval, top, model)
+    elif fmt == "csv":
+        result = ingest_csv(path, interval, top, model)
+    else:
+        raise IngestError(f"Unsupported format '{fmt}', expected pcap or csv")
+    elapsed = time.perf_counter() - started
+    result.update({
+        "format": fmt,
+        "file_bytes": size,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_s": round(result["records"] / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(size / 1e6 / elapsed, 2) if elapsed else None
+    })
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline analytics over pcap files and NetFlow/CSV flow logs")
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=["pcap", "pcapng", "csv"], help="default: detect from the file")
+    parser.add_argument("--interval", type=float, default=60.0, help="time series bucket in seconds")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--model", help="anomaly model file to score flows with")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        import joblib
+        from model_server import unpack_model, validate_model
+
+        model, _, features = unpack_model(joblib.load(args.model), args.model)
+        validate_model(model, features)
+    try:
+        report = ingest_file(args.file, args.format, args.interval, args.top, model)
+    except IngestError as e:
+        sys.exit(f"error: {e}")
+    json.dump(report, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,401 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import math
+import ssl
+import statistics
+import time
+import urllib.parse
+from collections import Counter, deque
+from contextlib import aclosing
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+
+from network_discovery import NetworkDiscovery, host_count, host_index
+
+LOCAL_WORKER = "local"
+
+
+class AgentError(Exception):
+    """An agent could not be reached or answered with an error"""
+
+
+async def http_lines(url: str, method: str = "GET", body: Optional[bytes] = None,
+                     headers: Optional[Dict[str, str]] = None,
+                     timeout: float = 10.0) -> AsyncIterator[bytes]:
+    """Minimal streaming HTTP/1.1 client: yield the response body line by line
+
+    timeout bounds the connect and every read, so a stalled agent fails fast.
+    """
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+            timeout
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        raise AgentError(f"Cannot connect to {parts.netloc}: {str(e) or 'timed out'}")
+
+    async def read(coro):
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise AgentError(f"No data from {parts.netloc} for {timeout}s")
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise AgentError(f"Connection to {parts.netloc} lost: {str(e)}")
+
+    try:
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        request = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close",
+                   "Accept: application/x-ndjson"]
+        request += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        if body is not None:
+            request += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        writer.write(("\r\n".join(request) + "\r\n\r\n").encode() + (body or b""))
+        await read(writer.drain())
+
+        status_line = await read(reader.readline())
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise AgentError(f"Bad HTTP response from {parts.netloc}: {status_line[:80]!r}")
+        response_headers = {}
+        while True:
+            line = await read(reader.readline())
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        async def pieces():
+            if "chunked" in response_headers.get("transfer-encoding", "").lower():
+                while True:
+                    size = int((await read(reader.readline())).split(b";")[0], 16)
+                    if size == 0:
+                        return
+                    yield await read(reader.readexactly(size))
+                    await read(reader.readline())
+            else:
+                remaining = int(response_headers.get("content-length", -1))
+                while remaining:
+                    data = await read(reader.read(65536 if remaining < 0 else min(remaining, 65536)))
+                    if not data:
+                        return
+                    remaining -= len(data)
+                    yield data
+
+        if status >= 300:
+            text = b"".join([piece async for piece in pieces()])
+            raise AgentError(f"HTTP {status} from {parts.netloc}: {text[:200].decode(errors='replace')}")
+
+        buffer = b""
+        async for piece in pieces():
+            buffer += piece
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+    finally:
+        writer.close()
+
+
+class Agent:
+    """A registered INA agent process and its track record"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.registered = time.time()
+        self.last_seen = self.registered
+        self.down_until = 0.0
+        self.shards = 0
+        self.failures = 0
+        self.hosts_probed = 0
+        self.busy_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def healthy(self) -> bool:
+        return time.time() >= self.down_until
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy(),
+            "registered": self.registered,
+            "last_seen": self.last_seen,
+            "shards": self.shards,
+            "failures": self.failures,
+            "hosts_per_s": round(self.hosts_probed / self.busy_seconds, 1) if self.busy_seconds else None,
+            "last_error": self.last_error
+        }
+
+
+class _Shard:
+    def __init__(self, index: int, first: int, count: int):
+        self.index = index
+        self.first = first
+        self.count = count
+        self.attempts = 0
+        self.running: Dict[str, asyncio.Task] = {}  # worker -> attempt
+        self.started = 0.0
+        self.probed = 0
+        self.done = False
+
+
+class DiscoveryCoordinator:
+    """Splits a subnet sweep into shards and farms them out to agent processes over HTTP
+
+    Agents pull shards from a shared queue one at a time, so faster agents take
+    more of the work; each agent sweeps `pipeline` shards at once at a matching
+    fraction of the rate, so one shard's reply timeout overlaps the next one's
+    probes. A failed shard is retried on another agent; once the queue
+    is empty, idle agents re-run shards that are taking much longer than the
+    median and the first copy to finish wins. Hosts stream back as each agent
+    reports them. Without healthy agents the sweep runs locally.
+    """
+
+    # Same result assembly as a local sweep, over the distributed event stream
+    discover_network = NetworkDiscovery.discover_network
+
+    def __init__(self, local, agents: Tuple[str, ...] = (), token: Optional[str] = None,
+                 shard_hosts: int = 256, pipeline: int = 2, retries: int = 2, read_timeout: float = 10.0,
+                 straggler_factor: float = 2.0, cooldown: float = 30.0):
+        self.local = local
+        self.pipeline = pipeline
+        self.token = token
+        self.shard_hosts = shard_hosts
+        self.retries = retries
+        self.read_timeout = read_timeout
+        self.straggler_factor = straggler_factor
+        self.cooldown = cooldown
+        self.agents: Dict[str, Agent] = {}
+        self.runs = 0
+        self.retried = 0
+        self.speculative = 0
+        for url in agents:
+            self.register(url)
+
+    def register(self, url: str) -> Agent:
+        """Add an agent, or refresh its heartbeat if already known"""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid agent URL: {url}")
+        agent = self.agents.get(url.rstrip("/"))
+        if agent is None:
+            agent = self.agents[url.rstrip("/")] = Agent(url)
+            logging.info(f"Discovery agent registered: {agent.url}")
+        agent.last_seen = time.time()
+        return agent
+
+    def unregister(self, url: str) -> bool:
+        return self.agents.pop(url.rstrip("/"), None) is not None
+
+    def healthy(self) -> List[Agent]:
+        return [a for a in self.agents.values() if a.healthy()]
+
+    def plan(self, network) -> List[Tuple[int, int]]:
+        """(first, count) host slices: about four per agent, at least shard_hosts each"""
+        total = host_count(network)
+        size = max(self.shard_hosts, math.ceil(total / (4 * max(1, len(self.healthy())))))
+        return [(first, min(size, total - first)) for first in range(0, total, size)]
+
+    async def iter_discovery(self, subnet: str, rate: Optional[int] = None,
+                             timeout: Optional[float] = None,
+                             concurrency: Optional[int] = None,
+                             progress_interval: float = 0.5,
+                             hosts: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Same events as NetworkDiscovery.iter_discovery, plus a shard event per finished shard
+
+        Explicit host lists (inventory refreshes) are small and always probed locally.
+        """
+        network = ipaddress.ip_network(subnet)
+        shards = [_Shard(i, first, count) for i, (first, count) in enumerate(self.plan(network))]
+        if hosts is not None or not self.healthy() or len(shards) < 2:
+            async for event in self.local.iter_discovery(subnet, rate, timeout, concurrency, progress_interval,
+                                                         hosts=hosts):
+                yield event
+            return
+
+        self.runs += 1
+        logging.info(f"Distributing discovery of {subnet} as {len(shards)} shards over {len(self.healthy())} agents")
+        if rate is not None:
+            rate = math.ceil(rate / self.pipeline)
+        params = {k: v for k, v in (("rate", rate), ("timeout", timeout), ("concurrency", concurrency))
+                  if v is not None}
+        events: asyncio.Queue = asyncio.Queue()
+        pending = deque(shards)
+        durations: List[float] = []
+        seen = set()
+        failed = 0
+
+        def busy() -> Counter:
+            return Counter(worker for s in shards for worker in s.running)
+
+        def launch(worker: str, shard: _Shard):
+            shard.attempts += 1
+            shard.started = shard.started or time.monotonic()
+            shard.running[worker] = asyncio.create_task(self._attempt(worker, subnet, shard, params, events))
+
+        def dispatch():
+            load = busy()
+            idle = [a.url for a in self.healthy() for _ in range(self.pipeline - load[a.url])]
+            while pending and idle:
+                launch(idle.pop(), pending.popleft())
+            if not idle:
+                return
+            # Nothing left to hand out: re-run stragglers on idle agents
+            median = statistics.median(durations) if durations else None
+            now = time.monotonic()
+            for shard in shards:
+                spare = [url for url in idle if url not in shard.running]
+                if shard.done or len(shard.running) != 1 or median is None or not spare:
+                    continue
+                if now - shard.started > self.straggler_factor * median:
+                    self.speculative += 1
+                    idle.remove(spare[-1])
+                    launch(spare[-1], shard)
+
+        def progress_event(name: str) -> Dict[str, Any]:
+            return {
+                "event": name,
+                "subnet": subnet,
+                "total_hosts": host_count(network),
+                "probed": sum(s.probed for s in shards),
+                "discovered_hosts": len(seen),
+                "shards": len(shards),
+                "shards_done": sum(s.done for s in shards),
+                "agents": len(self.healthy())
+            }
+
+        try:
+            yield progress_event("start")
+            dispatch()
+            while any(s.running for s in shards) or pending:
+                try:
+                    kind, worker, shard, payload = await asyncio.wait_for(events.get(), progress_interval)
+                except asyncio.TimeoutError:
+                    dispatch()
+                    yield progress_event("progress")
+                    continue
+
+                if kind == "host":
+                    if payload["ip"] not in seen:
+                        seen.add(payload["ip"])
+                        yield {"event": "host", "device": payload}
+                elif kind == "progress":
+                    shard.probed = max(shard.probed, payload)
+                elif kind == "done":
+                    shard.running.pop(worker, None)
+                    if not shard.done:
+                        shard.done = True
+                        shard.probed = shard.count
+                        durations.append(time.monotonic() - shard.started)
+                        for task in shard.running.values():
+                            task.cancel()
+                        shard.running.clear()
+                        yield {"event": "shard", "subnet": subnet, "shard": shard.index, "first": shard.first,
+                               "count": shard.count, "worker": worker, "attempts": shard.attempts}
+                elif kind == "failed":
+                    shard.running.pop(worker, None)
+                    if worker in self.agents:
+                        agent = self.agents[worker]
+                        agent.failures += 1
+                        agent.last_error = payload
+                        agent.down_until = time.time() + self.cooldown
+                    logging.error(f"Discovery shard {shard.index} failed on {worker}: {payload}")
+                    if not shard.done and not shard.running:
+                        if shard.attempts <= self.retries and self.healthy():
+                            self.retried += 1
+                            pending.appendleft(shard)
+                        elif worker != LOCAL_WORKER:
+                            # Out of agents or retries: sweep it here
+                            launch(LOCAL_WORKER, shard)
+                        else:
+                            failed += 1
+                            shard.done = True
+                dispatch()
+                if not self.healthy() and pending and LOCAL_WORKER not in busy():
+                    launch(LOCAL_WORKER, pending.popleft())
+
+            if failed:
+                logging.error(f"Discovery of {subnet}: {failed} shards could not be swept")
+            yield progress_event("done")
+        finally:
+            for shard in shards:
+                for task in shard.running.values():
+                    task.cancel()
+
+    async def _attempt(self, worker: str, subnet: str, shard: _Shard, params: Dict[str, Any],
+                       events: asyncio.Queue):
+        """Sweep one shard on one worker, forwarding its events to the coordinator's queue"""
+        started = time.monotonic()
+        network = ipaddress.ip_network(subnet)
+        try:
+            if worker == LOCAL_WORKER:
+                stream = self.local.iter_discovery(subnet, params.get("rate"), params.get("timeout"),
+                                                   params.get("concurrency"), shard=(shard.first, shard.count))
+            else:
+                query = urllib.parse.urlencode({"first": shard.first, "count": shard.count, **params})
+                stream = http_lines(f"{worker}/agent/discover/{subnet}?{query}",
+                                    headers={"X-INA-Token": self.token} if self.token else None,
+                                    timeout=self.read_timeout)
+            # Close the agent connection (or local sweep) promptly when a faster copy wins
+            async with aclosing(stream):
+                async for event in stream:
+                    if isinstance(event, bytes):
+                        event = json.loads(event)
+                    if event["event"] == "host":
+                        # Only addresses from the slice this worker was asked to sweep
+                        index = host_index(network, event["device"].get("ip"))
+                        if index is None or not shard.first <= index < shard.first + shard.count:
+                            logging.warning(f"Dropping host {event['device'].get('ip')} outside shard "
+                                            f"{shard.index} of {subnet} from {worker}")
+                            continue
+                        events.put_nowait(("host", worker, shard, event["device"]))
+                    elif event["event"] == "progress":
+                        events.put_nowait(("progress", worker, shard, event.get("probed", 0)))
+                    elif event["event"] == "error":
+                        raise AgentError(event.get("error", "agent error"))
+                    elif event["event"] == "done":
+                        if worker in self.agents:
+                            agent = self.agents[worker]
+                            agent.shards += 1
+                            agent.hosts_probed += shard.count
+                            agent.busy_seconds += time.monotonic() - started
+                            agent.last_seen = time.time()
+                        events.put_nowait(("done", worker, shard, None))
+                        return
+            raise AgentError("Stream ended before the shard finished")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            events.put_nowait(("failed", worker, shard, str(e)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": [a.to_dict() for a in self.agents.values()],
+            "healthy": len(self.healthy()),
+            "shard_hosts": self.shard_hosts,
+            "pipeline": self.pipeline,
+            "retries": self.retries,
+            "runs": self.runs,
+            "retried_shards": self.retried,
+            "speculative_shards": self.speculative
+        }
+
+
+async def register_with_coordinator(coordinator_url: str, agent_url: str, token: Optional[str] = None,
+                                    interval: float = 30.0):
+    """Agent side: announce this process to the coordinator and keep re-announcing as a heartbeat"""
+    headers = {"X-INA-Token": token} if token else None
+    body = json.dumps({"url": agent_url}).encode()
+    while True:
+        try:
+            async for _ in http_lines(f"{coordinator_url.rstrip('/')}/cluster/agents", "POST", body, headers):
+                pass
+        except AgentError as e:
+            logging.error(f"Agent registration error: {str(e)}")
+        await asyncio.sleep(interval)
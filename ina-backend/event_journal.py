@@ -0,0 +1,305 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    source TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_type_ts ON events (type, ts);
+CREATE INDEX IF NOT EXISTS events_source_ts ON events (source, ts);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    severity TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_ts ON alerts (ts);
+CREATE INDEX IF NOT EXISTS alerts_severity_ts ON alerts (severity, ts);
+CREATE INDEX IF NOT EXISTS alerts_source_ts ON alerts (source, ts);
+"""
+
+MAX_PAGE_SIZE = 1000
+SEVERITIES = ("critical", "high", "medium", "low")
+
+
+def format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def event_row(row: Tuple) -> Dict[str, Any]:
+    id_, ts, type_, source, message = row
+    return {"id": id_, "timestamp": format_time(ts), "type": type_, "source": source, "event": message}
+
+
+def alert_row(row: Tuple) -> Dict[str, Any]:
+    id_, ts, severity, title, description, source, status = row
+    return {
+        "id": f"ALERT-{id_}",
+        "timestamp": format_time(ts),
+        "severity": severity,
+        "title": title,
+        "description": description,
+        "source": source,
+        "status": status
+    }
+
+
+def build_filter(filters: Dict[str, Any], start: Optional[float], end: Optional[float],
+                 before: Optional[int]) -> Tuple[str, List[Any]]:
+    """WHERE clause over indexed columns plus an id cursor for keyset pagination"""
+    clauses, params = [], []
+    for column, value in filters.items():
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if start is not None:
+        clauses.append("ts >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("ts <= ?")
+        params.append(end)
+    if before is not None:
+        clauses.append("id < ?")
+        params.append(before)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class EventJournal:
+    """Append-only SQLite (WAL) journal of events and security alerts
+
+    Events are queued and written in batches by a background thread, so a
+    request never waits on disk; reads flush the queue first. Alerts are
+    written immediately. Row totals and alerts per severity are counted once
+    at startup and kept current on every append and prune, so unfiltered
+    counts never scan a table. Rows older than max_age seconds or beyond the
+    newest max_rows per table are pruned every prune_interval (0 disables either).
+    """
+
+    def __init__(self, path: str, max_age: float = 0.0, max_rows: int = 0, flush_interval: float = 0.5,
+                 batch_size: int = 500, prune_interval: float = 300.0):
+        self.path = path
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.prune_interval = prune_interval
+        self.lock = threading.Lock()  # Guards the connection
+        self.count_lock = threading.Lock()  # Guards the counters, never held across I/O
+        self.conn = self._connect()
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+            self.totals = {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                           for table in ("events", "alerts")}
+            self.severity_counts = dict.fromkeys(SEVERITIES, 0)
+            self.severity_counts.update(self.conn.execute("SELECT severity, COUNT(*) FROM alerts GROUP BY severity"))
+        self._queue: deque = deque()
+        self._wake = threading.Event()
+        self.batches = 0
+        self.pruned = {"events": 0, "alerts": 0}
+        self.last_prune = 0.0
+        self._writer = threading.Thread(target=self._write_forever, name="ina-journal", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _write_forever(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if (self.max_age or self.max_rows) and time.time() - self.last_prune >= self.prune_interval:
+                    self.prune()
+            except Exception as e:
+                logging.error(f"Journal write error: {str(e)}")
+
+    def append_event(self, message: str, type_: str, source: str = "System", ts: Optional[float] = None):
+        """Queue a log event for the next batch write"""
+        self._queue.append((ts if ts is not None else time.time(), type_, source, message))
+        with self.count_lock:
+            self.totals["events"] += 1
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write every queued event in one transaction and return how many there were"""
+        # Drained under the connection lock, so a reader that flushes sees every earlier append
+        with self.lock:
+            rows = []
+            while self._queue:
+                rows.append(self._queue.popleft())
+            if not rows:
+                return 0
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT INTO events (ts, type, source, message) VALUES (?, ?, ?, ?)", rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.batches += 1
+        return len(rows)
+
+    def prune(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Delete rows past the age or row limits and return how many went from each table"""
+        now = time.time() if now is None else now
+        removed = {}
+        with self.lock:
+            for table in ("events", "alerts"):
+                removed[table] = 0
+                if self.max_age:
+                    removed[table] += self.conn.execute(
+                        f"DELETE FROM {table} WHERE ts < ?", (now - self.max_age,)
+                    ).rowcount
+                if self.max_rows:
+                    removed[table] += self.conn.execute(
+                        f"DELETE FROM {table} WHERE id <= (SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (self.max_rows,)
+                    ).rowcount
+            severity_counts = None
+            if removed["alerts"]:
+                severity_counts = dict.fromkeys(SEVERITIES, 0)
+                severity_counts.update(self.conn.execute("SELECT severity, COUNT(*) FROM alerts GROUP BY severity"))
+            with self.count_lock:
+                for table, count in removed.items():
+                    self.totals[table] -= count
+                    self.pruned[table] += count
+                if severity_counts is not None:
+                    self.severity_counts = severity_counts
+        self.last_prune = now
+        return removed
+
+    def append_alert(self, severity: str, title: str, description: str, source: str = "System",
+                     status: str = "new", ts: Optional[float] = None) -> Dict[str, Any]:
+        """Append a security alert and return it in API format"""
+        ts = ts if ts is not None else time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO alerts (ts, severity, title, description, source, status) VALUES (?, ?, ?, ?, ?, ?)",
+                (ts, severity, title, description, source, status)
+            )
+            with self.count_lock:
+                self.totals["alerts"] += 1
+                self.severity_counts[severity] = self.severity_counts.get(severity, 0) + 1
+        return alert_row((cursor.lastrowid, ts, severity, title, description, source, status))
+
+    def _page(self, table: str, columns: str, filters: Dict[str, Any], start, end, before,
+              limit: int) -> List[Tuple]:
+        self.flush()
+        where, params = build_filter(filters, start, end, before)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT {columns} FROM {table}{where} ORDER BY id DESC LIMIT ?", params + [limit]
+            ).fetchall()
+
+    def events(self, type_: Optional[str] = None, source: Optional[str] = None,
+               start: Optional[float] = None, end: Optional[float] = None,
+               before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        """Newest-first page of events; pass next_before back as before for the next page"""
+        rows = self._page("events", "id, ts, type, source, message",
+                          {"type": type_, "source": source}, start, end, before, limit)
+        return {
+            "logs": [event_row(r) for r in reversed(rows)],
+            "next_before": rows[-1][0] if len(rows) == max(1, min(limit, MAX_PAGE_SIZE)) else None
+        }
+
+    def alerts(self, severity: Optional[str] = None, source: Optional[str] = None,
+               start: Optional[float] = None, end: Optional[float] = None,
+               before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        """Newest-first page of alerts; pass next_before back as before for the next page"""
+        rows = self._page("alerts", "id, ts, severity, title, description, source, status",
+                          {"severity": severity, "source": source}, start, end, before, limit)
+        return {
+            "alerts": [alert_row(r) for r in reversed(rows)],
+            "next_before": rows[-1][0] if len(rows) == max(1, min(limit, MAX_PAGE_SIZE)) else None
+        }
+
+    def count(self, table: str, start: Optional[float] = None, end: Optional[float] = None, **filters) -> int:
+        """Rows matching the filters; unfiltered and severity-only alert counts come from the counters"""
+        active = {column: value for column, value in filters.items() if value is not None}
+        if start is None and end is None:
+            with self.count_lock:
+                if not active:
+                    return self.totals[table]
+                if table == "alerts" and list(active) == ["severity"]:
+                    return self.severity_counts.get(active["severity"], 0)
+        self.flush()
+        where, params = build_filter(active, start, end, None)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+    def alert_counts(self) -> Dict[str, int]:
+        """Alerts per severity, kept current on every append"""
+        with self.count_lock:
+            return dict(self.severity_counts)
+
+    def recent_events(self, n: int = 5) -> List[Dict[str, Any]]:
+        """Latest n events, oldest first"""
+        return self.events(limit=n)["logs"]
+
+    def export(self, table: str, filters: Dict[str, Any], start: Optional[float] = None,
+               end: Optional[float] = None, chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Stream every matching row oldest-first on a private read connection"""
+        if table == "events":
+            columns, to_dict = "id, ts, type, source, message", event_row
+        else:
+            columns, to_dict = "id, ts, severity, title, description, source, status", alert_row
+        self.flush()
+        where, params = build_filter(filters, start, end, None)
+        # WAL lets this reader run alongside the writer without holding the lock
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f"SELECT {columns} FROM {table}{where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield to_dict(row)
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Report journal location and size"""
+        return {
+            "path": self.path,
+            "events": self.count("events"),
+            "alerts": self.count("alerts"),
+            "queued_events": len(self._queue),
+            "batches": self.batches,
+            "pruned": dict(self.pruned),
+            "max_age_days": self.max_age / 86400,
+            "max_rows": self.max_rows,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+
+# Create instance
+event_journal = EventJournal(
+    os.getenv(
+        "INA_JOURNAL_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ina_journal.db")
+    ),
+    max_age=float(os.getenv("INA_JOURNAL_MAX_AGE_DAYS", "90")) * 86400,
+    max_rows=int(os.getenv("INA_JOURNAL_MAX_ROWS", "1000000"))
+)
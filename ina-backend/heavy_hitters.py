@@ -0,0 +1,224 @@
+import hashlib
+import heapq
+import math
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Any, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_MASK64 = (1 << 64) - 1
+
+
+def hash_key(key: Any) -> int:
+    """Stable 128-bit hash shared by every sketch (Python's hash() is not mixed for ints)"""
+    data = key if isinstance(key, bytes) else str(key).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), "little")
+
+
+class CountMinSketch:
+    """Fixed-size frequency estimates; never under-counts, over-counts by at most e/width of the total"""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        import numpy as np
+
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth)
+
+    def _columns(self, hashes: Iterable[int]) -> "np.ndarray":
+        import numpy as np
+
+        # Kirsch-Mitzenmacher: depth indices from two 64-bit halves of one hash
+        h = np.array([[(x & _MASK64), (x >> 64) | 1] for x in hashes], dtype=np.uint64).reshape(-1, 2)
+        return ((h[:, :1] + self._rows.astype(np.uint64) * h[:, 1:]) % np.uint64(self.width)).astype(np.int64)
+
+    def add_many(self, hashes: List[int], counts: List[int]):
+        import numpy as np
+
+        if not hashes:
+            return
+        columns = self._columns(hashes)
+        np.add.at(self.table, (np.broadcast_to(self._rows, columns.shape), columns),
+                  np.asarray(counts, dtype=np.int64)[:, None])
+
+    def estimate_many(self, hashes: List[int], table: Optional["np.ndarray"] = None) -> "np.ndarray":
+        import numpy as np
+
+        if not hashes:
+            return np.empty(0, dtype=np.int64)
+        table = self.table if table is None else table
+        return table[self._rows, self._columns(hashes)].min(axis=1)
+
+    @property
+    def error(self) -> float:
+        """Per-estimate over-count bound as a fraction of the total"""
+        return math.e / self.width
+
+
+class SpaceSaving:
+    """Top-k candidates in k counters (Metwally et al.); a new key evicts the smallest"""
+
+    def __init__(self, k: int = 50):
+        self.k = k
+        self.counters: Dict[Any, List[int]] = {}  # key -> [count, error]
+        self._heap: List[Tuple[int, Any]] = []
+
+    def _minimum(self) -> Tuple[int, Any]:
+        # Lazy heap: skip entries whose count has since grown
+        while True:
+            count, key = self._heap[0]
+            entry = self.counters.get(key)
+            if entry is not None and entry[0] == count:
+                return count, key
+            heapq.heappop(self._heap)
+
+    def add(self, key: Any, count: int):
+        entry = self.counters.get(key)
+        if entry is not None:
+            entry[0] += count
+        elif len(self.counters) < self.k:
+            entry = self.counters[key] = [count, 0]
+        else:
+            floor, victim = self._minimum()
+            heapq.heappop(self._heap)
+            del self.counters[victim]
+            entry = self.counters[key] = [floor + count, floor]
+        heapq.heappush(self._heap, (entry[0], key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(c, k) for k, (c, _) in self.counters.items()]
+            heapq.heapify(self._heap)
+
+
+class HyperLogLog:
+    """Distinct count in 2^precision one-byte registers, about 1.04/sqrt(2^precision) relative error"""
+
+    def __init__(self, precision: int = 12):
+        import numpy as np
+
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_many(self, hashes: List[int]):
+        import numpy as np
+
+        if not hashes:
+            return
+        p = self.precision
+        h = np.array([x & _MASK64 for x in hashes], dtype=np.uint64)
+        index = (h >> np.uint64(64 - p)).astype(np.int64)
+        rest = (h << np.uint64(p)) | np.uint64(1 << (p - 1))  # Sentinel bit caps the rank
+        # Rank = leading zeros + 1 of the remaining bits
+        rank = (64 - np.floor(np.log2(rest.astype(np.float64))).astype(np.int64)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    @staticmethod
+    def count(registers: "np.ndarray") -> int:
+        import numpy as np
+
+        m = len(registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class _Pane:
+    def __init__(self, index: int, width: int, depth: int, k: int, precision: int):
+        self.index = index
+        self.cms = CountMinSketch(width, depth)
+        self.top = SpaceSaving(k)
+        self.hll = HyperLogLog(precision)
+        self.total = 0
+        self.samples = 0
+
+
+class WindowedHeavyHitters:
+    """Top-k, frequency and distinct count over a sliding window of fixed-memory panes
+
+    The window is split into panes that each hold a Count-Min sketch, a
+    Space-Saving summary and a HyperLogLog; old panes are dropped whole, so
+    memory is the same for ten keys or ten million.
+    """
+
+    def __init__(self, window: float = 300.0, panes: int = 10, k: int = 50, width: int = 2048,
+                 depth: int = 4, precision: int = 12):
+        self.window = window
+        self.pane_seconds = window / panes
+        self.panes_kept = panes
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.precision = precision
+        self.lock = threading.Lock()
+        self.panes: deque = deque()
+
+    def _pane(self, now: float) -> _Pane:
+        index = int(now // self.pane_seconds)
+        if not self.panes or self.panes[-1].index != index:
+            self.panes.append(_Pane(index, self.width, self.depth, self.k, self.precision))
+        while self.panes[0].index <= index - self.panes_kept:
+            self.panes.popleft()
+        return self.panes[-1]
+
+    def update(self, counts: Dict[Any, int], now: Optional[float] = None):
+        """Add one sample of key -> count"""
+        now = time.time() if now is None else now
+        keys = list(counts)
+        hashes = [hash_key(k) for k in keys]
+        values = [counts[k] for k in keys]
+        with self.lock:
+            pane = self._pane(now)
+            pane.cms.add_many(hashes, values)
+            pane.hll.add_many(hashes)
+            for key, value in zip(keys, values):
+                pane.top.add(key, value)
+            pane.total += sum(values)
+            pane.samples += 1
+
+    def query(self, n: int = 10, now: Optional[float] = None) -> Dict[str, Any]:
+        """The n heaviest keys in the window with CMS counts, error bound, share and distinct count"""
+        import numpy as np
+
+        now = time.time() if now is None else now
+        with self.lock:
+            oldest = int(now // self.pane_seconds) - self.panes_kept
+            panes = [p for p in self.panes if p.index > oldest]
+            if not panes:
+                return {"window": self.window, "samples": 0, "total": 0, "distinct": 0, "error": 0, "top": []}
+            total = sum(p.total for p in panes)
+            samples = sum(p.samples for p in panes)
+            table = np.sum([p.cms.table for p in panes], axis=0)
+            registers = np.max([p.hll.registers for p in panes], axis=0)
+            candidates = list({key for p in panes for key in p.top.counters})
+        estimates = panes[0].cms.estimate_many([hash_key(k) for k in candidates], table)
+        error = panes[0].cms.error * total
+        top = heapq.nlargest(n, zip(candidates, estimates.tolist()), key=lambda item: item[1])
+        return {
+            "window": self.window,
+            "samples": samples,
+            "total": total,
+            "distinct": HyperLogLog.count(registers),
+            "error": round(error, 1),
+            "top": [{
+                "key": key,
+                "count": count,
+                "value": round(count / samples, 2),  # Mean per sample
+                "share": round(count / total, 4) if total else 0.0
+            } for key, count in top]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        per_pane = self.depth * self.width * 8 + (1 << self.precision) + self.k * 64
+        return {
+            "window": self.window,
+            "panes": len(self.panes),
+            "k": self.k,
+            "cms": [self.depth, self.width],
+            "hll_precision": self.precision,
+            "approx_bytes": per_pane * (self.panes_kept + 1)
+        }
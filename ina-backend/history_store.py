@@ -0,0 +1,310 @@
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+# (name, bucket width in seconds, number of slots); width 0 keeps every sample
+DEFAULT_TIERS = [
+    ("raw", 0, 720),
+    ("1m", 60, 2 * 24 * 60),
+    ("1h", 3600, 60 * 24),
+]
+
+# Per-target probe RTTs (about 19 KB a series): last 120 probes, 3 hours by minute, a week by hour
+PROBE_TIERS = [
+    ("raw", 0, 120),
+    ("1m", 60, 180),
+    ("1h", 3600, 7 * 24),
+]
+
+AGGREGATIONS = ("avg", "sum", "min", "max", "count")
+
+
+class Tier:
+    """Fixed-capacity ring buffer of (timestamp, count, sum, min, max) buckets"""
+
+    def __init__(self, name: str, width: float, capacity: int):
+        self.name = name
+        self.width = width
+        self.capacity = capacity
+        self.ts = array("d", bytes(8 * capacity))
+        self.count = array("d", bytes(8 * capacity))
+        self.sum = array("d", bytes(8 * capacity))
+        self.min = array("d", bytes(8 * capacity))
+        self.max = array("d", bytes(8 * capacity))
+        self.head = 0  # slot of the next write
+        self.size = 0
+
+    def add(self, ts: float, value: float):
+        if self.width:
+            bucket = ts - ts % self.width
+            last = (self.head - 1) % self.capacity
+            if self.size and self.ts[last] == bucket:
+                # Merge into the open bucket
+                self.count[last] += 1
+                self.sum[last] += value
+                self.min[last] = min(self.min[last], value)
+                self.max[last] = max(self.max[last], value)
+                return
+            ts = bucket
+        slot = self.head
+        self.ts[slot] = ts
+        self.count[slot] = 1
+        self.sum[slot] = value
+        self.min[slot] = value
+        self.max[slot] = value
+        self.head = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def oldest(self) -> Optional[float]:
+        if not self.size:
+            return None
+        return self.ts[(self.head - self.size) % self.capacity]
+
+    def _ordered(self, column: array) -> List[float]:
+        """Column values from oldest to newest"""
+        start = (self.head - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            return column[start:start + self.size].tolist()
+        return column[start:].tolist() + column[:self.head].tolist()
+
+    def range(self, start: float, end: float) -> List[Tuple[float, float, float, float, float]]:
+        """Buckets with start <= timestamp <= end as (ts, count, sum, min, max)"""
+        ts = self._ordered(self.ts)
+        lo, hi = bisect_left(ts, start), bisect_right(ts, end)
+        columns = [self._ordered(c)[lo:hi] for c in (self.count, self.sum, self.min, self.max)]
+        return list(zip(ts[lo:hi], *columns))
+
+    def columns(self) -> List[array]:
+        """ts, count, sum, min and max from oldest to newest"""
+        return [array("d", self._ordered(c)) for c in (self.ts, self.count, self.sum, self.min, self.max)]
+
+    def restore(self, columns: List[array]):
+        """Refill the ring from columns(), oldest first"""
+        size = min(len(columns[0]), self.capacity)
+        for target, column in zip((self.ts, self.count, self.sum, self.min, self.max), columns):
+            target[:size] = column[len(column) - size:]
+        self.head = size % self.capacity
+        self.size = size
+
+
+class Series:
+    """One metric kept at several retention tiers"""
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        self.tiers = [Tier(name, width, capacity) for name, width, capacity in tiers]
+        self.last_ts = 0.0
+
+    def add(self, ts: float, value: float):
+        if ts < self.last_ts:
+            ts = self.last_ts  # Keep timestamps monotonic for binary search
+        self.last_ts = ts
+        for tier in self.tiers:
+            tier.add(ts, value)
+
+    def pick_tier(self, start: float, step: Optional[float]) -> Tier:
+        """Finest tier that still covers start and is no finer than the requested step"""
+        for tier in self.tiers:
+            if step and tier.width and tier.width > step:
+                break
+            # A tier that has not wrapped yet still holds the whole series
+            if tier.size and (tier.size < tier.capacity or tier.oldest() <= start):
+                return tier
+        # Nothing reaches back far enough: use the longest-retention tier with data
+        candidates = [t for t in self.tiers if t.size and (not step or not t.width or t.width <= step)]
+        return candidates[-1] if candidates else self.tiers[-1]
+
+
+class HistoryStore:
+    """Fixed-memory time-series store for traffic counters, RTTs and event counts
+
+    At max_series the least recently updated series is evicted, so one-off
+    names (pings of arbitrary hosts) cannot lock out the built-in ones.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, max_series: int = 256, path: Optional[str] = None):
+        self.tier_spec = tiers
+        self.max_series = max_series
+        self.path = path
+        # Least recently updated first
+        self.series: "OrderedDict[str, Series]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def record(self, name: str, value: float, ts: Optional[float] = None):
+        """Append a sample to the named series"""
+        ts = ts if ts is not None else time.time()
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                while len(self.series) >= self.max_series:
+                    self.series.popitem(last=False)
+                    self.evicted += 1
+                series = self.series[name] = Series(self.tier_spec)
+            else:
+                self.series.move_to_end(name)
+            series.add(ts, float(value))
+
+    def remove(self, name: str) -> bool:
+        """Drop a series and free its slot"""
+        with self.lock:
+            return self.series.pop(name, None) is not None
+
+    def names(self, prefix: str = "") -> List[str]:
+        """List recorded series names"""
+        with self.lock:
+            return sorted(n for n in self.series if n.startswith(prefix))
+
+    def query(self, name: str, start: Optional[float] = None, end: Optional[float] = None,
+              step: Optional[float] = None, agg: str = "avg") -> Dict[str, Any]:
+        """Return points between start and end, optionally re-bucketed to step seconds"""
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{agg}', expected one of {', '.join(AGGREGATIONS)}")
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - 3600
+        series = self.series.get(name)
+        if series is None:
+            raise KeyError(name)
+
+        with self.lock:
+            tier = series.pick_tier(start, step)
+            buckets = tier.range(start, end)
+
+        if step:
+            merged: Dict[float, List[float]] = {}
+            for ts, count, total, low, high in buckets:
+                key = ts - ts % step
+                slot = merged.get(key)
+                if slot is None:
+                    merged[key] = [count, total, low, high]
+                else:
+                    slot[0] += count
+                    slot[1] += total
+                    slot[2] = min(slot[2], low)
+                    slot[3] = max(slot[3], high)
+            buckets = [(ts, *values) for ts, values in sorted(merged.items())]
+
+        points = []
+        for ts, count, total, low, high in buckets:
+            value = {
+                "avg": total / count if count else 0.0,
+                "sum": total,
+                "min": low,
+                "max": high,
+                "count": count
+            }[agg]
+            points.append({"timestamp": ts, "value": value})
+
+        return {
+            "name": name,
+            "tier": tier.name,
+            "agg": agg,
+            "step": step or tier.width or None,
+            "start": start,
+            "end": end,
+            "points": points
+        }
+
+    def summary(self, name: str, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+        """Aggregate a whole range into count/sum/avg/min/max"""
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - 3600
+        series = self.series.get(name)
+        if series is None:
+            raise KeyError(name)
+        with self.lock:
+            tier = series.pick_tier(start, None)
+            buckets = tier.range(start, end)
+        count = sum(b[1] for b in buckets)
+        total = sum(b[2] for b in buckets)
+        return {
+            "name": name,
+            "tier": tier.name,
+            "start": start,
+            "end": end,
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else None,
+            "min": min((b[3] for b in buckets), default=None),
+            "max": max((b[4] for b in buckets), default=None)
+        }
+
+    def save(self):
+        """Write every series to disk so history survives restarts
+
+        One JSON header line (tier layout, names, bucket counts) followed by the
+        raw float64 columns of each tier, oldest bucket first.
+        """
+        if not self.path:
+            return
+        with self.lock:
+            header = {"tiers": [list(t) for t in self.tier_spec], "series": []}
+            columns = []
+            for name, series in self.series.items():
+                header["series"].append({"name": name, "last_ts": series.last_ts,
+                                         "sizes": [tier.size for tier in series.tiers]})
+                for tier in series.tiers:
+                    columns.extend(tier.columns())
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            for column in columns:
+                column.tofile(f)
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Restore series saved by save() (skipped if the tier layout has changed since)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                header = json.loads(f.readline())
+                if header["tiers"] != [list(t) for t in self.tier_spec]:
+                    logging.error("History load error: tier layout changed, starting empty")
+                    return
+                restored = OrderedDict()
+                for entry in header["series"]:
+                    series = Series(self.tier_spec)
+                    series.last_ts = entry["last_ts"]
+                    for tier, size in zip(series.tiers, entry["sizes"]):
+                        columns = []
+                        for _ in range(5):
+                            column = array("d")
+                            column.fromfile(f, size)
+                            columns.append(column)
+                        tier.restore(columns)
+                    restored[entry["name"]] = series
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            logging.error(f"History load error: {str(e)}")
+            return
+        with self.lock:
+            for name, series in list(restored.items())[-self.max_series:]:
+                self.series[name] = series
+
+    def stats(self) -> Dict[str, Any]:
+        """Report series count and fixed memory footprint"""
+        slots = sum(capacity for _, _, capacity in self.tier_spec)
+        return {
+            "series": len(self.series),
+            "max_series": self.max_series,
+            "evicted_series": self.evicted,
+            "tiers": [{"name": n, "width": w, "slots": c} for n, w, c in self.tier_spec],
+            "bytes_per_series": slots * 5 * 8,
+            "path": self.path
+        }
+
+
+# Create instance
+history_store = HistoryStore(
+    max_series=int(os.getenv("INA_HISTORY_MAX_SERIES", "256")),
+    path=os.getenv(
+        "INA_HISTORY_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ina_history.bin")
+    )
+)
+history_store.load()
@@ -0,0 +1,290 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional
+
+from network_discovery import host_count, host_slice
+
+PROC_NET_ARP = "/proc/net/arp"
+
+
+def read_arp_table(path: str = PROC_NET_ARP) -> Dict[str, str]:
+    """IP -> MAC from the kernel neighbour table (complete entries only)"""
+    macs = {}
+    try:
+        with open(path) as f:
+            next(f, None)  # Header
+            for line in f:
+                parts = line.split()
+                # IP address, HW type, Flags, HW address, Mask, Device
+                if len(parts) >= 4 and int(parts[2], 16) & 0x2 and parts[3] != "00:00:00:00:00:00":
+                    macs[parts[0]] = parts[3].lower()
+    except (OSError, ValueError):
+        pass  # Not Linux, or no permission
+    return macs
+
+
+class HostInventory:
+    """Per-subnet record of every host seen: last-seen, RTT, hostname and MAC
+
+    Refresh scans re-probe live hosts every live_interval and walk the dead
+    address space with a cursor so all of it is covered every dead_interval.
+    The dead interval shrinks when new hosts keep turning up there and relaxes
+    back while the subnet is quiet. Each scan is diffed against the inventory
+    into join, leave and changed events.
+    """
+
+    def __init__(self, path: Optional[str] = None, live_interval: float = 60.0,
+                 dead_interval: float = 1800.0, min_dead_interval: float = 300.0,
+                 leave_after: int = 2, stale_after: float = 7 * 86400.0):
+        self.path = path
+        self.live_interval = live_interval
+        self.dead_interval = dead_interval
+        self.min_dead_interval = min_dead_interval
+        self.leave_after = leave_after
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        # subnet -> {"hosts": {ip: host}, "cursor", "dead_interval", "last_scan", "full_scans", "scans"}
+        self.subnets: Dict[str, Dict[str, Any]] = {}
+        self._scanning: Dict[str, asyncio.Lock] = {}
+
+    def has_subnet(self, subnet: str) -> bool:
+        return subnet in self.subnets
+
+    def plan(self, subnet: str, now: Optional[float] = None) -> Optional[List[str]]:
+        """Addresses a refresh should probe now; None when the subnet needs a full sweep"""
+        state = self.subnets.get(subnet)
+        if state is None:
+            return None
+        now = time.time() if now is None else now
+        network = ipaddress.ip_network(subnet)
+        total = host_count(network)
+        with self.lock:
+            live = {ip for ip, h in state["hosts"].items() if h["status"] == "active"}
+            due = [ip for ip in live if now - state["hosts"][ip]["last_probed"] >= self.live_interval]
+            # The cursor crosses the whole range once per dead_interval; live hosts in its path are skipped
+            budget = min(total, math.ceil(total * (now - state["last_scan"]) / state["dead_interval"]))
+            if budget <= 0:
+                return due
+            cursor = state["cursor"]
+            sweep = [ip for ip in host_slice(network, cursor, budget) if ip not in live]
+            if cursor + budget > total:
+                sweep += [ip for ip in host_slice(network, 0, cursor + budget - total) if ip not in live]
+            state["cursor"] = (cursor + budget) % total
+        return due + sweep
+
+    def apply(self, subnet: str, probed: Optional[Iterable[str]], replies: Dict[str, Dict[str, Any]],
+              macs: Dict[str, str], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Fold one scan into the inventory and return its join/leave/changed events
+
+        probed is None for a full sweep of the subnet.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self.subnets.get(subnet)
+            baseline = state is None
+            if baseline:
+                state = self.subnets[subnet] = {"hosts": {}, "cursor": 0, "dead_interval": self.dead_interval,
+                                                "last_scan": now, "full_scans": 0, "scans": 0}
+            hosts = state["hosts"]
+            full = probed is None
+            probed = set(hosts) | set(replies) if full else set(probed)
+            changes = []
+            joined_dead_space = 0
+
+            for ip, device in replies.items():
+                host = hosts.get(ip)
+                # A different hostname or MAC on a known address is reported as "changed"
+                fields = {"hostname": device.get("hostname") or "", "mac": macs.get(ip)}
+                if host is None or host["status"] != "active":
+                    returning = host is not None
+                    if host is None:
+                        host = hosts[ip] = {"ip": ip, "first_seen": now, **fields}
+                    else:
+                        host.update({k: v for k, v in fields.items() if v})
+                    if not baseline:
+                        joined_dead_space += 1
+                    host.update(status="active", misses=0)
+                    changes.append({"event": "join", "subnet": subnet, "baseline": baseline,
+                                    "returning": returning, "device": host})
+                else:
+                    diff = {k: [host.get(k), v] for k, v in fields.items() if v and host.get(k) and host[k] != v}
+                    host.update({k: v for k, v in fields.items() if v})
+                    host["misses"] = 0
+                    if diff:
+                        changes.append({"event": "changed", "subnet": subnet, "changes": diff, "device": host})
+                host.update(rtt_ms=device.get("rtt_ms"), last_seen=now, last_probed=now)
+
+            for ip in probed - set(replies):
+                host = hosts.get(ip)
+                if host is None:
+                    continue
+                host["last_probed"] = now
+                if host["status"] != "active":
+                    continue
+                host["misses"] += 1
+                # One lost echo is not a departure
+                if host["misses"] >= self.leave_after:
+                    host["status"] = "inactive"
+                    changes.append({"event": "leave", "subnet": subnet, "device": host})
+
+            stale = [ip for ip, h in hosts.items()
+                     if h["status"] != "active" and now - h["last_seen"] > self.stale_after]
+            for ip in stale:
+                del hosts[ip]
+
+            # New hosts in the dead space: walk it faster; a quiet subnet relaxes back
+            if joined_dead_space:
+                state["dead_interval"] = max(self.min_dead_interval, state["dead_interval"] / 2)
+            else:
+                state["dead_interval"] = min(self.dead_interval, state["dead_interval"] * 1.25)
+            state["last_scan"] = now
+            state["scans"] += 1
+            state["full_scans"] += full
+            return [dict(c, device=dict(c["device"])) for c in changes]
+
+    def devices(self, subnet: str, include_inactive: bool = False) -> List[Dict[str, Any]]:
+        """Active (or all known) hosts of a subnet in discovery result format, sorted by address"""
+        with self.lock:
+            hosts = self.subnets.get(subnet, {}).get("hosts", {})
+            devices = [{
+                "ip": h["ip"], "hostname": h["hostname"], "status": h["status"], "rtt_ms": h["rtt_ms"],
+                "mac": h["mac"], "first_seen": h["first_seen"], "last_seen": h["last_seen"]
+            } for h in hosts.values() if include_inactive or h["status"] == "active"]
+        return sorted(devices, key=lambda d: ipaddress.ip_address(d["ip"]))
+
+    def host(self, ip: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            for state in self.subnets.values():
+                if ip in state["hosts"]:
+                    return dict(state["hosts"][ip])
+        return None
+
+    async def iter_refresh(self, discovery, subnet: str, full: bool = False, rate: Optional[int] = None,
+                           timeout: Optional[float] = None,
+                           concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Scan what is due (everything on first use or with full) and yield discovery plus diff events"""
+        network = ipaddress.ip_network(subnet)
+        lock = self._scanning.setdefault(subnet, asyncio.Lock())
+        async with lock:
+            now = time.time()
+            hosts = None if full else self.plan(subnet, now)
+            mode = "full" if hosts is None else "refresh"
+            replies = {}
+            yield {"event": "start", "subnet": subnet, "mode": mode, "total_hosts": host_count(network),
+                   "probed": 0, "discovered_hosts": 0}
+            # A refresh only probes what is due; known live hosts that aren't are reported from the inventory
+            emitted = set()
+            if hosts is not None:
+                due = set(hosts)
+                for device in self.devices(subnet):
+                    if device["ip"] not in due:
+                        emitted.add(device["ip"])
+                        yield {"event": "host", "device": device}
+            if hosts is None or hosts:
+                async for event in discovery.iter_discovery(subnet, rate=rate, timeout=timeout,
+                                                            concurrency=concurrency, hosts=hosts):
+                    if event["event"] == "host":
+                        replies[event["device"]["ip"]] = event["device"]
+                        emitted.add(event["device"]["ip"])
+                    if event["event"] not in ("start", "done"):
+                        yield event
+
+            macs = await asyncio.to_thread(read_arp_table)
+            changes = self.apply(subnet, hosts, replies, macs, now)
+            devices = self.devices(subnet)
+            # Due hosts that missed a single echo are still active
+            for device in devices:
+                if device["ip"] not in emitted:
+                    yield {"event": "host", "device": device}
+            for change in changes:
+                yield dict(change)
+            yield {
+                "event": "done",
+                "subnet": subnet,
+                "mode": mode,
+                "total_hosts": host_count(network),
+                "probed": host_count(network) if hosts is None else len(hosts),
+                "discovered_hosts": len(devices),
+                "joined": sum(c["event"] == "join" for c in changes),
+                "left": sum(c["event"] == "leave" for c in changes),
+                "changed": sum(c["event"] == "changed" for c in changes),
+                "next_dead_space_pass": round(self.subnets[subnet]["dead_interval"]),
+                "devices": devices
+            }
+
+    async def refresh(self, discovery, subnet: str, full: bool = False, rate: Optional[int] = None,
+                      timeout: Optional[float] = None, concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Run iter_refresh to completion and return the subnet's devices plus the diff"""
+        try:
+            changes = []
+            summary = {}
+            async for event in self.iter_refresh(discovery, subnet, full, rate, timeout, concurrency):
+                if event["event"] in ("join", "leave", "changed"):
+                    changes.append(event)
+                elif event["event"] == "done":
+                    summary = event
+            summary.pop("event")
+            return {**summary, "devices": self.devices(subnet), "changes": changes}
+        except Exception as e:
+            logging.error(f"Network discovery error: {str(e)}")
+            return {"error": str(e)}
+
+    def save(self):
+        """Write the inventory to disk so it survives restarts"""
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.subnets)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Restore an inventory saved by save()"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Inventory load error: {str(e)}")
+            return
+        with self.lock:
+            self.subnets.update(data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "subnets": {
+                    subnet: {
+                        "active": sum(h["status"] == "active" for h in state["hosts"].values()),
+                        "known": len(state["hosts"]),
+                        "scans": state["scans"],
+                        "full_scans": state["full_scans"],
+                        "dead_interval": round(state["dead_interval"]),
+                        "last_scan": state["last_scan"]
+                    } for subnet, state in self.subnets.items()
+                },
+                "live_interval": self.live_interval,
+                "path": self.path
+            }
+
+
+# Create instance
+host_inventory = HostInventory(
+    path=os.getenv(
+        "INA_INVENTORY_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ina_inventory.json")
+    ),
+    live_interval=float(os.getenv("INA_INVENTORY_LIVE_INTERVAL", "60")),
+    dead_interval=float(os.getenv("INA_INVENTORY_DEAD_INTERVAL", "1800")),
+    leave_after=int(os.getenv("INA_INVENTORY_LEAVE_AFTER", "2"))
+)
+host_inventory.load()
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+from contextlib import aclosing
+from typing import Dict, Any, AsyncIterator, Iterable, Optional, Tuple
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+PAYLOAD = b"INA-sweep-probe!"
+
+
+def icmp_checksum(data: bytes) -> int:
+    """Internet checksum (RFC 1071) over an ICMP message"""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(ident: int, seq: int) -> bytes:
+    """Build an ICMP echo request packet"""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = icmp_checksum(header + PAYLOAD)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + PAYLOAD
+
+
+class IcmpUnavailable(Exception):
+    """Raised when neither raw nor unprivileged ICMP sockets can be opened"""
+
+
+class IcmpSweeper:
+    """Sends ICMP echo requests and matches replies on a single shared socket
+
+    Each sweep is paced to its own rate, and all sweeps together to max_rate.
+    """
+
+    def __init__(self, rate: int = 2000, timeout: float = 1.0, max_rate: int = 5000):
+        self.rate = rate
+        self.timeout = timeout
+        self.max_rate = max_rate
+        # Earliest time the next batch may go out under max_rate, shared by concurrent sweeps
+        self._budget_at = 0.0
+        self.sock: Optional[socket.socket] = None
+        self.raw = False
+        self.ident = os.getpid() & 0xFFFF
+        self._seq = 0
+        self._available: Optional[bool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (ip, seq) -> (send time, queue awaiting the reply)
+        self._pending: Dict[Tuple[str, int], Tuple[float, asyncio.Queue]] = {}
+
+    def available(self) -> bool:
+        """Check (once) whether ICMP sockets can be opened in this process"""
+        if self._available is None:
+            try:
+                self._open_socket().close()
+                self._available = True
+            except IcmpUnavailable as e:
+                logging.info(f"ICMP sweeper unavailable, using ping subprocesses: {e}")
+                self._available = False
+        return self._available
+
+    def _open_socket(self) -> socket.socket:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+        except PermissionError:
+            # Unprivileged ping sockets (net.ipv4.ping_group_range)
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+                self.raw = False
+            except OSError as e:
+                raise IcmpUnavailable(str(e))
+        except OSError as e:
+            raise IcmpUnavailable(str(e))
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        return sock
+
+    def _ensure_socket(self) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        if self.sock is not None and self._loop is not loop:
+            # Socket was registered with a previous event loop
+            self.sock.close()
+            self.sock = None
+        if self.sock is None:
+            self.sock = self._open_socket()
+            self._loop = loop
+            loop.add_reader(self.sock.fileno(), self._on_readable)
+        return self.sock
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xFFFF
+        return self._seq
+
+    def _on_readable(self):
+        """Drain every queued reply and hand it to the waiting sweep"""
+        while True:
+            try:
+                packet, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.error(f"ICMP receive error: {str(e)}")
+                return
+
+            received = time.monotonic()
+            if self.raw:
+                packet = packet[(packet[0] & 0x0F) * 4:]
+            if len(packet) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", packet[:8])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # The kernel rewrites the identifier on unprivileged sockets
+            if self.raw and ident != self.ident:
+                continue
+
+            entry = self._pending.pop((addr[0], seq), None)
+            if entry:
+                sent, queue = entry
+                queue.put_nowait((addr[0], (received - sent) * 1000))
+
+    async def sweep(self, hosts: Iterable[str], rate: Optional[int] = None,
+                    timeout: Optional[float] = None,
+                    progress: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[str, float]]:
+        """Probe hosts at a paced rate and yield (ip, rtt_ms) as replies arrive
+
+        If given, progress is updated in place with sent/answered counts.
+        """
+        rate = max(1, min(rate or self.rate, self.max_rate))
+        timeout = timeout or self.timeout
+        sock = self._ensure_socket()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        keys = []
+        progress = progress if progress is not None else {}
+        progress.update({"sent": 0, "answered": 0, "done": False})
+
+        async def send_all():
+            batch = max(1, rate // 100)
+            started = time.monotonic()
+            attempted = 0
+            for ip in hosts:
+                seq = self._next_seq()
+                key = (ip, seq)
+                self._pending[key] = (time.monotonic(), queue)
+                keys.append(key)
+                try:
+                    await loop.sock_sendto(sock, build_echo_request(self.ident, seq), (ip, 0))
+                    progress["sent"] += 1
+                except OSError as e:
+                    self._pending.pop(key, None)
+                    logging.debug(f"ICMP send to {ip} failed: {str(e)}")
+                attempted += 1
+                if attempted % batch == 0:
+                    # Pace to this sweep's rate, then take the batch's share of the global budget
+                    now = time.monotonic()
+                    slot = max(self._budget_at, now)
+                    self._budget_at = slot + batch / self.max_rate
+                    delay = max(started + attempted / rate, slot) - now
+                    await asyncio.sleep(max(0, delay))
+            progress["done"] = True
+            if progress["answered"] < progress["sent"]:
+                await asyncio.sleep(timeout)
+            queue.put_nowait(None)
+
+        sender = asyncio.create_task(send_all())
+        try:
+            while True:
+                reply = await queue.get()
+                if reply is None:
+                    break
+                progress["answered"] += 1
+                yield reply
+                if progress["done"] and progress["answered"] >= progress["sent"]:
+                    break
+        finally:
+            sender.cancel()
+            for key in keys:
+                self._pending.pop(key, None)
+
+    async def ping(self, ip: str, timeout: Optional[float] = None) -> Optional[float]:
+        """Probe a single host, returning the RTT in ms or None on timeout"""
+        async with aclosing(self.sweep([ip], timeout=timeout)) as replies:
+            async for _, rtt in replies:
+                return rtt
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Report sweeper configuration and socket mode"""
+        return {
+            "available": self.available(),
+            "mode": ("raw" if self.raw else "datagram") if self.sock else None,
+            "rate": self.rate,
+            "max_rate": self.max_rate,
+            "timeout": self.timeout,
+            "pending": len(self._pending)
+        }
+
+
+# Create instance
+icmp_sweeper = IcmpSweeper(
+    rate=int(os.getenv("INA_ICMP_RATE", "2000")),
+    timeout=float(os.getenv("INA_ICMP_TIMEOUT", "1.0")),
+    max_rate=int(os.getenv("INA_ICMP_MAX_RATE", "5000"))
+)
@@ -1,18 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 
 import os
 import subprocess
-import joblib
-import numpy as np
 import logging
 from datetime import datetime
 import asyncio
 import ipaddress
 import platform
 import json
+import tempfile
+import time
 
 # Import modules with robust error handling
 try:
@@ -21,7 +22,7 @@ except Exception as e:
     print(f"Error importing network_discovery: {e}")
     # Define mock network_discovery
     class NetworkDiscovery:
-        async def discover_network(self, subnet):
+        async def discover_network(self, subnet, **kwargs):
             return {
                 "subnet": subnet,
                 "discovered_hosts": 5,
@@ -32,6 +33,15 @@ except Exception as e:
                 ]
             }
         
+        async def iter_discovery(self, subnet, **kwargs):
+            result = await self.discover_network(subnet)
+            yield {"event": "start", "subnet": subnet, "total_hosts": result["total_hosts"],
+                   "probed": 0, "discovered_hosts": 0}
+            for device in result["devices"]:
+                yield {"event": "host", "device": device}
+            yield {"event": "done", "subnet": subnet, "total_hosts": result["total_hosts"],
+                   "probed": result["total_hosts"], "discovered_hosts": len(result["devices"])}
+
         async def check_host(self, ip):
             return {"ip": ip, "hostname": f"device-{ip}", "status": "active"}
     
@@ -54,12 +64,25 @@ except Exception as e:
     traffic_analyzer = TrafficAnalyzer()
     print("Using mock traffic_analyzer module")
 
+from traffic_sampler import TrafficSampler
+
+# Shared traffic snapshot, refreshed in the background for all dashboard clients
+traffic_sampler = TrafficSampler(
+    traffic_analyzer,
+    interval=float(os.getenv("INA_TRAFFIC_SAMPLE_INTERVAL", "5"))
+)
+
+from profiling import ProfilerBusy, profiler, prometheus_text
+from fast_json import FastJSONResponse, dumps as dump_json
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Intelligent Network Analyzer (INA) API",
     description="Advanced network monitoring and diagnostic platform",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+started_at = time.time()  # Reported as uptime by /ready
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -78,63 +101,453 @@ class AnomalyInput(BaseModel):
     max_rtt: float
     num_hops: int
 
-# In-memory log storage
-logs = []
-alerts = []
-performance_data = []
+# Persistent log and alert storage (SQLite journal, survives restarts)
+from event_journal import event_journal
+from anomaly_scoring import BatchError, MicroBatcher, parse_json_batch, parse_ndjson_batch
+from model_server import ModelServer
+from history_store import history_store
+from online_detector import OnlineDetector, parse_ping_output, parse_traceroute_output
+from probe_scheduler import PROBE_KINDS, ProbeScheduler
+from path_tracer import format_trace, path_tracer
+from icmp_sweep import IcmpUnavailable
+from topology_graph import LOCAL_ID, topology_graph
+from packet_capture import packet_capture
+from discovery_cluster import DiscoveryCoordinator, register_with_coordinator
+from host_inventory import host_inventory
+from port_scanner import TOP_TCP_PORTS, TOP_UDP_PORTS, parse_ports, port_scanner
+from performance_metrics import RequestTimer, metrics_collector
+
+# Every request's latency lands in a per-route histogram
+app.add_middleware(RequestTimer, collector=metrics_collector)
 
 # Helper: Get current time
 def get_current_time():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 # Helper: Update logs
-def update_historical_logs(event):
-    timestamp = get_current_time()
-    logs.append({"timestamp": timestamp, "event": event})
-    
-    # Also add to performance data for trending
-    performance_data.append({
-        "timestamp": timestamp,
-        "event_type": event.split(" ")[0],  # First word as event type
-        "count": 1
-    })
+def update_historical_logs(event, source="System"):
+    event_type = event.split(" ")[0].rstrip(":").lower()  # First word as event type
+    event_journal.append_event(event, event_type, source)
     
-    # Limit log size
-    if len(logs) > 100:
-        logs.pop(0)
-    if len(performance_data) > 200:
-        performance_data.pop(0)
+    # Also count the event in the time-series store for trending
+    history_store.record(f"events.{event_type}", 1)
 
 # Helper: Run command asynchronously
 async def run_command(command):
-    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-    stdout, stderr = await process.communicate()
+    with profiler.span(f"subprocess.{command[0]}"):
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
     return process.returncode, stdout.decode(), stderr.decode()
 
+# Helper: Platform-specific traceroute command (fallback when raw sockets are unavailable)
+def traceroute_command(host):
+    if platform.system().lower() == "windows":
+        return ["tracert", host]
+    return ["traceroute", "-n", host]  # Linux/Mac
+
+# Helper: Run the traceroute binary, yielding the same start/hop/done events as path_tracer.trace_iter
+async def traceroute_command_events(host):
+    command = traceroute_command(host)
+    yield {"event": "start", "destination": host, "max_hops": None, "cached": False}
+    lines = []
+    with profiler.span(f"subprocess.{command[0]}"):
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        try:
+            # Each hop line is printed as soon as that TTL is done
+            async for line in process.stdout:
+                lines.append(line.decode(errors="ignore"))
+                for hop in parse_traceroute_output(lines[-1])["hops"]:
+                    yield {"event": "hop", "hop": hop}
+            stderr = (await process.stderr.read()).decode(errors="ignore")
+            returncode = await process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"Traceroute failed: {stderr.strip()}")
+    yield {"event": "done", "destination": host, **parse_traceroute_output("".join(lines)), "cached": False}
+
+# Helper: Resolve a client-named file inside the directory env_var allows (disabled when unset)
+def resolve_server_file(name, env_var):
+    root = os.getenv(env_var)
+    if not root:
+        raise HTTPException(status_code=403, detail=f"Server-side files are disabled; set {env_var} to allow a directory")
+    root = os.path.realpath(root)
+    # realpath first, so neither ../ nor a symlink can leave the directory
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(status_code=403, detail=f"{name} is outside {env_var}")
+    return path
+
 # Helper: Create a security alert
 def create_security_alert(severity, title, description, source=None):
-    alert_id = len(alerts) + 1
-    alert = {
-        "id": f"ALERT-{alert_id}",
-        "timestamp": get_current_time(),
-        "severity": severity,  # critical, high, medium, low
-        "title": title,
-        "description": description,
-        "source": source or "System",
-        "status": "new"
-    }
-    alerts.append(alert)
-    update_historical_logs(f"Security alert: {title} ({severity})")
-    
-    # Limit alerts size
-    if len(alerts) > 100:
-        alerts.pop(0)
+    alert = event_journal.append_alert(
+        severity,  # critical, high, medium, low
+        title,
+        description,
+        source or "System"
+    )
+    update_historical_logs(f"Security alert: {title} ({severity})", source or "System")
     
     return alert
 
+# Helper: Alert when a scan finds many devices without hostnames
+def check_unknown_devices(subnet, unknown_count):
+    if unknown_count > 3:  # More than 3 unknown devices could be suspicious
+        create_security_alert(
+            "medium",
+            "Multiple Unknown Devices Detected",
+            f"Found {unknown_count} devices without hostnames on subnet {subnet}",
+            "Network Discovery"
+        )
+
+# Helper: Log and alert on the inventory diff of a discovery scan
+def check_device_changes(subnet, changes):
+    joined = [c for c in changes if c["event"] == "join"]
+    left = [c for c in changes if c["event"] == "leave"]
+    changed = [c for c in changes if c["event"] == "changed"]
+    if not changes:
+        return
+    if joined and joined[0]["baseline"]:
+        # First sweep of the subnet: everything is new, nothing is a change
+        check_unknown_devices(subnet, sum(1 for c in joined if not c["device"]["hostname"]))
+        return
+    update_historical_logs(f"Network inventory change on {subnet}: {len(joined)} joined, "
+                           f"{len(left)} left, {len(changed)} changed")
+
+    new = [c["device"] for c in joined if not c["returning"]]
+    if len(new) > 5:
+        create_security_alert(
+            "medium",
+            "Multiple New Devices Detected",
+            f"{len(new)} new devices joined {subnet}: {', '.join(d['ip'] for d in new[:5])}, ...",
+            "Network Discovery"
+        )
+    else:
+        for device in new:
+            create_security_alert(
+                "medium",
+                "New Device Detected",
+                f"{device['ip']} ({device['hostname'] or 'no hostname'}, MAC {device['mac'] or 'unknown'}) "
+                f"joined {subnet}",
+                "Network Discovery"
+            )
+    for change in changed:
+        if "mac" in change["changes"]:
+            old, new_mac = change["changes"]["mac"]
+            create_security_alert(
+                "high",
+                "Device MAC Address Changed",
+                f"{change['device']['ip']} on {subnet} moved from MAC {old} to {new_mac} "
+                f"(device swap or ARP spoofing)",
+                "Network Discovery"
+            )
+
+# Helper: Format a Server-Sent Event
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Heavy-hitter alert thresholds: mean connections per sample, and distinct peers, over the sketch window
+HEAVY_HITTER_CONNECTIONS = float(os.getenv("INA_HEAVY_HITTER_CONNECTIONS", "50"))
+DISTINCT_DESTINATIONS_ALERT = int(os.getenv("INA_DISTINCT_DESTINATIONS_ALERT", "1000"))
+# alert key -> time raised, so a sustained heavy hitter alerts once per window
+heavy_hitter_alerts = {}
+
+# Helper: Alert on sustained heavy hitters and destination fan-out (runs once per traffic sample)
+def check_traffic_sources(result):
+    windows = result.get("heavyHitters")
+    if not windows:
+        return
+    now = time.time()
+    window = windows["sources"]["window"]
+    for key in [k for k, raised in heavy_hitter_alerts.items() if now - raised > window]:
+        del heavy_hitter_alerts[key]
+
+    for dimension, direction in (("sources", "from"), ("destinations", "to")):
+        for entry in windows[dimension]["top"]:
+            key = f"{dimension}:{entry['ip']}"
+            if entry["value"] <= HEAVY_HITTER_CONNECTIONS or key in heavy_hitter_alerts:
+                continue
+            heavy_hitter_alerts[key] = now
+            create_security_alert(
+                "medium",
+                "High Volume Traffic Source" if dimension == "sources" else "High Volume Traffic Destination",
+                f"Sustained high traffic {direction} {entry['ip']}: {entry['value']} connections on average "
+                f"over {window:.0f}s ({entry['share']:.0%} of all connections)",
+                "Traffic Analysis"
+            )
+
+    distinct = windows["destinations"]["distinct"]
+    if distinct > DISTINCT_DESTINATIONS_ALERT and "fanout" not in heavy_hitter_alerts:
+        heavy_hitter_alerts["fanout"] = now
+        create_security_alert(
+            "high",
+            "Destination Fan-out Surge",
+            f"Connections to about {distinct} distinct destinations in {window:.0f}s; possible scan or NAT burst",
+            "Traffic Analysis"
+        )
+
+# Helper: Record traffic counters for trend history (runs once per traffic sample)
+def record_traffic_history(result):
+    for protocol in result.get("protocols", []):
+        history_store.record(f"traffic.{protocol['name'].lower()}", protocol["value"])
+    for state, count in result.get("states", {}).get("TCP", {}).items():
+        history_store.record(f"traffic.tcp.{state.lower()}", count)
+    if result.get("capture", {}).get("running"):
+        history_store.record("traffic.bps", result["capture"]["bandwidth"]["bps"])
+        history_store.record("traffic.pps", result["capture"]["bandwidth"]["pps"])
+
+traffic_sampler.add_listener(check_traffic_sources)
+traffic_sampler.add_listener(record_traffic_history)
+
+# Per-host streaming detector fed by every ping/traceroute measurement
+online_detector = OnlineDetector(
+    alert=create_security_alert,
+    z_threshold=float(os.getenv("INA_ONLINE_Z_THRESHOLD", "4")),
+    loss_threshold=float(os.getenv("INA_ONLINE_LOSS_THRESHOLD", "50"))
+)
+
+# Helper: Score a ping measurement online and record it (scheduled probes keep their own history)
+async def assess_ping(host, metrics, record=True):
+    assessment = online_detector.observe_ping(host, metrics)
+    if metrics["avg_rtt"] is not None:
+        if record:
+            history_store.record(f"rtt.{host}", metrics["avg_rtt"])
+        # The model needs the hop count, known once the host has been tracerouted
+        hops = assessment["baseline"]["hops"]
+        if hops and model_server.model is not None:
+            label, score = await anomaly_batcher.predict([metrics["avg_rtt"], metrics["max_rtt"], hops])
+            assessment["model"] = {"label": label, "score": score}
+    return assessment
+
+# Continuous probing of monitored targets, shared concurrency and global rate limit
+probe_scheduler = ProbeScheduler(
+    concurrency=int(os.getenv("INA_PROBE_CONCURRENCY", "200")),
+    rate=float(os.getenv("INA_PROBE_RATE", "500")),
+    timeout=float(os.getenv("INA_PROBE_TIMEOUT", "2")),
+    jitter=float(os.getenv("INA_PROBE_JITTER", "0.1")),
+    min_interval=float(os.getenv("INA_PROBE_MIN_INTERVAL", "1")),
+    max_targets=int(os.getenv("INA_PROBE_MAX_TARGETS", "10000")),
+    resolve_ttl=float(os.getenv("INA_PROBE_RESOLVE_TTL", "300"))
+)
+
+# Helper: Feed each scheduled ICMP result into the topology and the online detector
+async def record_probe_result(target, result):
+    if target.kind == "icmp":
+        rtt = result["rtt_ms"]
+        topology_graph.observe_rtt(target.host, rtt)
+        await assess_ping(target.host, {
+            "avg_rtt": rtt,
+            "max_rtt": rtt,
+            "loss_percent": 0.0 if result["ok"] else 100.0
+        }, record=False)
+
+probe_scheduler.add_listener(record_probe_result)
+
+# Every fresh traceroute extends the topology graph
+path_tracer.add_listener(topology_graph.merge_path)
+
+# Helper: Dashboard summary fields for /performance/metrics (runs once per metrics sample)
+def performance_summary():
+    now = time.time()
+    def last_hour(name, store=history_store):
+        try:
+            return store.summary(name, now - 3600, now)
+        except KeyError:
+            return {"count": 0, "sum": 0, "avg": None}
+    rtts = [last_hour(name)["avg"] for name in history_store.names("rtt.")]
+    rtts += [last_hour(target_id, probe_scheduler.history)["avg"]
+             for target_id, target in list(probe_scheduler.targets.items()) if target.kind == "icmp"]
+    rtts = [rtt for rtt in rtts if rtt is not None]
+    return {
+        "ping_response_time": round(sum(rtts) / len(rtts), 3) if rtts else 0.0,
+        "activity": [
+            {"name": "Ping", "value": int(last_hour("events.ping")["sum"])},
+            {"name": "Traceroute", "value": int(last_hour("events.traceroute")["sum"])},
+            {"name": "Analysis", "value": int(last_hour("events.anomaly")["sum"])}
+        ],
+        "events_last_hour": int(sum(last_hour(name)["sum"] for name in history_store.names("events.")))
+    }
+
+# Helper: Record host metrics for trend history (runs once per metrics sample)
+def record_performance_history(snapshot):
+    host = snapshot["host"]
+    if host:
+        history_store.record("host.cpu_percent", host["cpu_percent"])
+        history_store.record("host.memory_percent", host["memory_percent"])
+    for name, nic in snapshot["interfaces"].items():
+        history_store.record(f"nic.{name}.rx_bps", nic["rx_bps"])
+        history_store.record(f"nic.{name}.tx_bps", nic["tx_bps"])
+
+metrics_collector.add_source(performance_summary)
+metrics_collector.add_listener(record_performance_history)
+
+# Fire-and-forget tasks (kept referenced until they finish)
+background_tasks = set()
+
+# Coordinator mode: sweeps are sharded across registered agent processes (local sweep without agents)
+discovery_coordinator = DiscoveryCoordinator(
+    network_discovery,
+    agents=tuple(url.strip() for url in os.getenv("INA_DISCOVERY_AGENTS", "").split(",") if url.strip()),
+    token=os.getenv("INA_CLUSTER_TOKEN"),
+    shard_hosts=int(os.getenv("INA_CLUSTER_SHARD_HOSTS", "256")),
+    pipeline=int(os.getenv("INA_CLUSTER_PIPELINE", "2")),
+    retries=int(os.getenv("INA_CLUSTER_RETRIES", "2")),
+    read_timeout=float(os.getenv("INA_CLUSTER_READ_TIMEOUT", "10"))
+)
+
+# Helper: Reject cluster calls without the shared token (refused when none is configured)
+def check_cluster_token(request):
+    token = os.getenv("INA_CLUSTER_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Distributed discovery is disabled; set INA_CLUSTER_TOKEN")
+    if request.headers.get("x-ina-token") != token:
+        raise HTTPException(status_code=401, detail="Invalid cluster token")
+
+# Helper: Allow runtime debug switches only with the operator's token (refused when none is configured)
+def check_debug_token(request):
+    token = os.getenv("INA_DEBUG_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Runtime profiling switches are disabled; set INA_DEBUG_TOKEN")
+    if request.headers.get("x-ina-token") != token:
+        raise HTTPException(status_code=401, detail="Invalid debug token")
+
+# Helper: Trace a host without surfacing errors (background topology learning)
+async def trace_quietly(ip):
+    try:
+        await path_tracer.trace(ip)
+    except IcmpUnavailable:
+        pass
+    except Exception as e:
+        logging.error(f"Background traceroute error: {str(e)}")
+
+# Helper: Close out a discovery in the topology graph
+async def finish_topology_discovery(subnet, devices):
+    topology_graph.finish_discovery(subnet, [d["ip"] for d in devices])
+    # One trace into the subnet reveals the gateway every discovered host hangs off
+    if devices and topology_graph.needs_gateway(subnet):
+        task = asyncio.create_task(trace_quietly(devices[0]["ip"]))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    await asyncio.to_thread(topology_graph.save)
+
+# Helper: Record a finished inventory scan in the topology, on disk and as alerts
+async def finish_inventory_scan(subnet, changes):
+    devices = host_inventory.devices(subnet)
+    for device in devices:
+        topology_graph.merge_device(subnet, device)
+    await finish_topology_discovery(subnet, devices)
+    await asyncio.to_thread(host_inventory.save)
+    check_device_changes(subnet, changes)
+
+# Helper: Re-scan every known subnet on the inventory's adaptive schedule
+async def refresh_inventory_forever(interval):
+    while True:
+        await asyncio.sleep(interval)
+        for subnet in list(host_inventory.subnets):
+            result = await host_inventory.refresh(discovery_coordinator, subnet)
+            if "error" in result:
+                continue
+            try:
+                await finish_inventory_scan(subnet, result["changes"])
+            except Exception as e:
+                logging.error(f"Inventory refresh error: {str(e)}")
+
+# Helper: Snapshot the time-series history periodically so a crash loses at most one interval
+async def save_history_forever(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(history_store.save)
+        except Exception as e:
+            logging.error(f"History save error: {str(e)}")
+
+# Helper: Render a monitored target's recent probe window as ping output
+def monitored_ping_output(target, metrics):
+    lines = [f"PING {target.host}: last {metrics['sent']} scheduled probes ({target.age():.1f}s ago)"]
+    for _, rtt in target.recent:
+        lines.append(f"reply from {target.host}: time={rtt:.3f} ms" if rtt is not None
+                     else f"no reply from {target.host}")
+    lines.append(f"{metrics['sent']} packets transmitted, {metrics['received']} received, "
+                 f"{metrics['loss_percent']}% packet loss")
+    if metrics["received"]:
+        lines.append(f"rtt min/avg/max/mdev = {metrics['min_rtt']:.3f}/{metrics['avg_rtt']:.3f}/"
+                     f"{metrics['max_rtt']:.3f}/{metrics['mdev_rtt']:.3f} ms")
+    return "\n".join(lines) + "\n"
+
+@app.on_event("startup")
+async def start_background_tasks():
+    traffic_sampler.start()
+    metrics_collector.start()
+    # The model loads off the import path: in the background now, or on first use with INA_MODEL_LOAD=lazy
+    model_server.start(preload=os.getenv("INA_MODEL_LOAD", "background") != "lazy")
+    probe_scheduler.start()
+    # Passive capture is opt-in: INA_CAPTURE_INTERFACE (live) or INA_CAPTURE_PCAP (replay)
+    if os.getenv("INA_CAPTURE_INTERFACE") or os.getenv("INA_CAPTURE_PCAP"):
+        packet_capture.start(os.getenv("INA_CAPTURE_INTERFACE"), os.getenv("INA_CAPTURE_FILTER"),
+                             os.getenv("INA_CAPTURE_PCAP"))
+    # Agent mode: announce this process to a coordinator (INA_AGENT_URL is how the coordinator reaches it)
+    if os.getenv("INA_COORDINATOR_URL") and os.getenv("INA_AGENT_URL"):
+        if not os.getenv("INA_CLUSTER_TOKEN"):
+            logging.error("Agent mode needs INA_CLUSTER_TOKEN; the coordinator refuses unauthenticated agents")
+        task = asyncio.create_task(register_with_coordinator(
+            os.getenv("INA_COORDINATOR_URL"), os.getenv("INA_AGENT_URL"), os.getenv("INA_CLUSTER_TOKEN"),
+            float(os.getenv("INA_AGENT_HEARTBEAT", "30"))
+        ))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    # Known subnets are re-scanned in the background (0 disables)
+    refresh_interval = float(os.getenv("INA_INVENTORY_REFRESH_INTERVAL", "60"))
+    if refresh_interval > 0:
+        task = asyncio.create_task(refresh_inventory_forever(refresh_interval))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    # History is also written on shutdown (0 disables the periodic snapshot)
+    save_interval = float(os.getenv("INA_HISTORY_SAVE_INTERVAL", "300"))
+    if save_interval > 0:
+        task = asyncio.create_task(save_history_forever(save_interval))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await traffic_sampler.stop()
+    await metrics_collector.stop()
+    await model_server.stop()
+    await probe_scheduler.stop()
+    topology_graph.save()
+    history_store.save()
+    event_journal.flush()
+    await packet_capture.stop()
+    for task in list(background_tasks):
+        task.cancel()
+
 # Ping Endpoint
 @app.get("/ping/{host}")
-async def ping(host: str):
+async def ping(host: str, max_age: float = None):
+    """Ping a host
+
+    Monitored hosts are answered from the scheduler's latest probes while they
+    are fresher than max_age (default: two probe intervals); max_age=0 forces
+    a live ping.
+    """
+    target = probe_scheduler.find(host)
+    if target is not None and target.last is not None:
+        limit = max_age if max_age is not None else 2 * target.interval
+        if target.age() <= limit:
+            metrics = target.window_metrics()
+            return {
+                "host": host,
+                "output": monitored_ping_output(target, metrics),
+                "metrics": metrics,
+                # Each probe was already scored as it arrived
+                "assessment": {"baseline": online_detector.host_stats(host)},
+                "cached": True,
+                "age": target.age()
+            }
+
     try:
         # Platform-specific ping command
         if platform.system().lower() == "windows":
@@ -143,54 +556,120 @@ async def ping(host: str):
             command = ["ping", "-c", "4", "-4", host]
             
         returncode, stdout, stderr = await run_command(command)
+        if returncode in (0, 1):
+            # Exit code 1 means no replies: still a measurement (100% loss)
+            metrics = parse_ping_output(stdout)
+            assessment = await assess_ping(host, metrics)
         if returncode == 0:
             update_historical_logs(f"Ping test for {host}")
-            return {"host": host, "output": stdout}
+            return {"host": host, "output": stdout, "metrics": metrics, "assessment": assessment}
         else:
             raise HTTPException(status_code=400, detail=f"Ping failed: {stderr}")
     except Exception as e:
         logging.error(f"Error pinging {host}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Cached paths endpoint
+@app.get("/traceroute/paths")
+def traceroute_paths():
+    """Recently traced paths per destination plus tracer stats"""
+    return FastJSONResponse({"paths": path_tracer.paths(), "stats": path_tracer.stats()})
+
 # Traceroute Endpoint
 @app.get("/traceroute/{host}")
-async def traceroute(host: str):
+async def traceroute(host: str, max_hops: int = None, timeout: float = None, max_age: float = None):
+    """Trace the path to a host
+
+    Every TTL is probed at once in-process, so a trace takes about one timeout;
+    paths younger than max_age (default: the cache TTL) are served from cache.
+    Falls back to the traceroute binary when raw sockets are unavailable.
+    """
     try:
-        # Platform-specific traceroute command
-        if platform.system().lower() == "windows":
-            command = ["tracert", host]
-        else:  # Linux/Mac
-            command = ["traceroute", "-n", host]
-            
-        returncode, stdout, stderr = await run_command(command)
-        if returncode == 0:
-            update_historical_logs(f"Traceroute test for {host}")
-            return {"host": host, "output": stdout}
+        try:
+            metrics = await path_tracer.trace(host, max_hops, timeout, max_age)
+            stdout = format_trace(metrics)
+        except IcmpUnavailable:
+            metrics = None
+        
+        if metrics is None:
+            returncode, stdout, stderr = await run_command(traceroute_command(host))
+            if returncode != 0:
+                raise HTTPException(status_code=400, detail=f"Traceroute failed: {stderr}")
+            metrics = parse_traceroute_output(stdout)
+
+        update_historical_logs(f"Traceroute test for {host}")
+        if metrics.get("cached"):
+            # Already scored when it was traced
+            assessment = {"baseline": online_detector.host_stats(host)}
         else:
-            raise HTTPException(status_code=400, detail=f"Traceroute failed: {stderr}")
+            assessment = online_detector.observe_traceroute(host, metrics)
+        return {"host": host, "output": stdout, "metrics": metrics, "assessment": assessment}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error tracerouting {host}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Load Machine Learning Model
+# Streaming Traceroute Endpoint (Server-Sent Events)
+@app.get("/traceroute/stream/{host}")
+async def stream_traceroute(host: str, max_hops: int = None, timeout: float = None, max_age: float = None):
+    """Stream a hop event per router as it answers, then the complete path
+
+    Falls back to the traceroute binary (streamed line by line) when raw sockets are unavailable.
+    """
+    async def trace_events():
+        try:
+            async for event in path_tracer.trace_iter(host, max_hops, timeout, max_age):
+                yield event
+        except IcmpUnavailable:
+            async for event in traceroute_command_events(host):
+                yield event
+
+    async def events():
+        try:
+            async for event in trace_events():
+                name = event.pop("event")
+                if name == "done":
+                    update_historical_logs(f"Traceroute test for {host}")
+                    if not event["cached"]:
+                        online_detector.observe_traceroute(host, event)
+                yield sse_event(name, event)
+        except Exception as e:
+            logging.error(f"Streaming traceroute error: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Load Machine Learning Model (served from a process pool, hot-reloaded when the file changes)
 model_path = os.path.join(os.path.dirname(__file__), "network_anomaly_model.pkl")
-model = joblib.load(model_path) if os.path.exists(model_path) else None
+model_server = ModelServer(
+    model_path,
+    workers=int(os.getenv("INA_MODEL_WORKERS", "2")),
+    poll_interval=float(os.getenv("INA_MODEL_POLL_INTERVAL", "5"))
+)
+
+# Collects concurrent single predictions for up to window_ms or max_batch samples
+anomaly_batcher = MicroBatcher(
+    model_server.score,
+    window_ms=float(os.getenv("INA_PREDICT_WINDOW_MS", "2")),
+    max_batch=int(os.getenv("INA_PREDICT_MAX_BATCH", "256"))
+)
 
 # Predict Anomalies
 @app.post("/predict-anomalies/")
-def predict_anomalies(data: AnomalyInput):
-    if model is None:
+async def predict_anomalies(data: AnomalyInput):
+    if not await model_server.ensure_loaded():
         raise HTTPException(status_code=500, detail="Model file not found.")
     
-    input_data = np.array([[data.avg_rtt, data.max_rtt, data.num_hops]])
-    
     try:
-        prediction = model.predict(input_data)
-        result = "Anomaly detected!" if prediction[0] == -1 else "Normal traffic"
+        # Concurrent requests are scored together by the micro-batcher
+        label, _ = await anomaly_batcher.predict([data.avg_rtt, data.max_rtt, data.num_hops])
+        result = "Anomaly detected!" if label == -1 else "Normal traffic"
         update_historical_logs(f"Anomaly detection run - Result: {result}")
         
         # Create security alert if anomaly detected
-        if prediction[0] == -1:
+        if label == -1:
             create_security_alert(
                 "high", 
                 "Network Anomaly Detected", 
@@ -203,138 +682,586 @@ def predict_anomalies(data: AnomalyInput):
         logging.error(f"Prediction failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Online detector baselines
+@app.get("/anomalies/online")
+def online_anomaly_stats(host: str = None):
+    """Running per-host RTT/loss/hop baselines used to score ping and traceroute results"""
+    if host:
+        baseline = online_detector.host_stats(host)
+        if baseline is None:
+            raise HTTPException(status_code=404, detail=f"No measurements for {host}")
+        return {"host": host, "baseline": baseline}
+    return online_detector.stats()
+
+# Readiness endpoint
+@app.get("/ready")
+def readiness(model: bool = False):
+    """Readiness probe: the API serves as soon as it starts; model=true also waits for the anomaly model
+
+    The model loads in the background after startup, so ping and discovery
+    traffic can be routed before scikit-learn has finished importing.
+    """
+    status = {
+        "ready": not model or model_server.state == "ready",
+        "uptime_s": round(time.time() - started_at, 3),
+        "model": {
+            "state": model_server.state,
+            "version": model_server.version,
+            "load_seconds": model_server.load_seconds,
+            "last_error": model_server.last_error
+        }
+    }
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Model status
+@app.get("/model/status")
+def model_status():
+    """Version, feature schema and reload history of the served anomaly model"""
+    return model_server.stats()
+
+# Model reload
+@app.post("/model/reload")
+async def reload_model():
+    """Re-read the model file now instead of waiting for the file watcher"""
+    loaded = await asyncio.to_thread(model_server.load)
+    if not loaded:
+        raise HTTPException(status_code=400, detail=model_server.last_error)
+    update_historical_logs(f"Model reloaded - version {model_server.version}")
+    return model_server.stats()
+
+# Micro-batching queue stats
+@app.get("/predict-anomalies/metrics")
+def predict_anomalies_metrics():
+    """Flush window, batch cap, queue depth and batching efficiency of the single-sample queue"""
+    return anomaly_batcher.stats()
+
+# Batch Anomaly Scoring
+@app.post("/predict-anomalies/batch")
+async def predict_anomalies_batch(request: Request):
+    """Score many samples in one vectorized call
+
+    Accepts {"samples": [{avg_rtt, max_rtt, num_hops}, ...]}, columnar
+    {"avg_rtt": [...], "max_rtt": [...], "num_hops": [...]}, a bare JSON array,
+    or NDJSON (Content-Type: application/x-ndjson). Returns IsolationForest
+    labels (-1 anomaly, 1 normal) and decision_function scores in input order.
+    """
+    if not await model_server.ensure_loaded():
+        raise HTTPException(status_code=500, detail="Model file not found.")
+
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            matrix = parse_ndjson_batch(body)
+        else:
+            matrix = parse_json_batch(json.loads(body))
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e.msg}")
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        scored = await model_server.score(matrix)
+    except Exception as e:
+        logging.error(f"Batch prediction failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    anomalies = int((scored["labels"] == -1).sum())
+    update_historical_logs(f"Anomaly detection batch run - {anomalies} of {len(matrix)} samples anomalous")
+    if anomalies:
+        create_security_alert(
+            "high",
+            "Network Anomalies Detected",
+            f"{anomalies} of {len(matrix)} scored samples show unusual network behavior",
+            "ML Model"
+        )
+
+    return {
+        "count": len(matrix),
+        "anomalies": anomalies,
+        "labels": scored["labels"].tolist(),
+        "scores": scored["scores"].tolist()
+    }
+
 # Historical Logs
 @app.get("/historical-logs/")
-def historical_logs():
+def historical_logs(type: str = None, source: str = None, start: float = None, end: float = None,
+                    before: int = None, limit: int = 100):
+    """Page through logged events, newest page first; pass next_before as before for older pages"""
     try:
-        return {"logs": logs}
+        return FastJSONResponse(event_journal.events(type, source, start, end, before, limit))
     except Exception as e:
         logging.error(f"Historical logs error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Historical Logs export (NDJSON, streamed from disk)
+@app.get("/historical-logs/export")
+def export_historical_logs(type: str = None, source: str = None, start: float = None, end: float = None):
+    rows = event_journal.export("events", {"type": type, "source": source}, start, end)
+    return StreamingResponse((dump_json(row) + b"\n" for row in rows), media_type="application/x-ndjson")
+
+# History Series endpoint
+@app.get("/history/series")
+def history_series(prefix: str = ""):
+    """List recorded time series (events.*, traffic.*, rtt.*)"""
+    return {"series": history_store.names(prefix), "stats": history_store.stats()}
+
+# History Query endpoint
+@app.get("/history/query/{name:path}")
+def history_query(name: str, start: float = None, end: float = None, step: float = None, agg: str = "avg"):
+    """Range query over a series; start/end are epoch seconds, step re-buckets the points"""
+    try:
+        return FastJSONResponse(history_store.query(name, start, end, step, agg))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown series {name}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# History Summary endpoint
+@app.get("/history/summary/{name:path}")
+def history_summary(name: str, start: float = None, end: float = None):
+    """Count/sum/avg/min/max of a series over a time range"""
+    try:
+        return history_store.summary(name, start, end)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown series {name}")
+
+# Monitored target schema
+class MonitorTarget(BaseModel):
+    host: str
+    kind: str = "icmp"  # icmp, tcp or dns
+    port: int = None
+    interval: float = 30.0
+
+# Monitored Targets endpoint
+@app.get("/monitor/targets")
+def list_monitor_targets():
+    """Registered probe targets with their latest result and recent window"""
+    return {
+        "targets": [t.to_dict() for t in probe_scheduler.targets.values()],
+        "kinds": list(PROBE_KINDS),
+        "stats": probe_scheduler.stats()
+    }
+
+# Add Monitored Target endpoint
+@app.post("/monitor/targets")
+def add_monitor_target(target: MonitorTarget):
+    """Probe a host continuously every interval seconds"""
+    try:
+        added = probe_scheduler.add_target(target.host, target.kind, target.interval, target.port)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    update_historical_logs(f"Monitoring started for {target.host} ({target.kind})")
+    return added.to_dict()
+
+# Monitored Target details endpoint
+@app.get("/monitor/targets/{target_id}")
+def get_monitor_target(target_id: str):
+    target = probe_scheduler.targets.get(target_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail=f"Unknown target {target_id}")
+    return target.to_dict()
+
+# Monitored Target history endpoint
+@app.get("/monitor/targets/{target_id}/history")
+def get_monitor_target_history(target_id: str, start: float = None, end: float = None, step: float = None,
+                               agg: str = "avg"):
+    """RTT history of one target (last 120 probes, 3 hours by minute, a week by hour)"""
+    if target_id not in probe_scheduler.targets:
+        raise HTTPException(status_code=404, detail=f"Unknown target {target_id}")
+    try:
+        return FastJSONResponse(probe_scheduler.history.query(target_id, start, end, step, agg))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No successful probes yet for {target_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Remove Monitored Target endpoint
+@app.delete("/monitor/targets/{target_id}")
+def remove_monitor_target(target_id: str):
+    target = probe_scheduler.targets.get(target_id)
+    if not probe_scheduler.remove_target(target_id):
+        raise HTTPException(status_code=404, detail=f"Unknown target {target_id}")
+    update_historical_logs(f"Monitoring stopped for {target.host} ({target.kind})")
+    return {"removed": target_id}
+
 # Network Discovery Endpoint
 @app.get("/network/discover/{subnet}")
-async def discover_network(subnet: str):
-    """Discover devices on a subnet (e.g., 192.168.1.0/24)"""
+async def discover_network(subnet: str, rate: int = None, timeout: float = None, concurrency: int = None,
+                           full: bool = False):
+    """Discover devices on a subnet (e.g., 192.168.1.0/24)
+
+    The first call sweeps the whole subnet; later calls only re-probe what the
+    inventory says is due (live hosts every minute, the dead space gradually)
+    and return every known live device plus join/leave/changed events.
+    full=true forces a complete sweep. rate (probes/second) and timeout
+    (seconds) tune the in-process ICMP sweep; concurrency bounds in-flight
+    ping subprocesses when raw sockets are unavailable.
+    """
     try:
-        result = await network_discovery.discover_network(subnet)
+        result = await host_inventory.refresh(
+            discovery_coordinator, subnet, full=full, rate=rate, timeout=timeout, concurrency=concurrency
+        )
         if "error" not in result:
             update_historical_logs(f"Network discovery on {subnet}")
-            
-            # Check for suspicious devices
-            if result.get("discovered_hosts", 0) > 0:
-                unknown_devices = [d for d in result.get("devices", []) if not d.get("hostname")]
-                if len(unknown_devices) > 3:  # More than 3 unknown devices could be suspicious
-                    create_security_alert(
-                        "medium",
-                        "Multiple Unknown Devices Detected",
-                        f"Found {len(unknown_devices)} devices without hostnames on subnet {subnet}",
-                        "Network Discovery"
-                    )
-        return result
+            await finish_inventory_scan(subnet, result["changes"])
+        return FastJSONResponse(result)
     except Exception as e:
         logging.error(f"Network discovery error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streaming Network Discovery Endpoint (Server-Sent Events)
+@app.get("/network/discover/stream/{subnet:path}")
+async def stream_network_discovery(subnet: str, rate: int = None, timeout: float = None, concurrency: int = None,
+                                   full: bool = False):
+    """Stream discovery of a subnet: host events for every live device, progress, then join/leave/changed"""
+    try:
+        ipaddress.ip_network(subnet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        changes = []
+        try:
+            async for event in host_inventory.iter_refresh(
+                discovery_coordinator, subnet, full=full, rate=rate, timeout=timeout, concurrency=concurrency
+            ):
+                if event["event"] == "host":
+                    topology_graph.merge_device(subnet, event["device"])
+                elif event["event"] in ("join", "leave", "changed"):
+                    changes.append(dict(event))
+                yield sse_event(event.pop("event"), event)
+            update_historical_logs(f"Network discovery on {subnet}")
+            await finish_inventory_scan(subnet, changes)
+        except Exception as e:
+            logging.error(f"Streaming network discovery error: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Host Inventory endpoints
+@app.get("/network/inventory")
+def inventory_stats():
+    """Known subnets with live/known host counts, scan counts and the current dead-space interval"""
+    return host_inventory.stats()
+
+@app.get("/network/inventory/{subnet:path}")
+def get_inventory(subnet: str, include_inactive: bool = False):
+    """Every host the inventory knows on a subnet, without probing"""
+    if not host_inventory.has_subnet(subnet):
+        raise HTTPException(status_code=404, detail=f"Subnet {subnet} has not been discovered")
+    devices = host_inventory.devices(subnet, include_inactive)
+    return FastJSONResponse({"subnet": subnet, "count": len(devices), "devices": devices})
+
+# Agent Shard Sweep endpoint (called by a coordinator)
+@app.get("/agent/discover/{subnet:path}")
+async def agent_discover(request: Request, subnet: str, first: int = 0, count: int = None, rate: int = None,
+                         timeout: float = None, concurrency: int = None):
+    """Sweep hosts first .. first + count - 1 of a subnet and stream the events as NDJSON
+
+    No journal, topology or alert side effects: the coordinator merges and records the results.
+    """
+    check_cluster_token(request)
+    try:
+        network = ipaddress.ip_network(subnet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            async for event in network_discovery.iter_discovery(
+                subnet, rate=rate, timeout=timeout, concurrency=concurrency,
+                shard=(first, count if count is not None else network.num_addresses)
+            ):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logging.error(f"Agent discovery error: {str(e)}")
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# Agent registration schema
+class AgentRegistration(BaseModel):
+    url: str  # Base URL the coordinator can reach the agent on, e.g. http://10.0.0.5:8000
+
+# Discovery Agents endpoints
+@app.get("/cluster/agents")
+def list_agents():
+    """Registered discovery agents, their health and throughput, and shard retry counts"""
+    return discovery_coordinator.stats()
+
+@app.post("/cluster/agents")
+def register_agent(request: Request, registration: AgentRegistration):
+    """Register an agent (agents re-register periodically as a heartbeat)"""
+    check_cluster_token(request)
+    try:
+        return discovery_coordinator.register(registration.url).to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/cluster/agents")
+def unregister_agent(request: Request, url: str):
+    check_cluster_token(request)
+    if not discovery_coordinator.unregister(url):
+        raise HTTPException(status_code=404, detail=f"Agent {url} not registered")
+    update_historical_logs(f"Discovery agent {url} removed")
+    return {"removed": url}
+
 # Device Details endpoint
 @app.get("/network/device/{ip}")
-async def get_device_details(ip: str):
-    """Get detailed information about a device"""
+async def get_device_details(ip: str, ports: str = None, udp: str = None, refresh: bool = False):
+    """Get detailed information about a device (an address or a resolvable name)
+
+    Adds the open TCP ports (common ports unless ports="22,80,8000-8100") with
+    service banners, and UDP ports when udp is given ("top" or a port list).
+    Port results are cached per host and port; refresh=true re-probes them.
+    """
     try:
-        result = await network_discovery.check_host(ip)
+        tcp_ports = parse_ports(ports, TOP_TCP_PORTS, port_scanner.max_ports)
+        udp_ports = parse_ports(udp, TOP_UDP_PORTS, port_scanner.max_ports) if udp else []
+        result = await port_scanner.device_details(ip, tcp_ports=tcp_ports, udp_ports=udp_ports, refresh=refresh)
         if not result:
             raise HTTPException(status_code=404, detail=f"Device {ip} not found or not responding")
+        # What discovery has learned about the host (MAC, first/last seen)
+        known = host_inventory.host(result["ip"])
+        if known:
+            result.update({k: known[k] for k in ("mac", "first_seen", "last_seen") if known.get(k)})
         update_historical_logs(f"Device details check for {ip}")
         return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Device details error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Port Scan endpoint
+@app.get("/network/scan/{ip}")
+async def scan_ports(ip: str, ports: str = None, udp: str = None, refresh: bool = False,
+                     concurrency: int = None, timeout: float = None):
+    """TCP-connect (and optional UDP) scan of one host with banners, served from the port cache when fresh"""
+    try:
+        tcp_ports = parse_ports(ports, TOP_TCP_PORTS, port_scanner.max_ports)
+        udp_ports = parse_ports(udp, TOP_UDP_PORTS, port_scanner.max_ports) if udp else []
+        address = await port_scanner.resolve(ip)
+        if address is None:
+            raise HTTPException(status_code=404, detail=f"Cannot resolve {ip}")
+        result = await port_scanner.scan(address, tcp_ports, udp_ports, refresh, concurrency, timeout)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    update_historical_logs(f"Port scan of {ip}: {len(result['ports'])} open of {result['scanned']}")
+    return result
+
+# Port scanner stats
+@app.get("/network/scan-stats")
+def port_scan_stats():
+    """Port cache size, probe and cache-hit counts, and scanner limits"""
+    return port_scanner.stats()
+
 # Traffic Analysis endpoint
 @app.get("/traffic/analyze")
-async def analyze_traffic():
-    """Analyze current network traffic"""
+async def analyze_traffic(max_age: float = None):
+    """Analyze current network traffic
+
+    Served from the shared background sample; max_age (seconds) forces a
+    refresh when the latest sample is older. The response carries its age.
+    """
     try:
-        result = await traffic_analyzer.analyze_network_traffic()
+        result = await traffic_sampler.get(max_age)
         if "error" not in result:
             update_historical_logs("Traffic analysis performed")
-            
-            # Check for abnormal traffic patterns
-            if result.get("topSources") and len(result["topSources"]) > 0:
-                top_source = result["topSources"][0]
-                if top_source.get("value", 0) > 50:  # Threshold for suspicious traffic
-                    create_security_alert(
-                        "medium",
-                        "High Volume Traffic Source",
-                        f"Unusually high traffic from {top_source.get('ip', 'unknown')}: {top_source.get('value')} connections",
-                        "Traffic Analysis"
-                    )
         return result
     except Exception as e:
         logging.error(f"Traffic analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Heavy Hitters endpoint
+@app.get("/traffic/heavy-hitters")
+def heavy_hitters(top: int = 10):
+    """Sliding-window top sources, destinations and service ports with distinct counts (fixed-memory sketches)"""
+    summary = traffic_analyzer.heavy_hitter_summary(top)
+    summary["sketch"] = traffic_analyzer.heavy_hitters["sources"].stats()
+    return summary
+
+# Capture request schema
+class CaptureRequest(BaseModel):
+    interface: str = None  # Live capture interface (default: all)
+    filter: str = None  # BPF filter, e.g. "tcp or udp"
+    pcap: str = None  # Replay this pcap/pcapng file (under INA_CAPTURE_DIR) instead
+
+# Packet Capture endpoint
+@app.get("/traffic/capture")
+def get_capture(top: int = 10):
+    """Bandwidth, protocol byte mix, top talkers and top flows from passive capture"""
+    return packet_capture.summary(top)
+
+# Start Packet Capture endpoint
+@app.post("/traffic/capture/start")
+async def start_capture(request: CaptureRequest):
+    """Start live capture on an interface or replay a pcap file on a background thread"""
+    pcap = resolve_server_file(request.pcap, "INA_CAPTURE_DIR") if request.pcap else None
+    try:
+        packet_capture.start(request.interface, request.filter, pcap)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    update_historical_logs(f"Packet capture started on {packet_capture.source}")
+    return packet_capture.stats()
+
+# Stop Packet Capture endpoint
+@app.post("/traffic/capture/stop")
+async def stop_capture():
+    await packet_capture.stop()
+    update_historical_logs(f"Packet capture stopped on {packet_capture.source}")
+    return packet_capture.stats()
+
+# Bulk Ingest endpoint
+@app.post("/traffic/ingest")
+async def ingest_traffic(request: Request, format: str = None, interval: float = 60.0, top: int = 10,
+                         path: str = None):
+    """Offline analytics over an uploaded pcap/pcapng or NetFlow/CSV flow log
+
+    The request body is the raw file (streamed to a temporary file, never held
+    in memory); alternatively path names a file under INA_INGEST_DIR. Returns
+    top sources/destinations/ports, protocol mix, a per-interval time series,
+    anomaly scores from the loaded model and ingest throughput.
+    """
+    # pandas is only needed here, so it is imported on the first ingest rather than at startup
+    from bulk_ingest import IngestError, ingest_file
+
+    upload = None
+    if path is not None:
+        path = resolve_server_file(path, "INA_INGEST_DIR")
+    else:
+        max_upload = int(os.getenv("INA_INGEST_MAX_UPLOAD_MB", "4096")) * 1024 * 1024
+        received = 0
+        upload = tempfile.NamedTemporaryFile(prefix="ina-ingest-", delete=False)
+        path = upload.name
+        try:
+            with upload:
+                async for chunk in request.stream():
+                    received += len(chunk)
+                    if received > max_upload:
+                        raise HTTPException(status_code=413, detail="Upload exceeds INA_INGEST_MAX_UPLOAD_MB")
+                    upload.write(chunk)
+            if not received:
+                raise HTTPException(status_code=400, detail="Empty upload; send the file as the request body")
+        except HTTPException:
+            os.unlink(path)
+            raise
+
+    try:
+        await model_server.ensure_loaded()
+        result = await asyncio.to_thread(ingest_file, path, format, interval, top, model_server.model)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Bulk ingest error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload is not None:
+            os.unlink(path)
+
+    update_historical_logs(f"Bulk ingest of {result['records']} {result['format']} records "
+                           f"at {result['records_per_s']} records/s")
+    anomalies = result["anomalies"]
+    if anomalies and anomalies["anomalous"]:
+        create_security_alert(
+            "medium",
+            "Anomalies in Ingested Traffic",
+            f"{anomalies['anomalous']} of {anomalies['scored']} ingested flows show unusual network behavior",
+            "ML Model"
+        )
+    return result
+
 # Security Alerts endpoint
 @app.get("/security/alerts")
-async def get_security_alerts(severity: str = None):
-    """Get security alerts with optional filtering by severity"""
+async def get_security_alerts(severity: str = None, source: str = None, start: float = None,
+                              end: float = None, before: int = None, limit: int = 100):
+    """Get security alerts with optional filtering by severity, source and time range"""
     try:
-        if severity:
-            filtered_alerts = [a for a in alerts if a["severity"] == severity]
-        else:
-            filtered_alerts = alerts
-            
+        page = event_journal.alerts(severity, source, start, end, before, limit)
+        
         # Count by severity
-        counts = {
-            "critical": len([a for a in alerts if a["severity"] == "critical"]),
-            "high": len([a for a in alerts if a["severity"] == "high"]),
-            "medium": len([a for a in alerts if a["severity"] == "medium"]),
-            "low": len([a for a in alerts if a["severity"] == "low"])
-        }
+        counts = event_journal.alert_counts()
         
-        return {
-            "alerts": filtered_alerts,
-            "total": len(filtered_alerts),
-            "counts": counts
-        }
+        return FastJSONResponse({
+            "alerts": page["alerts"],
+            "total": event_journal.count("alerts", start, end, severity=severity, source=source),
+            "counts": counts,
+            "next_before": page["next_before"]
+        })
     except Exception as e:
         logging.error(f"Security alerts error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Security Alerts export (NDJSON, streamed from disk)
+@app.get("/security/alerts/export")
+def export_security_alerts(severity: str = None, source: str = None, start: float = None, end: float = None):
+    rows = event_journal.export("alerts", {"severity": severity, "source": source}, start, end)
+    return StreamingResponse((dump_json(row) + b"\n" for row in rows), media_type="application/x-ndjson")
+
 # Performance Monitoring endpoint
 @app.get("/performance/metrics")
 async def get_performance_metrics():
-    """Get system performance metrics"""
+    """Get system performance metrics
+
+    Served from the collector's latest background sample: host CPU and memory,
+    per-interface byte/packet rates and per-endpoint latency percentiles.
+    """
+    metrics = metrics_collector.get()
+    if metrics is None:
+        metrics = await metrics_collector.refresh()
+    if metrics is None:
+        raise HTTPException(status_code=503, detail="Performance metrics unavailable")
+    return {
+        **metrics,
+        "cpu_usage_percent": metrics["host"].get("cpu_percent", 0.0),
+        "memory_usage_percent": metrics["host"].get("memory_percent", 0.0)
+    }
+
+# Prometheus export endpoint
+@app.get("/metrics")
+def prometheus_metrics():
+    """Request and span latency histograms plus host gauges in Prometheus text format"""
+    return Response(prometheus_text(metrics_collector, profiler),
+                    media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Profiling Spans endpoint
+@app.get("/debug/spans")
+def profiling_spans():
+    """Time spent in subprocesses, DNS, model inference and JSON rendering (INA_PROFILING=1)"""
+    return {"spans": profiler.summary(), "stats": profiler.stats()}
+
+# Profiling toggle endpoint
+@app.post("/debug/spans")
+def toggle_profiling(request: Request, enabled: bool, reset: bool = False):
+    """Switch span recording (and with it /debug/profile) on or off at runtime; needs the INA_DEBUG_TOKEN header"""
+    check_debug_token(request)
+    profiler.enabled = enabled
+    if reset:
+        profiler.reset()
+    return profiler.stats()
+
+# Profile capture endpoint
+@app.get("/debug/profile")
+async def capture_profile(seconds: float = 5.0, sort: str = "cumulative", limit: int = 40, format: str = "text"):
+    """cProfile the event loop for a few seconds; text report, or format=pstats for a file pstats/snakeviz can load"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (set INA_PROFILING=1, or POST /debug/spans with INA_DEBUG_TOKEN)")
+    if format not in ("text", "pstats"):
+        raise HTTPException(status_code=400, detail="format must be text or pstats")
+    if sort not in ("cumulative", "tottime", "calls", "ncalls", "time", "name"):
+        raise HTTPException(status_code=400, detail="Unsupported sort key")
     try:
-        import random
-        
-        # Generate simple random metrics (no dependencies required)
-        metrics = {
-            "ping_response_time": random.uniform(10, 100),
-            "cpu_usage_percent": random.uniform(5, 95),
-            "memory_usage_percent": random.uniform(20, 80),
-            "activity": [
-                {"name": "Ping", "value": random.randint(5, 20)},
-                {"name": "Traceroute", "value": random.randint(3, 12)},
-                {"name": "Analysis", "value": random.randint(2, 15)}
-            ],
-            "events_last_hour": random.randint(10, 50)
-        }
-        
-        # Log this activity
-        update_historical_logs("Performance metrics checked")
-        
-        return metrics
-    except Exception as e:
-        logging.error(f"Performance metrics error: {str(e)}")
-        # Return a very basic response that won't fail
-        return {
-            "ping_response_time": 50.0,
-            "cpu_usage_percent": 45.0,
-            "memory_usage_percent": 60.0,
-            "activity": [{"name": "System", "value": 10}],
-            "events_last_hour": 10
-        }
+        result = await profiler.capture(seconds, sort, limit, raw=format == "pstats")
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "pstats":
+        return Response(result, media_type="application/octet-stream",
+                        headers={"Content-Disposition": "attachment; filename=ina.pstats"})
+    return Response(result, media_type="text/plain")
+
 # Dashboard Summary endpoint
 @app.get("/dashboard/summary")
 async def get_dashboard_summary():
@@ -352,12 +1279,12 @@ async def get_dashboard_summary():
                 "devices": 5,
                 "subnets": 1
             },
-            "recent_logs": logs[-5:] if logs else []
+            "recent_logs": event_journal.recent_events(5)
         }
         
         # Try to add traffic data safely
         try:
-            traffic_data = await traffic_analyzer.analyze_network_traffic()
+            traffic_data = await traffic_sampler.get()
             summary["traffic"] = traffic_data
         except Exception as e:
             logging.error(f"Traffic analysis error in dashboard: {str(e)}")
@@ -383,51 +1310,74 @@ def home():
     return {"message": "Welcome to Intelligent Network Analyzer (INA) API", "status": "running"}
 
 
-@app.get("/network/topology/{subnet}")
-async def get_network_topology(subnet: str):
-    """Get network topology data for visualization"""
+# Streaming Network Topology Endpoint (Server-Sent Events)
+@app.get("/network/topology/stream/{subnet:path}")
+async def stream_network_topology(subnet: str, rate: int = None, timeout: float = None, concurrency: int = None):
+    """Stream topology nodes and their inbound links as devices are discovered"""
     try:
-        # First, discover devices on the subnet
-        discovery_result = await network_discovery.discover_network(subnet)
-        
-        if "error" in discovery_result:
-            return discovery_result
-        
-        # Create topology data structure
-        topology = {
-            "nodes": [
-                # Gateway/router node
-                {
-                    "id": "router",
-                    "name": "Router/Gateway",
-                    "type": "router",
-                    "ip": subnet.split("/")[0],  # Use subnet base as router IP
-                    "status": "active"
-                }
-            ],
-            "links": []
-        }
-        
-        # Add discovered devices as nodes
-        for device in discovery_result.get("devices", []):
-            node_id = f"device_{device['ip'].replace('.', '_')}"
-            device_node = {
-                "id": node_id,
-                "name": device.get("hostname", "") or device["ip"].split(".")[-1],
-                "type": "host",
-                "ip": device["ip"],
-                "status": device.get("status", "unknown")
-            }
-            topology["nodes"].append(device_node)
-            
-            # Add link to router
-            topology["links"].append({
-                "source": "router",
-                "target": node_id,
-                "value": 1
-            })
+        ipaddress.ip_network(subnet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        changes = []
+        try:
+            node, links = topology_graph.node_links(LOCAL_ID)
+            yield sse_event("node", {"node": node, "links": links})
+            async for event in host_inventory.iter_refresh(
+                discovery_coordinator, subnet, rate=rate, timeout=timeout, concurrency=concurrency
+            ):
+                name = event.pop("event")
+                if name == "host":
+                    topology_graph.merge_device(subnet, event["device"])
+                    node, links = topology_graph.node_links(event["device"]["ip"])
+                    yield sse_event("node", {"node": node, "links": links})
+                elif name in ("join", "leave", "changed"):
+                    changes.append(dict(event, event=name))
+                    yield sse_event(name, event)
+                else:
+                    yield sse_event(name, event)
+            await finish_inventory_scan(subnet, changes)
+        except Exception as e:
+            logging.error(f"Streaming network topology error: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Network Topology endpoint
+@app.get("/network/topology/{subnet:path}")
+async def get_network_topology(subnet: str, request: Request, since: int = None, refresh: bool = False):
+    """Get network topology data for visualization
+
+    Served from the topology graph built from discovery and traceroute results;
+    the subnet is only swept on first use or with refresh=true. Responses carry
+    an ETag (If-None-Match answers 304), and since=<version> returns only the
+    nodes and links changed after that version plus the removed ones.
+    """
+    try:
+        ipaddress.ip_network(subnet, strict=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if refresh or not topology_graph.has_subnet(subnet):
+            discovery_result = await host_inventory.refresh(discovery_coordinator, subnet)
+            if "error" in discovery_result:
+                return discovery_result
+            await finish_inventory_scan(subnet, discovery_result["changes"])
         
-        return topology
+        topology = topology_graph.view(subnet, since)
+        etag = f'"{topology["etag"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return FastJSONResponse(topology, headers={"ETag": etag})
     except Exception as e:
         logging.error(f"Network topology error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Topology graph stats
+@app.get("/network/topology-stats")
+def network_topology_stats():
+    """Size and version of the cached topology graph"""
+    return topology_graph.stats()
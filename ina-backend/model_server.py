@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Any, Optional
+
+from anomaly_scoring import FEATURES, INLINE_MAX, inference_executor, score_matrix
+from profiling import profiler
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Model held by each pool worker
+_worker_model = None
+
+
+def _init_worker(model, path: str):
+    """Pool initializer: forked workers inherit the parent's model pages, spawned ones mmap the file"""
+    global _worker_model
+    if model is None:
+        import joblib
+
+        model = joblib.load(path, mmap_mode="r")
+    _worker_model = model
+
+
+def _score_in_worker(matrix: "np.ndarray") -> Dict[str, Any]:
+    return score_matrix(_worker_model, matrix)
+
+
+class ModelError(ValueError):
+    """Raised when a model file fails schema validation"""
+
+
+def unpack_model(obj, path: str):
+    """Return (estimator, version, features) from a bundle dict or a bare estimator"""
+    if isinstance(obj, dict):
+        model = obj.get("model")
+        version = str(obj.get("version") or "")
+        features = list(obj.get("features") or [])
+    else:
+        model, version, features = obj, "", []
+    if not version:
+        with open(path, "rb") as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+    if not features and hasattr(model, "feature_names_in_"):
+        features = list(model.feature_names_in_)
+    return model, version, features
+
+
+def validate_model(model, features) -> None:
+    """Reject models that cannot score [avg_rtt, max_rtt, num_hops] rows"""
+    if not hasattr(model, "decision_function"):
+        raise ModelError("Model has no decision_function")
+    n_features = getattr(model, "n_features_in_", None)
+    if n_features is not None and n_features != len(FEATURES):
+        raise ModelError(f"Model expects {n_features} features, not {len(FEATURES)}")
+    if features and list(features) != FEATURES:
+        raise ModelError(f"Model feature schema {features} does not match {FEATURES}")
+
+
+class ModelServer:
+    """Serves anomaly inference from a process pool and hot-swaps the model when the file changes
+
+    Unpickling the model pulls in scikit-learn and SciPy, which dominates cold
+    start, so the first load runs in a thread after startup (or on first use
+    with preload=False) instead of at import.
+    """
+
+    def __init__(self, path: str, workers: int = 2, poll_interval: float = 5.0):
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.model = None
+        self.version: Optional[str] = None
+        self.features = list(FEATURES)
+        self.loaded_at: Optional[float] = None
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._loading: Optional[asyncio.Task] = None
+        self._stamp = None
+        self._watcher: Optional[asyncio.Task] = None
+        try:
+            self.context = multiprocessing.get_context("fork")
+        except ValueError:
+            self.context = multiprocessing.get_context("spawn")
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """Load and validate the model file, swapping it in only if it passes"""
+        stamp = self._file_stamp()
+        if stamp is None:
+            self.last_error = f"Model file not found: {self.path}"
+            return False
+        started = time.perf_counter()
+        try:
+            import joblib
+
+            # Memory-mapped, so the arrays are file-backed pages every worker process shares
+            model, version, features = unpack_model(joblib.load(self.path, mmap_mode="r"), self.path)
+            validate_model(model, features)
+        except Exception as e:
+            self._stamp = stamp  # Don't retry the same bad file every poll
+            self.last_error = f"Rejected model at {self.path}: {str(e)}"
+            logging.error(self.last_error)
+            return False
+
+        pool = None
+        if self.workers > 0:
+            # Fork inherits the mapped model; spawn re-opens the file memory-mapped
+            shared = model if self.context.get_start_method() == "fork" else None
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self.context,
+                initializer=_init_worker,
+                initargs=(shared, self.path)
+            )
+        reloaded = self.model is not None
+        old_pool, self.pool = self.pool, pool
+        self.model, self.version, self._stamp = model, version, stamp
+        self.features = features or list(FEATURES)
+        self.loaded_at = time.time()
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self.last_error = None
+        if reloaded:
+            self.reloads += 1
+        if old_pool is not None:
+            # In-flight requests finish on the old workers
+            old_pool.shutdown(wait=False)
+        logging.info(f"Loaded anomaly model version {version}")
+        return True
+
+    async def reload_if_changed(self) -> bool:
+        """Reload when the model file's mtime or size changed"""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        return await asyncio.to_thread(self.load)
+
+    @property
+    def state(self) -> str:
+        if self.model is not None:
+            return "ready"
+        if self._loading is not None and not self._loading.done():
+            return "loading"
+        return "unavailable"
+
+    async def ensure_loaded(self) -> bool:
+        """Wait for the first load, starting it if nothing has yet; True once a model is served"""
+        if self.model is None:
+            if self._loading is None:
+                self._loading = asyncio.create_task(asyncio.to_thread(self.load))
+            await asyncio.shield(self._loading)
+        return self.model is not None
+
+    def start(self, preload: bool = True):
+        """Start watching the model file for changes, loading it in the background first if preload"""
+        if preload and self._loading is None and self.model is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(self.load))
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+            self._watcher = None
+        if self.pool:
+            self.pool.shutdown(wait=False)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            # Nothing to compare against until the first load has been asked for and finished
+            if (self._loading is None and self._stamp is None) or self.state == "loading":
+                continue
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                logging.error(f"Model reload error: {str(e)}")
+
+    async def score(self, matrix: "np.ndarray") -> Dict[str, Any]:
+        """Labels and scores for a feature matrix; large batches run in the process pool"""
+        if self.model is None:
+            raise ModelError("Model file not found.")
+        loop = asyncio.get_running_loop()
+        if len(matrix) <= INLINE_MAX or self.pool is None:
+            with profiler.span("model.inline"):
+                return await loop.run_in_executor(inference_executor, score_matrix, self.model, matrix)
+        with profiler.span("model.pool"):
+            return await loop.run_in_executor(self.pool, _score_in_worker, matrix)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report the served model and pool"""
+        return {
+            "loaded": self.model is not None,
+            "state": self.state,
+            "path": self.path,
+            "version": self.version,
+            "features": self.features,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "reloads": self.reloads,
+            "workers": self.workers,
+            "start_method": self.context.get_start_method(),
+            "last_error": self.last_error
+        }
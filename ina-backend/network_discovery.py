@@ -1,67 +1,258 @@
 import asyncio
 import ipaddress
 import logging
-from typing import Dict, List, Any
-import socket
+import os
+import re
+from typing import Dict, List, Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple
+
+from icmp_sweep import icmp_sweeper
+from profiling import profiler
+from reverse_dns import reverse_resolver
+
+PING_TIME_RE = re.compile(r"time[=<]([\d.]+)\s*ms")
+
+DEFAULT_CONCURRENCY = int(os.getenv("INA_DISCOVERY_CONCURRENCY", "64"))
+MAX_CONCURRENCY = int(os.getenv("INA_DISCOVERY_MAX_CONCURRENCY", "256"))
+
+# Shared across all discovery requests so concurrent scans can't exceed the cap
+_global_slots: Optional[asyncio.Semaphore] = None
+
+def global_slots() -> asyncio.Semaphore:
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _global_slots
+
+async def bounded_map(func: Callable[[Any], Awaitable[Any]], items: Iterable[Any], limit: int,
+                      slots: Optional[asyncio.Semaphore] = None) -> AsyncIterator[Any]:
+    """Keep at most `limit` calls in flight, pulling items lazily, and yield results as they finish"""
+    iterator = iter(items)
+    pending = set()
+
+    async def run(item):
+        if slots is None:
+            return await func(item)
+        async with slots:
+            return await func(item)
+
+    try:
+        while True:
+            # Refill the window from the (lazy) source
+            while len(pending) < limit:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                pending.add(asyncio.ensure_future(run(item)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def host_count(network) -> int:
+    """Number of addresses network.hosts() yields"""
+    if network.num_addresses <= 2:
+        return network.num_addresses
+    # IPv4 drops network and broadcast; IPv6 only the subnet-router anycast address
+    return network.num_addresses - (2 if network.version == 4 else 1)
+
+def host_slice(network, first: int, count: int) -> Iterable[str]:
+    """Hosts first .. first + count - 1 of network.hosts(), without walking the range before them"""
+    base = int(network.network_address) + (1 if network.num_addresses > 2 else 0)
+    last = min(first + count, host_count(network))
+    return (str(ipaddress.ip_address(base + i)) for i in range(first, last))
+
+def host_index(network, ip: str) -> Optional[int]:
+    """Position of ip in network.hosts(), or None when it is not one of them"""
+    try:
+        index = int(ipaddress.ip_address(ip)) - int(network.network_address) - (1 if network.num_addresses > 2 else 0)
+    except (TypeError, ValueError):
+        return None
+    return index if 0 <= index < host_count(network) else None
 
 class NetworkDiscovery:
-    async def discover_network(self, subnet: str) -> Dict[str, Any]:
+    def __init__(self, sweeper=icmp_sweeper, resolver=reverse_resolver):
+        self.sweeper = sweeper
+        self.resolver = resolver
+
+    async def discover_network(self, subnet: str, rate: Optional[int] = None,
+                               timeout: Optional[float] = None,
+                               concurrency: Optional[int] = None) -> Dict[str, Any]:
         """Discover devices in the specified subnet"""
         try:
-            network = ipaddress.ip_network(subnet)
-            logging.info(f"Starting network discovery for {subnet}")
-            
-            # Create tasks for all hosts in the subnet
-            tasks = []
-            for ip in network.hosts():
-                ip_str = str(ip)
-                tasks.append(self.check_host(ip_str))
-            
-            # Run all tasks concurrently (with a limit to avoid overloading)
-            chunk_size = 20
             active_hosts = []
-            for i in range(0, len(tasks), chunk_size):
-                chunk_results = await asyncio.gather(*tasks[i:i+chunk_size])
-                active_hosts.extend([host for host in chunk_results if host])
-            
+            summary = {}
+            async for event in self.iter_discovery(subnet, rate, timeout, concurrency):
+                if event["event"] == "host":
+                    active_hosts.append(event["device"])
+                elif event["event"] == "done":
+                    summary = event
+            active_hosts.sort(key=lambda d: ipaddress.ip_address(d["ip"]))
+
             return {
                 "subnet": subnet,
-                "total_hosts": network.num_addresses - 2,  # Exclude network and broadcast addresses
+                "total_hosts": summary["total_hosts"],
                 "discovered_hosts": len(active_hosts),
                 "devices": active_hosts
             }
         except Exception as e:
             logging.error(f"Network discovery error: {str(e)}")
             return {"error": str(e)}
-    
+
+    async def iter_discovery(self, subnet: str, rate: Optional[int] = None,
+                             timeout: Optional[float] = None,
+                             concurrency: Optional[int] = None,
+                             progress_interval: float = 0.5,
+                             shard: Optional[Tuple[int, int]] = None,
+                             hosts: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield discovery events as they happen: start, host, periodic progress and done
+
+        shard = (first, count) restricts the sweep to that slice of the subnet's
+        hosts; hosts probes exactly the given addresses instead.
+        """
+        network = ipaddress.ip_network(subnet)
+        if hosts is not None:
+            total_hosts = len(hosts)
+            logging.info(f"Refreshing {total_hosts} hosts of {subnet}")
+        elif shard is None:
+            hosts = (str(ip) for ip in network.hosts())
+            total_hosts = host_count(network)
+            logging.info(f"Starting network discovery for {subnet}")
+        else:
+            hosts = host_slice(network, *shard)
+            total_hosts = max(0, min(shard[1], host_count(network) - shard[0]))
+            logging.info(f"Starting network discovery for {subnet} hosts {shard[0]}+{total_hosts}")
+
+        progress = {"sent": 0, "found": 0}
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for device in self._probe_hosts(network.version, hosts, rate, timeout, concurrency,
+                                                      progress):
+                    progress["found"] += 1
+                    queue.put_nowait(device)
+            finally:
+                queue.put_nowait(None)
+
+        def progress_event(name: str) -> Dict[str, Any]:
+            return {
+                "event": name,
+                "subnet": subnet,
+                "total_hosts": total_hosts,
+                "probed": progress["sent"],
+                "discovered_hosts": progress["found"]
+            }
+
+        producer = asyncio.create_task(produce())
+        try:
+            yield progress_event("start")
+            while True:
+                try:
+                    device = await asyncio.wait_for(queue.get(), progress_interval)
+                except asyncio.TimeoutError:
+                    yield progress_event("progress")
+                    continue
+                if device is None:
+                    break
+                yield {"event": "host", "device": device}
+            # Surface any probing error to the caller
+            await producer
+            yield progress_event("done")
+        finally:
+            producer.cancel()
+
+    async def _probe_hosts(self, version: int, hosts: Iterable[str], rate, timeout, concurrency,
+                           progress: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Probe every given host, yielding device records for live ones"""
+        limit = max(1, min(concurrency or DEFAULT_CONCURRENCY, MAX_CONCURRENCY))
+        if version == 4 and self.sweeper.available():
+            # Single in-process ICMP sweep, replies matched on one socket; the sweeper caps the total send rate
+            replies = self.sweeper.sweep(hosts, rate=rate, timeout=timeout, progress=progress)
+            async for device in self._enrich(replies, limit):
+                yield device
+        else:
+            # Fall back to one ping subprocess per host, N in flight at a time
+            async for host in bounded_map(self.check_host, hosts, limit, global_slots()):
+                progress["sent"] += 1
+                if host:
+                    yield host
+
     async def check_host(self, ip: str) -> Dict[str, Any]:
         """Check if a host is active and get basic info"""
         try:
+            if ipaddress.ip_address(ip).version == 4 and self.sweeper.available():
+                rtt = await self.sweeper.ping(ip)
+                return await self._device_info(ip, rtt) if rtt is not None else None
+
             # Run ping command
-            proc = await asyncio.create_subprocess_exec(
-                "ping", "-c", "1", "-W", "1", ip,
-                stdout=asyncio.subprocess.PIPE, 
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
-            
+            with profiler.span("subprocess.ping"):
+                proc = await asyncio.create_subprocess_exec(
+                    "ping", "-c", "1", "-W", "1", ip,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await proc.communicate()
+
             if proc.returncode == 0:
-                # Host is active, try to get hostname
-                try:
-                    hostname, _, _ = socket.gethostbyaddr(ip)
-                except (socket.herror, socket.gaierror):
-                    hostname = ""
-                
-                # Return device info
-                return {
-                    "ip": ip,
-                    "hostname": hostname,
-                    "status": "active"
-                }
+                match = PING_TIME_RE.search(stdout.decode(errors="ignore"))
+                return await self._device_info(ip, float(match.group(1)) if match else None)
             return None  # Host is not active
         except Exception as e:
             logging.error(f"Error checking host {ip}: {str(e)}")
             return None
 
+    async def _enrich(self, replies: AsyncIterator[Tuple[str, float]],
+                      limit: int = DEFAULT_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+        """Resolve hostnames for (ip, rtt) replies, at most limit at once and within the global cap"""
+        done: asyncio.Queue = asyncio.Queue()
+        pending = set()
+        slots = asyncio.Semaphore(limit)
+
+        async def device_info(ip, rtt):
+            async with slots, global_slots():
+                return await self._device_info(ip, rtt)
+
+        async def pump():
+            try:
+                async for ip, rtt in replies:
+                    task = asyncio.create_task(device_info(ip, rtt))
+                    pending.add(task)
+                    task.add_done_callback(lambda t: (pending.discard(t), done.put_nowait(t)))
+                if pending:
+                    await asyncio.wait(set(pending))
+            finally:
+                done.put_nowait(None)
+
+        pumper = asyncio.create_task(pump())
+        try:
+            while True:
+                task = await done.get()
+                if task is None:
+                    break
+                yield task.result()
+            await pumper
+        finally:
+            pumper.cancel()
+            for task in pending:
+                task.cancel()
+
+    async def _device_info(self, ip: str, rtt: Optional[float]) -> Dict[str, Any]:
+        """Build the device record for a responding host"""
+        # Host is active, try to get hostname without blocking the event loop
+        hostname = await self.resolver.resolve(ip)
+
+        # Return device info
+        return {
+            "ip": ip,
+            "hostname": hostname,
+            "status": "active",
+            "rtt_ms": round(rtt, 3) if rtt is not None else None
+        }
+
 # Create instance
-network_discovery = NetworkDiscovery()
\ No newline at end of file
+network_discovery = NetworkDiscovery()
@@ -0,0 +1,273 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+
+# Linux: "4 packets transmitted, 4 received, 0% packet loss"
+# macOS: "4 packets transmitted, 4 packets received, 0.0% packet loss"
+PING_COUNTS_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received.*?([\d.]+)% packet loss")
+# Linux "rtt min/avg/max/mdev = a/b/c/d ms", macOS "round-trip min/avg/max/stddev = ..."
+PING_SUMMARY_RE = re.compile(r"= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+)")
+# Per-reply "time=12.3 ms" (Windows: "time=12ms" / "time<1ms")
+PING_TIME_RE = re.compile(r"time[=<]([\d.]+)\s*ms")
+# Windows summary: "Sent = 4, Received = 4, Lost = 0 (0% loss)"
+WINDOWS_COUNTS_RE = re.compile(r"Sent = (\d+), Received = (\d+), Lost = \d+ \((\d+)% loss\)")
+
+# traceroute -n / tracert hop lines start with the TTL
+HOP_LINE_RE = re.compile(r"^\s*(\d+)\s+(.*)$")
+HOP_IP_RE = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3}|[0-9a-fA-F]*:[0-9a-fA-F:]+)\b")
+HOP_RTT_RE = re.compile(r"<?([\d.]+)\s*ms")
+
+
+def parse_ping_output(output: str) -> Dict[str, Any]:
+    """Extract loss and RTT statistics from ping output"""
+    rtts = [float(t) for t in PING_TIME_RE.findall(output)]
+    counts = PING_COUNTS_RE.search(output) or WINDOWS_COUNTS_RE.search(output)
+    sent = int(counts.group(1)) if counts else len(rtts)
+    received = int(counts.group(2)) if counts else len(rtts)
+    loss = float(counts.group(3)) if counts else (100.0 if not rtts else 0.0)
+
+    summary = PING_SUMMARY_RE.search(output)
+    if summary:
+        rtt_min, rtt_avg, rtt_max, rtt_mdev = (float(v) for v in summary.groups())
+    elif rtts:
+        rtt_min, rtt_max = min(rtts), max(rtts)
+        rtt_avg = sum(rtts) / len(rtts)
+        rtt_mdev = math.sqrt(sum((r - rtt_avg) ** 2 for r in rtts) / len(rtts))
+    else:
+        rtt_min = rtt_avg = rtt_max = rtt_mdev = None
+
+    return {
+        "sent": sent,
+        "received": received,
+        "loss_percent": loss,
+        "rtts": rtts,
+        "min_rtt": rtt_min,
+        "avg_rtt": rtt_avg,
+        "max_rtt": rtt_max,
+        "mdev_rtt": rtt_mdev
+    }
+
+
+def parse_traceroute_output(output: str) -> Dict[str, Any]:
+    """Extract per-hop addresses and RTTs from traceroute/tracert output"""
+    hops = []
+    for line in output.splitlines():
+        match = HOP_LINE_RE.match(line)
+        if not match:
+            continue
+        rest = match.group(2)
+        ips = HOP_IP_RE.findall(rest)
+        rtts = [float(r) for r in HOP_RTT_RE.findall(rest)]
+        hops.append({
+            "ttl": int(match.group(1)),
+            "ip": ips[-1] if ips else None,
+            "rtts": rtts,
+            "avg_rtt": sum(rtts) / len(rtts) if rtts else None
+        })
+    answered = [h for h in hops if h["rtts"]]
+    return {
+        "hops": hops,
+        "num_hops": len(hops),
+        "max_rtt": max((max(h["rtts"]) for h in answered), default=None),
+        "final_rtt": answered[-1]["avg_rtt"] if answered else None
+    }
+
+
+class P2Quantile:
+    """Streaming quantile estimate in O(1) memory (Jain & Chlamtac P-square)"""
+
+    def __init__(self, p: float):
+        self.p = p
+        self.heights: List[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        if len(self.heights) < 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return
+        q = self.heights
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in (1, 2, 3):
+            d = self.desired[i] - self.positions[i]
+            if (d >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+               (d <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + step * (q[i + step] - q[i]) / (self.positions[i + step] - self.positions[i])
+                q[i] = candidate
+                self.positions[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            return self.heights[min(len(self.heights) - 1, int(self.p * len(self.heights)))]
+        return self.heights[2]
+
+
+class Ewma:
+    """Exponentially weighted mean and variance"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean: Optional[float] = None
+        self.var = 0.0
+        self.n = 0
+
+    def add(self, x: float):
+        self.n += 1
+        if self.mean is None:
+            self.mean = x
+            return
+        diff = x - self.mean
+        incr = self.alpha * diff
+        self.mean += incr
+        self.var = (1 - self.alpha) * (self.var + diff * incr)
+
+    def zscore(self, x: float) -> float:
+        if self.mean is None:
+            return 0.0
+        std = math.sqrt(self.var)
+        return (x - self.mean) / std if std > 1e-9 else 0.0
+
+
+class HostStats:
+    """Incremental RTT, loss and path-length statistics for one target"""
+
+    def __init__(self, alpha: float):
+        self.rtt = Ewma(alpha)
+        self.loss = Ewma(alpha)
+        self.hops = Ewma(alpha)
+        self.p50 = P2Quantile(0.5)
+        self.p95 = P2Quantile(0.95)
+        self.last_hops: Optional[int] = None
+        self.last_seen = 0.0
+        self.last_alert = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.rtt.n,
+            "ewma_rtt": self.rtt.mean,
+            "rtt_std": math.sqrt(self.rtt.var),
+            "p50_rtt": self.p50.value(),
+            "p95_rtt": self.p95.value(),
+            "ewma_loss_percent": self.loss.mean,
+            "hops": self.last_hops,
+            "last_seen": self.last_seen
+        }
+
+
+class OnlineDetector:
+    """Scores each ping/traceroute measurement against per-host running statistics"""
+
+    def __init__(self, alert: Optional[Callable[..., Any]] = None, alpha: float = 0.1,
+                 warmup: int = 10, z_threshold: float = 4.0, loss_threshold: float = 50.0,
+                 hop_change: int = 3, cooldown: float = 300.0, max_hosts: int = 4096):
+        self.alert = alert
+        self.alpha = alpha
+        self.warmup = warmup
+        self.z_threshold = z_threshold
+        self.loss_threshold = loss_threshold
+        self.hop_change = hop_change
+        self.cooldown = cooldown
+        self.max_hosts = max_hosts
+        self.hosts: "OrderedDict[str, HostStats]" = OrderedDict()
+        self.anomalies = 0
+
+    def _stats(self, host: str) -> HostStats:
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = HostStats(self.alpha)
+            if len(self.hosts) > self.max_hosts:
+                self.hosts.popitem(last=False)
+        self.hosts.move_to_end(host)
+        stats.last_seen = time.time()
+        return stats
+
+    def observe_ping(self, host: str, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """Score a parsed ping result, then fold it into the host's statistics"""
+        stats = self._stats(host)
+        reasons = []
+        avg_rtt = metrics.get("avg_rtt")
+        loss = metrics.get("loss_percent") or 0.0
+
+        z = stats.rtt.zscore(avg_rtt) if avg_rtt is not None else 0.0
+        p95 = stats.p95.value()
+        if stats.rtt.n >= self.warmup and avg_rtt is not None and z >= self.z_threshold \
+                and p95 is not None and avg_rtt > p95:
+            reasons.append(f"RTT {avg_rtt:.1f}ms is {z:.1f} sigma above the {stats.rtt.mean:.1f}ms average")
+        if stats.loss.n >= self.warmup and loss >= self.loss_threshold \
+                and (stats.loss.mean or 0.0) < self.loss_threshold / 2:
+            reasons.append(f"Packet loss jumped to {loss:.0f}%")
+
+        if avg_rtt is not None:
+            stats.rtt.add(avg_rtt)
+            stats.p50.add(avg_rtt)
+            stats.p95.add(avg_rtt)
+        stats.loss.add(loss)
+        return self._assess(host, stats, reasons, {"zscore": round(z, 3)})
+
+    def observe_traceroute(self, host: str, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """Score a parsed traceroute result (path length changes), then update statistics"""
+        stats = self._stats(host)
+        reasons = []
+        num_hops = metrics.get("num_hops")
+        if num_hops:
+            if stats.hops.n >= self.warmup and abs(num_hops - stats.hops.mean) >= self.hop_change:
+                reasons.append(f"Path length changed to {num_hops} hops (usually {stats.hops.mean:.0f})")
+            stats.hops.add(num_hops)
+            stats.last_hops = num_hops
+        return self._assess(host, stats, reasons, {})
+
+    def _assess(self, host: str, stats: HostStats, reasons: List[str], extra: Dict[str, Any]) -> Dict[str, Any]:
+        anomalous = bool(reasons)
+        if anomalous:
+            self.anomalies += 1
+            now = time.time()
+            if self.alert and now - stats.last_alert >= self.cooldown:
+                stats.last_alert = now
+                self.alert(
+                    "medium",
+                    "Network Behavior Change Detected",
+                    f"{host}: " + "; ".join(reasons),
+                    "Online Detector"
+                )
+        return {"anomalous": anomalous, "reasons": reasons, **extra, "baseline": stats.to_dict()}
+
+    def host_stats(self, host: str) -> Optional[Dict[str, Any]]:
+        stats = self.hosts.get(host)
+        return stats.to_dict() if stats else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hosts": len(self.hosts),
+            "max_hosts": self.max_hosts,
+            "anomalies": self.anomalies,
+            "warmup": self.warmup,
+            "z_threshold": self.z_threshold,
+            "loss_threshold": self.loss_threshold
+        }
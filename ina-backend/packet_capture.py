@@ -0,0 +1,413 @@
+import asyncio
+import heapq
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+# pcap link-layer header types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+# scapy link-layer class of a live socket -> pcap link type
+LL_LINKTYPES = {"Ether": LINKTYPE_ETHERNET, "CookedLinux": LINKTYPE_LINUX_SLL,
+                "CookedLinuxV2": LINKTYPE_LINUX_SLL2, "Loopback": LINKTYPE_NULL,
+                "IP": LINKTYPE_RAW, "Raw": LINKTYPE_RAW}
+
+PROTOCOL_NAMES = {1: "ICMP", 6: "TCP", 17: "UDP", 58: "ICMPv6", 132: "SCTP"}
+PORT_PROTOCOLS = (6, 17, 132)
+
+# (protocol, src, dst, sport, dport) with addresses as packed bytes
+FlowKey = Tuple[int, bytes, bytes, int, int]
+
+
+def ip_header(data: bytes, linktype: int) -> Tuple[int, int]:
+    """(offset of the IP header, IP version) after the link-layer header; version 0 if not IP"""
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype, = struct.unpack_from("!H", data, 12)
+        offset = 14
+        while ethertype in (0x8100, 0x88A8):  # 802.1Q / QinQ tags
+            ethertype, = struct.unpack_from("!H", data, offset + 2)
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype, = struct.unpack_from("!H", data, 14)
+        offset = 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        ethertype, = struct.unpack_from("!H", data, 0)
+        offset = 20
+    else:
+        offset = 4 if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP) else 0
+        return offset, data[offset] >> 4
+    return offset, 4 if ethertype == 0x0800 else 6 if ethertype == 0x86DD else 0
+
+
+def parse_packet(data: bytes, linktype: int) -> Optional[Tuple[int, bytes, bytes, int, int, int, int]]:
+    """(protocol, src, dst, sport, dport, ttl, tcp flags) of an IPv4/IPv6 frame, or None for non-IP"""
+    try:
+        offset, version = ip_header(data, linktype)
+        if version == 4:
+            ihl = (data[offset] & 0x0F) * 4
+            ttl, protocol = data[offset + 8], data[offset + 9]
+            src, dst = data[offset + 12:offset + 16], data[offset + 16:offset + 20]
+            fragment, = struct.unpack_from("!H", data, offset + 6)
+            l4 = offset + ihl if not fragment & 0x1FFF else None  # Only the first fragment has ports
+        elif version == 6:
+            protocol, ttl = data[offset + 6], data[offset + 7]
+            src, dst = data[offset + 8:offset + 24], data[offset + 24:offset + 40]
+            l4 = offset + 40
+        else:
+            return None
+
+        sport = dport = flags = 0
+        if protocol in PORT_PROTOCOLS and l4 is not None and len(data) >= l4 + 4:
+            sport, dport = struct.unpack_from("!HH", data, l4)
+            if protocol == 6 and len(data) > l4 + 13:
+                flags = data[l4 + 13]
+        return (protocol, src, dst, sport, dport, ttl, flags)
+    except (struct.error, IndexError):
+        return None
+
+
+def parse_frame(data: bytes, linktype: int) -> Optional[FlowKey]:
+    """Flow key of an IPv4/IPv6 frame, or None for non-IP traffic"""
+    fields = parse_packet(data, linktype)
+    return fields[:5] if fields else None
+
+
+def format_address(packed: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(packed) == 4 else socket.AF_INET6, packed)
+
+
+class FlowTable:
+    """Per-flow byte/packet counters in flat arrays, with slot reuse for expired flows"""
+
+    def __init__(self, max_flows: int = 100000):
+        self.max_flows = max_flows
+        self.index: Dict[FlowKey, int] = {}
+        self.keys: List[Optional[FlowKey]] = []
+        self.bytes = array("Q")
+        self.packets = array("Q")
+        self.first = array("d")
+        self.last = array("d")
+        self.free: List[int] = []
+        self.dropped = 0
+
+    def add(self, key: FlowKey, nbytes: int, npackets: int, first: float, last: float):
+        slot = self.index.get(key)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                self.keys[slot] = key
+                self.bytes[slot] = self.packets[slot] = 0
+                self.first[slot] = first
+            elif len(self.keys) < self.max_flows:
+                slot = len(self.keys)
+                self.keys.append(key)
+                self.bytes.append(0)
+                self.packets.append(0)
+                self.first.append(first)
+                self.last.append(last)
+            else:
+                self.dropped += 1
+                return
+            self.index[key] = slot
+        self.bytes[slot] += nbytes
+        self.packets[slot] += npackets
+        if last > self.last[slot]:
+            self.last[slot] = last
+
+    def expire(self, before: float) -> int:
+        """Free the slots of flows idle since before"""
+        expired = 0
+        for slot, key in enumerate(self.keys):
+            if key is not None and self.last[slot] < before:
+                del self.index[key]
+                self.keys[slot] = None
+                self.free.append(slot)
+                expired += 1
+        return expired
+
+    def active(self):
+        """(key, bytes, packets) for every live flow"""
+        for slot, key in enumerate(self.keys):
+            if key is not None:
+                yield key, self.bytes[slot], self.packets[slot]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class _Batch:
+    """Per-flow counters accumulated on the capture thread between hand-offs"""
+
+    __slots__ = ("flows", "bytes", "packets", "non_ip_bytes", "first", "last", "opened")
+
+    def __init__(self):
+        self.flows: Dict[FlowKey, List] = {}
+        self.bytes = self.packets = self.non_ip_bytes = 0
+        self.first = self.last = 0.0
+        self.opened = time.monotonic()
+
+    def add(self, key: Optional[FlowKey], length: int, ts: float):
+        self.bytes += length
+        self.packets += 1
+        if not self.first:
+            self.first = ts
+        self.last = ts
+        if key is None:
+            self.non_ip_bytes += length
+            return
+        entry = self.flows.get(key)
+        if entry is None:
+            self.flows[key] = [length, 1, ts, ts]
+        else:
+            entry[0] += length
+            entry[1] += 1
+            entry[3] = ts
+
+
+class PacketCapture:
+    """Reads an interface or pcap file on a dedicated thread and aggregates flows on the event loop"""
+
+    def __init__(self, flow_timeout: float = 120.0, max_flows: int = 100000, window: float = 10.0,
+                 batch_interval: float = 0.5, batch_flows: int = 50000):
+        self.flow_timeout = flow_timeout
+        self.max_flows = max_flows
+        self.window = window
+        self.batch_interval = batch_interval
+        self.batch_flows = batch_flows
+        self.source: Optional[str] = None
+        self.bpf: Optional[str] = None
+        self.filter_applied = False
+        self.error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reset()
+
+    def _reset(self):
+        self.flows = FlowTable(self.max_flows)
+        self.total_bytes = 0
+        self.total_packets = 0
+        self.non_ip_bytes = 0
+        self.batches = 0
+        self.finished = False
+        self.started_at: Optional[float] = None
+        self.last_packet = 0.0
+        # (first ts, last ts, bytes, packets) per batch, for the bandwidth window
+        self.recent = deque()
+        self.version = 0
+        self._summary: Optional[Tuple[int, int, Dict[str, Any]]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interface: Optional[str] = None, bpf: Optional[str] = None,
+              pcap: Optional[str] = None):
+        """Capture from an interface (live) or replay a pcap/pcapng file; call from the event loop"""
+        if self.running:
+            raise ValueError(f"Capture already running on {self.source}")
+        if pcap and not os.path.exists(pcap):
+            raise ValueError(f"Capture file not found: {pcap}")
+        self._reset()
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self.error = None
+        self.bpf = bpf
+        self.filter_applied = bool(bpf) and not pcap
+        self.source = f"pcap:{pcap}" if pcap else f"iface:{interface or 'any'}"
+        self.started_at = time.time()
+        target = self._replay if pcap else self._sniff
+        self._thread = threading.Thread(target=self._guard, args=(target, pcap or interface, bpf),
+                                        name="ina-capture", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def _guard(self, target, source, bpf):
+        try:
+            target(source, bpf)
+        except Exception as e:
+            self.error = str(e)
+            logging.error(f"Packet capture error: {str(e)}")
+        finally:
+            self._loop.call_soon_threadsafe(self._finish)
+
+    def _finish(self):
+        self.finished = True
+
+    def _sniff(self, interface: Optional[str], bpf: Optional[str]):
+        """Live capture: kernel-side BPF filter, frames read raw without scapy dissection"""
+        from scapy.all import conf  # Loads the platform layer that provides L2listen
+
+        try:
+            sock = conf.L2listen(iface=interface, filter=bpf)
+        except Exception as e:
+            if not bpf:
+                raise
+            # Compiling the filter needs libpcap/tcpdump; keep capturing without it
+            logging.warning(f"BPF filter not applied ({str(e)}), capturing unfiltered")
+            self.filter_applied = False
+            sock = conf.L2listen(iface=interface)
+        linktype = LL_LINKTYPES.get(getattr(sock.LL, "__name__", ""), LINKTYPE_ETHERNET)
+        batch = _Batch()
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([sock], [], [], self.batch_interval)
+                # Drain what is queued, but hand off at least every batch_interval under load
+                drain_until = time.monotonic() + self.batch_interval
+                while ready and len(batch.flows) < self.batch_flows and time.monotonic() < drain_until:
+                    _, data, ts = sock.recv_raw()
+                    if data is not None:
+                        batch.add(parse_frame(data, linktype), len(data), ts or time.time())
+                    ready, _, _ = select.select([sock], [], [], 0)
+                if batch.packets and (time.monotonic() - batch.opened >= self.batch_interval
+                                      or len(batch.flows) >= self.batch_flows):
+                    self._hand_off(batch)
+                    batch = _Batch()
+        finally:
+            sock.close()
+            if batch.packets:
+                self._hand_off(batch)
+
+    def _replay(self, path: str, bpf: Optional[str]):
+        """Offline replay of a pcap/pcapng file at full speed"""
+        from scapy.utils import RawPcapReader
+
+        if bpf:
+            logging.info("BPF filters are not applied to pcap replay")
+        reader = RawPcapReader(path)
+        batch = _Batch()
+        try:
+            for data, meta in reader:
+                if self._stop.is_set():
+                    break
+                if hasattr(meta, "sec"):
+                    linktype, ts, wirelen = reader.linktype, meta.sec + meta.usec / 1e6, meta.wirelen
+                else:
+                    # pcapng: per-interface link type and timestamp resolution
+                    linktype = meta.linktype
+                    ts = ((meta.tshigh << 32) + meta.tslow) / meta.tsresol
+                    wirelen = meta.wirelen
+                batch.add(parse_frame(data, linktype), wirelen or len(data), ts)
+                if len(batch.flows) >= self.batch_flows or batch.packets >= 200000:
+                    self._hand_off(batch)
+                    batch = _Batch()
+        finally:
+            reader.close()
+            if batch.packets:
+                self._hand_off(batch)
+
+    def _hand_off(self, batch: _Batch):
+        self._loop.call_soon_threadsafe(self._merge, batch)
+
+    def _merge(self, batch: _Batch):
+        """Fold a batch into the flow table (runs on the event loop)"""
+        for key, (nbytes, npackets, first, last) in batch.flows.items():
+            self.flows.add(key, nbytes, npackets, first, last)
+        self.total_bytes += batch.bytes
+        self.total_packets += batch.packets
+        self.non_ip_bytes += batch.non_ip_bytes
+        self.batches += 1
+        self.last_packet = max(self.last_packet, batch.last)
+        self.recent.append((batch.first, batch.last, batch.bytes, batch.packets))
+        while self.recent and self.recent[0][1] < self.last_packet - self.window:
+            self.recent.popleft()
+        if self.batches % 20 == 0:
+            self.flows.expire(self.last_packet - self.flow_timeout)
+        self.version += 1
+
+    def bandwidth(self) -> Dict[str, float]:
+        """Bits and packets per second over the last window of capture time"""
+        if not self.recent:
+            return {"bps": 0.0, "pps": 0.0, "window": 0.0}
+        span = max(self.recent[-1][1] - self.recent[0][0], self.batch_interval)
+        nbytes = sum(r[2] for r in self.recent)
+        npackets = sum(r[3] for r in self.recent)
+        return {"bps": nbytes * 8 / span, "pps": npackets / span, "window": span}
+
+    def summary(self, n: int = 10) -> Dict[str, Any]:
+        """Bandwidth, protocol mix, top talkers and top flows; recomputed only after new batches"""
+        if self._summary is not None and self._summary[:2] == (self.version, n):
+            return self._summary[2]
+
+        sources: Dict[bytes, List[int]] = {}
+        destinations: Dict[bytes, List[int]] = {}
+        protocols: Dict[int, List[int]] = {}
+        for (protocol, src, dst, _, _), nbytes, npackets in self.flows.active():
+            for table, key in ((sources, src), (destinations, dst), (protocols, protocol)):
+                entry = table.get(key)
+                if entry is None:
+                    table[key] = [nbytes, npackets]
+                else:
+                    entry[0] += nbytes
+                    entry[1] += npackets
+
+        def top_hosts(table):
+            return [{"ip": format_address(k), "bytes": v[0], "packets": v[1]}
+                    for k, v in heapq.nlargest(n, table.items(), key=lambda item: item[1][0])]
+
+        top_flows = heapq.nlargest(n, self.flows.active(), key=lambda item: item[1])
+        result = {
+            "running": self.running,
+            "finished": self.finished,
+            "source": self.source,
+            "filter": self.bpf,
+            "filter_applied": self.filter_applied,
+            "error": self.error,
+            "packets": self.total_packets,
+            "bytes": self.total_bytes,
+            "non_ip_bytes": self.non_ip_bytes,
+            "flows": len(self.flows),
+            "dropped_flows": self.flows.dropped,
+            "bandwidth": self.bandwidth(),
+            "protocols": [{"name": PROTOCOL_NAMES.get(p, str(p)), "bytes": v[0], "packets": v[1]}
+                          for p, v in sorted(protocols.items(), key=lambda item: -item[1][0])],
+            "topTalkers": top_hosts(sources),
+            "topDestinations": top_hosts(destinations),
+            "topFlows": [{
+                "protocol": PROTOCOL_NAMES.get(k[0], str(k[0])),
+                "src": format_address(k[1]), "sport": k[3],
+                "dst": format_address(k[2]), "dport": k[4],
+                "bytes": nbytes, "packets": npackets
+            } for k, nbytes, npackets in top_flows]
+        }
+        self._summary = (self.version, n, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "source": self.source,
+            "filter": self.bpf,
+            "error": self.error,
+            "batches": self.batches,
+            "flows": len(self.flows),
+            "max_flows": self.max_flows,
+            "packets": self.total_packets
+        }
+
+
+# Create instance
+packet_capture = PacketCapture(
+    flow_timeout=float(os.getenv("INA_CAPTURE_FLOW_TIMEOUT", "120")),
+    max_flows=int(os.getenv("INA_CAPTURE_MAX_FLOWS", "100000")),
+    window=float(os.getenv("INA_CAPTURE_WINDOW", "10"))
+)
@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, AsyncIterator, List, Optional, Tuple
+
+from icmp_sweep import ICMP_ECHO_REPLY, ICMP_ECHO_REQUEST, IcmpUnavailable
+from profiling import profiler
+
+ICMP_DEST_UNREACHABLE = 3
+ICMP_TIME_EXCEEDED = 11
+PAYLOAD = b"INA-trace-probe!"
+
+
+def _fold(total: int) -> int:
+    while total >> 16:
+        total = (total >> 16) + (total & 0xFFFF)
+    return total
+
+
+def build_paris_probe(ident: int, seq: int, flow_checksum: int) -> bytes:
+    """Echo request whose checksum is fixed per flow (Paris traceroute)
+
+    Load balancers hash on the ICMP checksum, so a compensating payload word
+    keeps every TTL of a flow on the same path even though seq changes.
+    """
+    words = (ICMP_ECHO_REQUEST << 8) + ident + seq + sum(struct.unpack(f"!{len(PAYLOAD) // 2}H", PAYLOAD))
+    partial = _fold(words)
+    compensation = _fold((~flow_checksum & 0xFFFF) + (~partial & 0xFFFF))
+    return struct.pack("!BBHHHH", ICMP_ECHO_REQUEST, 0, flow_checksum, ident, seq, compensation) + PAYLOAD
+
+
+class Trace:
+    """State of one in-flight traceroute"""
+
+    def __init__(self, destination: str, max_hops: int, probes: int, flows: int):
+        self.destination = destination
+        self.max_hops = max_hops
+        self.expected = probes * flows
+        self.dest_ttl: Optional[int] = None  # First TTL answered by something other than Time Exceeded
+        self.reached = False
+        # ttl -> list of (flow, ip, rtt_ms)
+        self.replies: Dict[int, List[Tuple[int, str, float]]] = {}
+        self.streamed = set()
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.finished = asyncio.Event()
+
+    def on_reply(self, ttl: int, flow: int, ip: str, rtt: float, terminal: bool):
+        self.replies.setdefault(ttl, []).append((flow, ip, rtt))
+        if terminal and (self.dest_ttl is None or ttl < self.dest_ttl):
+            self.dest_ttl = ttl
+            self.reached = ip == self.destination
+        # Intermediate hops are final once every probe answered; the last hop is reported at the end
+        if not terminal and len(self.replies[ttl]) == self.expected and ttl not in self.streamed:
+            self.streamed.add(ttl)
+            self.events.put_nowait(self.hop(ttl))
+        if self.dest_ttl is not None and all(
+            len(self.replies.get(t, ())) == self.expected for t in range(1, self.dest_ttl + 1)
+        ):
+            self.finished.set()
+
+    def hop(self, ttl: int) -> Dict[str, Any]:
+        replies = self.replies.get(ttl, [])
+        rtts = [rtt for _, _, rtt in replies]
+        ips = list(dict.fromkeys(ip for _, ip, _ in replies))
+        return {
+            "ttl": ttl,
+            "ip": ips[0] if ips else None,
+            "ips": ips,  # More than one address: per-flow load balancing at this hop
+            "rtts": rtts,
+            "avg_rtt": sum(rtts) / len(rtts) if rtts else None,
+            "lost": self.expected - len(replies)
+        }
+
+    def result(self) -> Dict[str, Any]:
+        last = self.dest_ttl or max(self.replies, default=0)
+        hops = [self.hop(ttl) for ttl in range(1, last + 1)]
+        answered = [h for h in hops if h["rtts"]]
+        return {
+            "destination": self.destination,
+            "reached": self.reached,
+            "hops": hops,
+            "num_hops": len(hops),
+            "max_rtt": max((max(h["rtts"]) for h in answered), default=None),
+            "final_rtt": answered[-1]["avg_rtt"] if answered else None,
+            "timestamp": time.time()
+        }
+
+
+def format_trace(result: Dict[str, Any]) -> str:
+    """Render a trace like traceroute -n output"""
+    lines = [f"traceroute to {result['destination']}, {result['num_hops']} hops"]
+    for hop in result["hops"]:
+        columns = []
+        if hop["ips"]:
+            columns.append("  ".join(hop["ips"]))
+        columns.extend(f"{rtt:.3f} ms" for rtt in hop["rtts"])
+        columns.extend("*" for _ in range(hop["lost"]))
+        lines.append(f"{hop['ttl']:2d}  " + "  ".join(columns))
+    return "\n".join(lines) + "\n"
+
+
+class PathTracer:
+    """Traceroute that probes every TTL at once over one raw ICMP socket and caches paths"""
+
+    def __init__(self, max_hops: int = 30, timeout: float = 2.0, probes: int = 3, flows: int = 1,
+                 cache_ttl: float = 300.0, max_entries: int = 1024):
+        self.max_hops = max_hops
+        self.timeout = timeout
+        self.probes = probes
+        self.flows = flows
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self.ident = (os.getpid() + 1) & 0xFFFF  # Distinct from the sweeper's echo identifier
+        self.sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = 0
+        # seq -> (trace, ttl, flow, send time)
+        self._pending: Dict[int, Tuple[Trace, int, int, float]] = {}
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.listeners: List[Callable[[Dict[str, Any]], Any]] = []
+        self.traces = 0
+        self.hits = 0
+
+    def _ensure_socket(self) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        if self.sock is not None and self._loop is not loop:
+            self.sock.close()
+            self.sock = None
+        if self.sock is None:
+            # Time Exceeded messages are only delivered to raw sockets
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            except OSError as e:
+                raise IcmpUnavailable(str(e))
+            sock.setblocking(False)
+            self.sock, self._loop = sock, loop
+            loop.add_reader(sock.fileno(), self._on_readable)
+        return self.sock
+
+    def _on_readable(self):
+        while True:
+            try:
+                packet, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.error(f"Traceroute receive error: {str(e)}")
+                return
+
+            received = time.monotonic()
+            icmp = packet[(packet[0] & 0x0F) * 4:]
+            if len(icmp) < 8:
+                continue
+            icmp_type = icmp[0]
+            if icmp_type == ICMP_ECHO_REPLY:
+                ident, seq = struct.unpack("!HH", icmp[4:8])
+            elif icmp_type in (ICMP_TIME_EXCEEDED, ICMP_DEST_UNREACHABLE):
+                # The error quotes our probe's IP header and first 8 ICMP bytes
+                inner = icmp[8:]
+                if len(inner) < 20 or inner[9] != socket.IPPROTO_ICMP:
+                    continue
+                quoted = inner[(inner[0] & 0x0F) * 4:]
+                if len(quoted) < 8 or quoted[0] != ICMP_ECHO_REQUEST:
+                    continue
+                ident, seq = struct.unpack("!HH", quoted[4:8])
+            else:
+                continue
+            if ident != self.ident:
+                continue
+
+            entry = self._pending.pop(seq, None)
+            if entry:
+                trace, ttl, flow, sent = entry
+                # Echo replies and unreachables end the path; Time Exceeded comes from a router on it
+                terminal = icmp_type != ICMP_TIME_EXCEEDED
+                trace.on_reply(ttl, flow, addr[0], (received - sent) * 1000, terminal)
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xFFFF
+        return self._seq
+
+    def cached(self, destination: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Most recent path to destination if younger than max_age (default cache_ttl)"""
+        result = self.cache.get(destination)
+        limit = self.cache_ttl if max_age is None else max_age
+        if result is None or time.time() - result["timestamp"] > limit:
+            return None
+        return result
+
+    def paths(self) -> List[Dict[str, Any]]:
+        """Every cached path that has not expired"""
+        now = time.time()
+        return [r for r in self.cache.values() if now - r["timestamp"] <= self.cache_ttl]
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], Any]):
+        """Call listener(result) with every freshly traced path"""
+        self.listeners.append(listener)
+
+    def _store(self, result: Dict[str, Any]):
+        self.cache[result["destination"]] = result
+        self.cache.move_to_end(result["destination"])
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        for listener in self.listeners:
+            try:
+                listener(result)
+            except Exception as e:
+                logging.error(f"Traceroute listener error: {str(e)}")
+
+    async def resolve(self, host: str) -> str:
+        loop = asyncio.get_running_loop()
+        with profiler.span("dns.resolve"):
+            infos = await loop.getaddrinfo(host, None, family=socket.AF_INET)
+        return infos[0][4][0]
+
+    async def trace_iter(self, host: str, max_hops: Optional[int] = None,
+                         timeout: Optional[float] = None,
+                         max_age: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield start, one hop event per router as it answers, then done with the full path"""
+        destination = await self.resolve(host)
+        cached = self.cached(destination, max_age)
+        if cached is not None:
+            self.hits += 1
+            yield {"event": "start", "destination": destination, "max_hops": cached["num_hops"], "cached": True}
+            for hop in cached["hops"]:
+                yield {"event": "hop", "hop": hop}
+            yield {"event": "done", **cached, "cached": True}
+            return
+
+        max_hops = max_hops or self.max_hops
+        timeout = timeout or self.timeout
+        sock = self._ensure_socket()
+        trace = Trace(destination, max_hops, self.probes, self.flows)
+        seqs = []
+        self.traces += 1
+        yield {"event": "start", "destination": destination, "max_hops": max_hops, "cached": False}
+
+        try:
+            # Every TTL and flow goes out back to back; TTL is per-socket, so set it before each send
+            for attempt in range(self.probes):
+                for ttl in range(1, max_hops + 1):
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+                    for flow in range(self.flows):
+                        seq = self._next_seq()
+                        seqs.append(seq)
+                        self._pending[seq] = (trace, ttl, flow, time.monotonic())
+                        try:
+                            sock.sendto(build_paris_probe(self.ident, seq, 0x5A5A + flow * 0x0101), (destination, 0))
+                        except OSError as e:
+                            self._pending.pop(seq, None)
+                            logging.debug(f"Traceroute probe to {destination} failed: {str(e)}")
+
+            deadline = time.monotonic() + timeout
+            waiter = asyncio.ensure_future(trace.finished.wait())
+            try:
+                while not trace.finished.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    getter = asyncio.ensure_future(trace.events.get())
+                    done, _ = await asyncio.wait({getter, waiter}, timeout=remaining,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if getter in done:
+                        yield {"event": "hop", "hop": getter.result()}
+                    else:
+                        getter.cancel()
+            finally:
+                waiter.cancel()
+        finally:
+            for seq in seqs:
+                self._pending.pop(seq, None)
+
+        while not trace.events.empty():
+            yield {"event": "hop", "hop": trace.events.get_nowait()}
+        result = trace.result()
+        self._store(result)
+        yield {"event": "done", **result, "cached": False}
+
+    async def trace(self, host: str, max_hops: Optional[int] = None, timeout: Optional[float] = None,
+                    max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Trace the path to host, reusing a cached path younger than max_age"""
+        result = None
+        async for event in self.trace_iter(host, max_hops, timeout, max_age):
+            if event["event"] == "done":
+                result = event
+        result.pop("event")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_hops": self.max_hops,
+            "timeout": self.timeout,
+            "probes": self.probes,
+            "flows": self.flows,
+            "traces": self.traces,
+            "cache_hits": self.hits,
+            "cached_paths": len(self.cache),
+            "pending": len(self._pending)
+        }
+
+
+# Create instance
+path_tracer = PathTracer(
+    max_hops=int(os.getenv("INA_TRACE_MAX_HOPS", "30")),
+    timeout=float(os.getenv("INA_TRACE_TIMEOUT", "2.0")),
+    probes=int(os.getenv("INA_TRACE_PROBES", "3")),
+    flows=int(os.getenv("INA_TRACE_FLOWS", "1")),
+    cache_ttl=float(os.getenv("INA_TRACE_CACHE_TTL", "300"))
+)
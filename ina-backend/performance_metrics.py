@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+
+try:
+    import psutil
+except ImportError:  # Metrics degrade to request latencies only
+    psutil = None
+
+# Latency bucket upper bounds in ms: 0.05 ms to ~2 min, four buckets per doubling (about 9% wide)
+LATENCY_BOUNDS = [0.05 * 2 ** (i / 4) for i in range(86)]
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """Fixed log-spaced bucket counts; recording is one bisect and one increment"""
+
+    def __init__(self):
+        self.counts = array("q", bytes(8 * (len(LATENCY_BOUNDS) + 1)))  # Last slot: overflow
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect_left(LATENCY_BOUNDS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    @staticmethod
+    def percentiles(counts, total: int) -> Dict[str, Optional[float]]:
+        """Bucket upper bound at each percentile (overestimates by under one bucket width)"""
+        result = {f"p{p}": None for p in PERCENTILES}
+        if not total:
+            return result
+        targets = [(p, total * p / 100) for p in PERCENTILES]
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            while targets and seen >= targets[0][1]:
+                p, _ = targets.pop(0)
+                result[f"p{p}"] = round(LATENCY_BOUNDS[min(i, len(LATENCY_BOUNDS) - 1)], 3)
+            if not targets:
+                break
+        return result
+
+
+class MetricsCollector:
+    """Samples host, process, NIC and request-latency metrics in the background
+
+    Every interval one sample turns raw counters into rates and percentiles and
+    stores the result as the snapshot, so readers never touch psutil or walk
+    histograms themselves. Latency percentiles cover the last window seconds.
+    """
+
+    def __init__(self, interval: float = 5.0, window: float = 300.0):
+        self.interval = interval
+        self.window = window
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.in_flight = 0
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.samples = 0
+        self.sources: List[Callable[[], Dict[str, Any]]] = []
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # (monotonic, {route: counts copy}) per sample, enough to reach back one window
+        self._history: deque = deque(maxlen=max(2, int(window / interval) + 1))
+        self._nics: Optional[Dict[str, Any]] = None
+        self._nics_at = 0.0
+        self._process = psutil.Process() if psutil else None
+        self._task: Optional[asyncio.Task] = None
+        if psutil:
+            # First cpu_percent() call only sets the baseline
+            psutil.cpu_percent(None)
+            self._process.cpu_percent(None)
+
+    def record_request(self, route: str, ms: float):
+        """Record one request's latency under its route template"""
+        histogram = self.histograms.get(route)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(route, LatencyHistogram())
+        histogram.record(ms)
+
+    def add_source(self, source: Callable[[], Dict[str, Any]]):
+        """Merge source() into every sample (it runs in the sampling thread)"""
+        self.sources.append(source)
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call listener(snapshot) once for every fresh sample"""
+        self.listeners.append(listener)
+
+    def start(self):
+        """Start the background sampling task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background sampling task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> Dict[str, Any]:
+        try:
+            self.snapshot = await asyncio.to_thread(self.sample)
+            self.samples += 1
+            for listener in self.listeners:
+                try:
+                    listener(self.snapshot)
+                except Exception as e:
+                    logging.error(f"Metrics listener error: {str(e)}")
+        except Exception as e:
+            logging.error(f"Metrics sampling error: {str(e)}")
+        return self.snapshot
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """Latest snapshot with its age"""
+        if self.snapshot is None:
+            return None
+        return {**self.snapshot, "age": round(time.time() - self.snapshot["timestamp"], 3)}
+
+    def _host(self) -> Dict[str, Any]:
+        if psutil is None:
+            return {}
+        memory = psutil.virtual_memory()
+        host = {
+            "cpu_percent": psutil.cpu_percent(None),
+            "cpu_count": psutil.cpu_count(),
+            "memory_percent": memory.percent,
+            "memory_used_bytes": memory.total - memory.available,
+            "memory_total_bytes": memory.total
+        }
+        if hasattr(os, "getloadavg"):
+            host["load_average"] = [round(x, 2) for x in os.getloadavg()]
+        return host
+
+    def _process_stats(self) -> Dict[str, Any]:
+        if self._process is None:
+            return {}
+        with self._process.oneshot():
+            process = {
+                "cpu_percent": self._process.cpu_percent(None),
+                "rss_bytes": self._process.memory_info().rss,
+                "threads": self._process.num_threads()
+            }
+            if hasattr(self._process, "num_fds"):
+                process["open_fds"] = self._process.num_fds()
+        return process
+
+    def _interfaces(self, now: float) -> Dict[str, Any]:
+        if psutil is None:
+            return {}
+        counters = psutil.net_io_counters(pernic=True)
+        previous, elapsed = self._nics, now - self._nics_at
+        self._nics, self._nics_at = counters, now
+        interfaces = {}
+        for name, c in counters.items():
+            rates = {"rx_bps": 0.0, "tx_bps": 0.0, "rx_pps": 0.0, "tx_pps": 0.0}
+            p = previous.get(name) if previous else None
+            # Counters that went backwards (interface reset) yield a zero rate for one sample
+            if p is not None and elapsed > 0:
+                rates = {
+                    "rx_bps": round(max(0, c.bytes_recv - p.bytes_recv) * 8 / elapsed, 1),
+                    "tx_bps": round(max(0, c.bytes_sent - p.bytes_sent) * 8 / elapsed, 1),
+                    "rx_pps": round(max(0, c.packets_recv - p.packets_recv) / elapsed, 1),
+                    "tx_pps": round(max(0, c.packets_sent - p.packets_sent) / elapsed, 1)
+                }
+            interfaces[name] = {**rates, "errors": c.errin + c.errout, "drops": c.dropin + c.dropout}
+        return interfaces
+
+    def _endpoints(self, now: float) -> Dict[str, Any]:
+        with self.lock:
+            routes = list(self.histograms.items())
+        current = {route: (array("q", h.counts), h.total) for route, h in routes}
+        self._history.append((now, current))
+        # Oldest retained sample still inside the window is the baseline for windowed percentiles
+        base_at, base = next(((ts, counts) for ts, counts in self._history if now - ts <= self.window),
+                             (now, current))
+        span = now - base_at
+        endpoints = {}
+        for route, histogram in routes:
+            counts, total = current[route]
+            old_counts, old_total = base.get(route, (None, 0))
+            if old_counts is not None and old_counts is not counts:
+                counts = [a - b for a, b in zip(counts, old_counts)]
+            recent = total - old_total if old_counts is not None and span else total
+            endpoints[route] = {
+                "requests": total,
+                "mean_ms": round(histogram.sum_ms / total, 3) if total else None,
+                "max_ms": round(histogram.max_ms, 3),
+                "window_requests": recent,
+                "rps": round(recent / span, 3) if span else None,
+                **LatencyHistogram.percentiles(counts, recent)
+            }
+        return endpoints
+
+    def sample(self) -> Dict[str, Any]:
+        """Read every counter once and derive rates and percentiles"""
+        now = time.monotonic()
+        snapshot = {
+            "timestamp": time.time(),
+            "interval": self.interval,
+            "host": self._host(),
+            "process": self._process_stats(),
+            "interfaces": self._interfaces(now),
+            "endpoints": self._endpoints(now),
+            "in_flight": self.in_flight
+        }
+        for source in self.sources:
+            try:
+                snapshot.update(source())
+            except Exception as e:
+                logging.error(f"Metrics source error: {str(e)}")
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "window": self.window,
+            "samples": self.samples,
+            "routes": len(self.histograms),
+            "psutil": psutil is not None
+        }
+
+
+class RequestTimer:
+    """ASGI middleware feeding each request's latency to a MetricsCollector"""
+
+    def __init__(self, app, collector: MetricsCollector):
+        self.app = app
+        self.collector = collector
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        self.collector.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.collector.in_flight -= 1
+            # Route templates, not raw paths, so /ping/a and /ping/b share one histogram
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.collector.record_request(f"{scope['method']} {route}",
+                                          (time.perf_counter() - started) * 1000)
+
+
+# Create instance
+metrics_collector = MetricsCollector(
+    interval=float(os.getenv("INA_METRICS_INTERVAL", "5")),
+    window=float(os.getenv("INA_METRICS_WINDOW", "300"))
+)
@@ -0,0 +1,332 @@
+import asyncio
+import ipaddress
+import os
+import re
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from network_discovery import bounded_map, network_discovery
+from probe_scheduler import RateLimiter
+
+# Ports checked when a request doesn't name any
+TOP_TCP_PORTS = [21, 22, 23, 25, 53, 80, 81, 110, 111, 135, 139, 143, 389, 443, 445, 465, 548, 554, 587, 631,
+                 993, 995, 1433, 1521, 1723, 1883, 2049, 2375, 3000, 3306, 3389, 5000, 5060, 5432, 5900, 5985,
+                 6379, 8000, 8008, 8080, 8081, 8443, 8883, 8888, 9000, 9090, 9100, 9200, 11211, 27017]
+TOP_UDP_PORTS = [53, 67, 69, 123, 137, 161, 500, 514, 1900, 5353]
+
+# Services that wait for the client to speak first
+TCP_PROBES = {port: b"HEAD / HTTP/1.0\r\n\r\n"
+              for port in (80, 81, 2375, 3000, 5000, 5985, 8000, 8008, 8080, 8081, 8888, 9000, 9090, 9200)}
+TCP_PROBES.update({6379: b"PING\r\n", 11211: b"version\r\n"})
+TLS_PORTS = {443, 465, 636, 993, 995, 8443, 8883}
+
+# UDP services only answer a well-formed request
+UDP_PROBES = {
+    53: b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x01",  # NS query for the root
+    123: b"\x1b" + bytes(47),  # NTPv3 client request
+    161: bytes.fromhex("302902010004067075626c6963a01c0204494e4100020100020100300e300c06082b060102010101000500"),
+    1900: b"M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\nMAN: \"ssdp:discover\"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n",
+    5353: b"\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x09_services\x07_dns-sd\x04_udp\x05local\x00\x00\x0c\x00\x01",
+}
+
+# (pattern on the first banner line, service); the match's first group, if any, is the product
+BANNER_SIGNATURES = [
+    (re.compile(r"^SSH-[\d.]+-(\S+)"), "ssh"),
+    (re.compile(r"^HTTP/[\d.]+ \d+"), "http"),
+    (re.compile(r"^220[ -].*\bE?SMTP\b"), "smtp"),
+    (re.compile(r"^220[ -].*\bFTP\b"), "ftp"),
+    (re.compile(r"^220[ -]"), "ftp"),
+    (re.compile(r"^\+OK"), "pop3"),
+    (re.compile(r"^\* OK"), "imap"),
+    (re.compile(r"^\+PONG"), "redis"),
+    (re.compile(r"^VERSION (\S+)"), "memcached"),
+    (re.compile(r"^RFB (\d+\.\d+)"), "vnc"),
+]
+HTTP_SERVER_RE = re.compile(r"^Server:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+MAX_BANNER = 512
+
+
+def parse_ports(spec: Optional[str], default: List[int], limit: int) -> List[int]:
+    """"22,80,8000-8010" -> sorted port list; None or "top" -> default"""
+    if spec is None or spec.strip().lower() in ("", "top"):
+        return list(default)
+    ports = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            low, high = int(first), int(last or first)
+        except ValueError:
+            raise ValueError(f"Invalid port range '{part}'")
+        if not 1 <= low <= high <= 65535:
+            raise ValueError(f"Ports must be between 1 and 65535, got '{part}'")
+        ports.update(range(low, high + 1))
+        if len(ports) > limit:
+            raise ValueError(f"At most {limit} ports per scan")
+    return sorted(ports)
+
+
+def fingerprint(port: int, protocol: str, banner: str) -> Tuple[str, Optional[str]]:
+    """(service, product) from the banner, else the registered service name for the port"""
+    first_line = banner.split("\n", 1)[0]
+    for pattern, service in BANNER_SIGNATURES:
+        match = pattern.search(first_line)
+        if match:
+            if service == "http":
+                server = HTTP_SERVER_RE.search(banner)
+                return service, server.group(1).strip() if server else None
+            return service, match.group(1) if match.groups() else None
+    # MySQL greets with a binary handshake: protocol 10 then a NUL-terminated version
+    if len(banner) > 5 and banner[4] == "\n" and protocol == "tcp":
+        version = banner[5:].split("\x00", 1)[0]
+        if re.match(r"^\d+\.\d+", version):
+            return "mysql", version
+    try:
+        return socket.getservbyport(port, protocol), None
+    except OSError:
+        return "unknown", None
+
+
+def clean_banner(data: bytes) -> str:
+    text = data[:MAX_BANNER].decode("utf-8", errors="replace")
+    return "".join(ch if ch.isprintable() or ch in "\n\x00" else "." for ch in text.replace("\r\n", "\n")).strip()
+
+
+class PortScanner:
+    """Async TCP-connect and UDP port scanner with banner grabbing and a per-port TTL cache
+
+    Every probe is paced by one token bucket and bounded by a global
+    connection cap; per-scan concurrency bounds a single request. Results are
+    cached per (host, protocol, port), and concurrent scans of the same port
+    share one probe.
+    """
+
+    def __init__(self, discovery=network_discovery, concurrency: int = 100, max_concurrency: int = 512,
+                 rate: float = 1000.0, timeout: float = 1.0, banner_timeout: float = 1.5,
+                 ttl: float = 600.0, max_entries: int = 65536, max_ports: int = 4096):
+        self.discovery = discovery
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.banner_timeout = banner_timeout
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_ports = max_ports
+        self.limiter = RateLimiter(rate)
+        # (ip, protocol, port) -> (result, expires_at), oldest first
+        self.cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.probes = 0
+        self.hits = 0
+
+    def _cached(self, key: tuple) -> Optional[Dict[str, Any]]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        result, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return result
+
+    def _store(self, key: tuple, result: Dict[str, Any]):
+        self.cache[key] = (result, time.monotonic() + self.ttl)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def invalidate(self, ip: Optional[str] = None):
+        """Drop the cached results of one host, or of every host"""
+        if ip is None:
+            self.cache.clear()
+            return
+        for key in [key for key in self.cache if key[0] == ip]:
+            del self.cache[key]
+
+    async def resolve(self, host: str) -> Optional[str]:
+        """host itself when it is an address, else its first IPv4 (or IPv6) address; None if unresolvable"""
+        try:
+            return str(ipaddress.ip_address(host))
+        except ValueError:
+            pass
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            return None
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        return infos[0][4][0] if infos else None
+
+    async def _tcp(self, ip: str, port: int, timeout: float) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except asyncio.TimeoutError:
+            return {"state": "filtered", "rtt_ms": None}
+        except ConnectionRefusedError:
+            return {"state": "closed", "rtt_ms": round((time.monotonic() - started) * 1000, 3)}
+        except OSError:
+            return {"state": "filtered", "rtt_ms": None}  # Host or network unreachable
+        rtt = round((time.monotonic() - started) * 1000, 3)
+        data = b""
+        try:
+            if port not in TLS_PORTS:
+                # Client-first services (HTTP, Redis, memcached) get a probe; the rest get time to greet
+                probe = TCP_PROBES.get(port)
+                if probe is not None:
+                    writer.write(probe)
+                    await writer.drain()
+                data = await asyncio.wait_for(reader.read(MAX_BANNER), self.banner_timeout)
+        except (asyncio.TimeoutError, OSError):
+            pass  # Open, but silent
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        banner = clean_banner(data)
+        service, product = fingerprint(port, "tcp", banner)
+        return {"state": "open", "rtt_ms": rtt, "service": service, "product": product, "banner": banner or None}
+
+    async def _udp(self, ip: str, port: int, timeout: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ipaddress.ip_address(ip).version == 6 else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        started = time.monotonic()
+        try:
+            # A connected socket reports the ICMP port-unreachable as ECONNREFUSED on the next receive
+            await loop.sock_connect(sock, (ip, port))
+            await loop.sock_sendall(sock, UDP_PROBES.get(port, b""))
+            data = await asyncio.wait_for(loop.sock_recv(sock, MAX_BANNER), timeout)
+        except asyncio.TimeoutError:
+            # No answer: either nothing rejected the probe or a firewall dropped it
+            return {"state": "open|filtered", "rtt_ms": None}
+        except ConnectionRefusedError:
+            return {"state": "closed", "rtt_ms": round((time.monotonic() - started) * 1000, 3)}
+        except OSError:
+            return {"state": "filtered", "rtt_ms": None}
+        finally:
+            sock.close()
+        service, product = fingerprint(port, "udp", clean_banner(data))
+        return {"state": "open", "rtt_ms": round((time.monotonic() - started) * 1000, 3), "service": service,
+                "product": product, "banner": None, "response_bytes": len(data)}
+
+    async def probe(self, ip: str, protocol: str, port: int, refresh: bool = False,
+                    timeout: Optional[float] = None) -> Dict[str, Any]:
+        """One port's result, from the cache unless refresh or expired"""
+        key = (ip, protocol, port)
+        if not refresh:
+            cached = self._cached(key)
+            if cached is not None:
+                self.hits += 1
+                return {**cached, "cached": True}
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The probe we joined died with its caller (e.g. a client disconnect): run our own
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.probe(ip, protocol, port, refresh, timeout)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_concurrency)
+            async with self._slots:
+                await self.limiter.acquire()
+                self.probes += 1
+                engine = self._tcp if protocol == "tcp" else self._udp
+                result = await engine(ip, port, timeout or self.timeout)
+            result = {"port": port, "protocol": protocol, **result, "scanned_at": time.time()}
+            self._store(key, result)
+            result = {**result, "cached": False}
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved: waiters re-raise it, nobody else needs to
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def scan(self, ip: str, tcp_ports: Optional[List[int]] = None, udp_ports: Optional[List[int]] = None,
+                   refresh: bool = False, concurrency: Optional[int] = None,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Scan the given TCP (default: common ports) and UDP ports of one host"""
+        ipaddress.ip_address(ip)  # Only literal addresses; raises ValueError otherwise
+        tcp_ports = TOP_TCP_PORTS if tcp_ports is None else tcp_ports
+        udp_ports = udp_ports or []
+        if len(tcp_ports) + len(udp_ports) > self.max_ports:
+            raise ValueError(f"At most {self.max_ports} ports per scan")
+        limit = max(1, min(concurrency or self.concurrency, self.max_concurrency))
+        targets = [("tcp", port) for port in tcp_ports] + [("udp", port) for port in udp_ports]
+        started = time.monotonic()
+        counts = {"open": 0, "closed": 0, "filtered": 0, "open|filtered": 0}
+        cached = 0
+        ports = []
+        async for result in bounded_map(lambda t: self.probe(ip, t[0], t[1], refresh, timeout), targets, limit):
+            counts[result["state"]] += 1
+            cached += result["cached"]
+            if result["state"] == "open":
+                ports.append(result)
+        ports.sort(key=lambda r: (r["protocol"], r["port"]))
+        return {
+            "ip": ip,
+            "ports": ports,
+            "scanned": len(targets),
+            "cached": cached,
+            "states": counts,
+            "elapsed_s": round(time.monotonic() - started, 3)
+        }
+
+    async def device_details(self, host: str, **scan_options) -> Optional[Dict[str, Any]]:
+        """Ping/hostname from discovery plus open ports; None if the host is unresolvable, silent and closed"""
+        ip = await self.resolve(host)
+        if ip is None:
+            return None
+        device, scan = await asyncio.gather(self.discovery.check_host(ip), self.scan(ip, **scan_options))
+        if not device and not scan["ports"]:
+            return None
+        # Hosts that drop ICMP still count when a port answered
+        device = device or {"ip": ip, "hostname": "", "status": "active", "rtt_ms": None}
+        if ip != host and not device.get("hostname"):
+            device["hostname"] = host  # No PTR record: keep the name we were asked about
+        return {**device, "open_ports": scan["ports"], "scan": {k: v for k, v in scan.items() if k != "ports"}}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_ports": len(self.cache),
+            "inflight": len(self._inflight),
+            "probes": self.probes,
+            "cache_hits": self.hits,
+            "ttl": self.ttl,
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "rate": self.limiter.rate,
+            "timeout": self.timeout
+        }
+
+
+# Create instance
+port_scanner = PortScanner(
+    concurrency=int(os.getenv("INA_PORTSCAN_CONCURRENCY", "100")),
+    max_concurrency=int(os.getenv("INA_PORTSCAN_MAX_CONCURRENCY", "512")),
+    rate=float(os.getenv("INA_PORTSCAN_RATE", "1000")),
+    timeout=float(os.getenv("INA_PORTSCAN_TIMEOUT", "1")),
+    banner_timeout=float(os.getenv("INA_PORTSCAN_BANNER_TIMEOUT", "1.5")),
+    ttl=float(os.getenv("INA_PORTSCAN_TTL", "600"))
+)
@@ -0,0 +1,330 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import socket
+import time
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
+
+from history_store import PROBE_TIERS, HistoryStore
+from icmp_sweep import icmp_sweeper
+from online_detector import PING_TIME_RE
+from profiling import profiler
+
+PROBE_KINDS = ("icmp", "tcp", "dns")
+
+
+class ProbeTarget:
+    """A monitored endpoint and its recent results"""
+
+    def __init__(self, target_id: str, host: str, kind: str, interval: float,
+                 port: Optional[int] = None, window: int = 4):
+        self.id = target_id
+        self.host = host
+        self.kind = kind
+        self.port = port
+        self.interval = interval
+        self.recent = deque(maxlen=window)  # (timestamp, rtt_ms or None)
+        self.last: Optional[Dict[str, Any]] = None
+        self.running = False
+        self.probes = 0
+        self.failures = 0
+
+    def window_metrics(self) -> Dict[str, Any]:
+        """Loss and RTT statistics over the recent probe window (like ping -c N)"""
+        rtts = [rtt for _, rtt in self.recent if rtt is not None]
+        sent = len(self.recent)
+        metrics = {
+            "sent": sent,
+            "received": len(rtts),
+            "loss_percent": round(100.0 * (sent - len(rtts)) / sent, 1) if sent else 0.0,
+            "rtts": rtts,
+            "min_rtt": None, "avg_rtt": None, "max_rtt": None, "mdev_rtt": None
+        }
+        if rtts:
+            avg = sum(rtts) / len(rtts)
+            metrics.update({
+                "min_rtt": min(rtts),
+                "avg_rtt": avg,
+                "max_rtt": max(rtts),
+                "mdev_rtt": math.sqrt(sum((r - avg) ** 2 for r in rtts) / len(rtts))
+            })
+        return metrics
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.last["timestamp"] if self.last else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "host": self.host,
+            "kind": self.kind,
+            "port": self.port,
+            "interval": self.interval,
+            "probes": self.probes,
+            "failures": self.failures,
+            "last": self.last,
+            "window": self.window_metrics()
+        }
+
+
+class RateLimiter:
+    """Token bucket shared by every probe"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProbeScheduler:
+    """Runs ICMP, TCP-connect and DNS probes for registered targets on per-target intervals
+
+    Each target's RTTs go to the scheduler's own history, one compact series per
+    target id sized to max_targets, so they never crowd out the shared store.
+    """
+
+    def __init__(self, concurrency: int = 200, rate: float = 500.0, timeout: float = 2.0,
+                 jitter: float = 0.1, min_interval: float = 1.0, max_targets: int = 10000,
+                 resolve_ttl: float = 300.0, sweeper=icmp_sweeper):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.jitter = jitter
+        self.min_interval = min_interval
+        self.max_targets = max_targets
+        self.resolve_ttl = resolve_ttl
+        self.sweeper = sweeper
+        self.history = HistoryStore(PROBE_TIERS, max_series=max_targets)
+        self.limiter = RateLimiter(rate)
+        self.targets: Dict[str, ProbeTarget] = {}
+        self.listeners: List[Callable[[ProbeTarget, Dict[str, Any]], Any]] = []
+        self._heap: List[tuple] = []  # (due, seq, target id)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._probes: Set[asyncio.Task] = set()  # The loop only keeps weak references to tasks
+        self._resolved: Dict[str, Tuple[float, Optional[str]]] = {}  # host -> (expires, IPv4 or None)
+        self.inflight = 0
+        self.skipped = 0
+
+    def add_listener(self, listener: Callable[[ProbeTarget, Dict[str, Any]], Any]):
+        """Call listener(target, result) after every probe"""
+        self.listeners.append(listener)
+
+    def add_target(self, host: str, kind: str = "icmp", interval: float = 30.0,
+                   port: Optional[int] = None) -> ProbeTarget:
+        """Register a target; the first probe runs immediately"""
+        if kind not in PROBE_KINDS:
+            raise ValueError(f"Unknown probe kind '{kind}', expected one of {', '.join(PROBE_KINDS)}")
+        if kind == "tcp" and not port:
+            raise ValueError("TCP probes need a port")
+        if len(self.targets) >= self.max_targets:
+            raise ValueError(f"Target limit of {self.max_targets} reached")
+        target = ProbeTarget(f"T{next(self._ids)}", host, kind, max(interval, self.min_interval), port)
+        self.targets[target.id] = target
+        self._schedule(target, time.monotonic())
+        return target
+
+    def remove_target(self, target_id: str) -> bool:
+        # Stale heap entries are skipped when popped
+        target = self.targets.pop(target_id, None)
+        if target is None:
+            return False
+        self.history.remove(target_id)
+        if not any(t.host == target.host for t in self.targets.values()):
+            self._resolved.pop(target.host, None)
+        return True
+
+    def find(self, host: str, kind: str = "icmp") -> Optional[ProbeTarget]:
+        """Monitored target for host, if any"""
+        for target in self.targets.values():
+            if target.host == host and target.kind == kind:
+                return target
+        return None
+
+    def _schedule(self, target: ProbeTarget, due: float):
+        heapq.heappush(self._heap, (due, next(self._seq), target.id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._probes):
+            task.cancel()
+        await asyncio.gather(*self._probes, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, target_id = heapq.heappop(self._heap)
+                target = self.targets.get(target_id)
+                if target is None:
+                    continue
+                # Next run: interval plus jitter so targets don't fire in lock-step
+                spread = target.interval * self.jitter
+                self._schedule(target, now + target.interval + random.uniform(-spread, spread))
+                if target.running:
+                    self.skipped += 1  # Previous probe still in flight
+                    continue
+                await self._slots.acquire()
+                await self.limiter.acquire()
+                target.running = True
+                task = asyncio.create_task(self._probe(target))
+                self._probes.add(task)
+                task.add_done_callback(self._probes.discard)
+
+            self._wakeup.clear()
+            delay = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _probe(self, target: ProbeTarget):
+        self.inflight += 1
+        try:
+            result = await self.probe(target.kind, target.host, target.port)
+        except Exception as e:
+            result = {"ok": False, "rtt_ms": None, "error": str(e)}
+        finally:
+            self.inflight -= 1
+            target.running = False
+            self._slots.release()
+
+        result["timestamp"] = time.time()
+        target.last = result
+        target.recent.append((result["timestamp"], result["rtt_ms"]))
+        target.probes += 1
+        if not result["ok"]:
+            target.failures += 1
+        elif result["rtt_ms"] is not None and target.id in self.targets:
+            self.history.record(target.id, result["rtt_ms"], result["timestamp"])
+        for listener in self.listeners:
+            try:
+                outcome = listener(target, result)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+            except Exception as e:
+                logging.error(f"Probe listener error: {str(e)}")
+
+    async def probe(self, kind: str, host: str, port: Optional[int] = None) -> Dict[str, Any]:
+        """Run one probe and return {"ok", "rtt_ms", "error"}"""
+        if kind == "icmp":
+            return await self._probe_icmp(host)
+        if kind == "tcp":
+            return await self._probe_tcp(host, port)
+        return await self._probe_dns(host)
+
+    async def resolve(self, host: str) -> Optional[str]:
+        """IPv4 address for host, cached for resolve_ttl seconds (failures too)"""
+        try:
+            return socket.inet_ntoa(socket.inet_aton(host))
+        except OSError:
+            pass
+        cached = self._resolved.get(host)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        ip = None
+        try:
+            with profiler.span("dns.resolve"):
+                infos = await asyncio.wait_for(
+                    asyncio.get_running_loop().getaddrinfo(host, None, family=socket.AF_INET), self.timeout)
+            ip = infos[0][4][0] if infos else None
+        except (asyncio.TimeoutError, OSError):
+            pass
+        self._resolved[host] = (time.monotonic() + self.resolve_ttl, ip)
+        return ip
+
+    async def _probe_icmp(self, host: str) -> Dict[str, Any]:
+        ip = await self.resolve(host)
+        if ip is None:
+            return {"ok": False, "rtt_ms": None, "error": f"Cannot resolve {host}"}
+        if self.sweeper.available():
+            rtt = await self.sweeper.ping(ip, timeout=self.timeout)
+            return {"ok": rtt is not None, "rtt_ms": rtt, "error": None if rtt is not None else "timeout"}
+
+        with profiler.span("subprocess.ping"):
+            proc = await asyncio.create_subprocess_exec(
+                "ping", "-c", "1", "-W", str(max(1, int(self.timeout))), ip,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await proc.communicate()
+        match = PING_TIME_RE.search(stdout.decode(errors="ignore"))
+        if proc.returncode == 0 and match:
+            return {"ok": True, "rtt_ms": float(match.group(1)), "error": None}
+        return {"ok": False, "rtt_ms": None, "error": stderr.decode(errors="ignore").strip() or "timeout"}
+
+    async def _probe_tcp(self, host: str, port: int) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "rtt_ms": None, "error": "timeout"}
+        except OSError as e:
+            return {"ok": False, "rtt_ms": None, "error": e.strerror or str(e)}
+        rtt = (time.monotonic() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return {"ok": True, "rtt_ms": rtt, "error": None}
+
+    async def _probe_dns(self, host: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            infos = await asyncio.wait_for(loop.getaddrinfo(host, None), self.timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "rtt_ms": None, "error": "timeout"}
+        except socket.gaierror as e:
+            return {"ok": False, "rtt_ms": None, "error": e.strerror or str(e)}
+        return {
+            "ok": True,
+            "rtt_ms": (time.monotonic() - started) * 1000,
+            "error": None,
+            "addresses": sorted({info[4][0] for info in infos})
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "targets": len(self.targets),
+            "max_targets": self.max_targets,
+            "inflight": self.inflight,
+            "concurrency": self.concurrency,
+            "rate": self.limiter.rate,
+            "skipped": self.skipped,
+            "resolved_hosts": len(self._resolved),
+            "history": self.history.stats()
+        }
@@ -0,0 +1,130 @@
+import logging
+import os
+import re
+import socket
+from collections import Counter
+from typing import Dict, Any, Tuple
+
+PROC_NET_DIR = "/proc/net"
+
+# (file, protocol, address family)
+PROC_NET_TABLES = [
+    ("tcp", "TCP", socket.AF_INET),
+    ("tcp6", "TCP", socket.AF_INET6),
+    ("udp", "UDP", socket.AF_INET),
+    ("udp6", "UDP", socket.AF_INET6),
+]
+
+# Kernel socket states (include/net/tcp_states.h)
+TCP_STATES = {
+    "01": "ESTABLISHED",
+    "02": "SYN_SENT",
+    "03": "SYN_RECV",
+    "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2",
+    "06": "TIME_WAIT",
+    "07": "CLOSE",
+    "08": "CLOSE_WAIT",
+    "09": "LAST_ACK",
+    "0A": "LISTEN",
+    "0B": "CLOSING",
+    "0C": "NEW_SYN_RECV",
+}
+
+# Connections counted towards top sources/destinations
+ACTIVE_STATES = ("01", "02")
+
+# "   sl: LOCAL:PORT REMOTE:PORT ST ..." -- only addresses, ports and state are needed
+ROW_RE = re.compile(rb": ([0-9A-F]+):([0-9A-F]{4}) ([0-9A-F]+):([0-9A-F]{4}) ([0-9A-F]{2}) ")
+
+
+def decode_address(hex_addr: str, family: int) -> str:
+    """Decode a /proc/net hex address (host byte order words) into an IP string"""
+    raw = bytes.fromhex(hex_addr)
+    if family == socket.AF_INET:
+        return socket.inet_ntop(socket.AF_INET, raw[::-1])
+    raw = b"".join(raw[i:i + 4][::-1] for i in range(0, 16, 4))
+    if raw[:12] == b"\x00" * 10 + b"\xff\xff":
+        # IPv4-mapped IPv6 address
+        return socket.inet_ntop(socket.AF_INET, raw[12:])
+    return socket.inet_ntop(socket.AF_INET6, raw)
+
+
+def parse_table(data: bytes) -> Tuple[Counter, Counter, Counter, Counter]:
+    """Count states, active local/remote addresses and service ports in one /proc/net table
+
+    Returns (state counts, local address counts, remote address counts, port
+    counts), with addresses still in their hex form so each distinct one is
+    decoded only once. The service port of a connection is the lower of its
+    two ports, since the other end is almost always ephemeral.
+    """
+    # One regex pass over the whole table; rows collapse to distinct (local, remote, state)
+    rows = Counter(ROW_RE.findall(data))
+    states = Counter()
+    local = Counter()
+    remote = Counter()
+    ports = Counter()
+    for (local_addr, local_port, remote_addr, remote_port, state), count in rows.items():
+        state = state.decode()
+        states[state] += count
+        if state in ACTIVE_STATES:
+            local[local_addr] += count
+            remote[remote_addr] += count
+            ports[min(int(local_port, 16), int(remote_port, 16))] += count
+    return states, local, remote, ports
+
+
+class ProcNetCollector:
+    """Reads socket tables straight from /proc/net instead of spawning netstat"""
+
+    def __init__(self, proc_dir: str = PROC_NET_DIR):
+        self.proc_dir = proc_dir
+
+    def available(self) -> bool:
+        """Check whether the kernel socket tables can be read"""
+        return os.path.exists(os.path.join(self.proc_dir, "tcp"))
+
+    def collect(self) -> Dict[str, Any]:
+        """Return per-protocol and per-state counts plus active source/destination/port counts"""
+        protocols = {"TCP": 0, "UDP": 0}
+        states: Dict[str, Counter] = {"TCP": Counter(), "UDP": Counter()}
+        sources = Counter()
+        destinations = Counter()
+        ports = Counter()
+
+        for name, protocol, family in PROC_NET_TABLES:
+            path = os.path.join(self.proc_dir, name)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue  # e.g. IPv6 disabled
+            except OSError as e:
+                logging.error(f"Failed to read {path}: {str(e)}")
+                continue
+
+            table_states, local, remote, table_ports = parse_table(data)
+            protocols[protocol] += sum(table_states.values())
+            states[protocol].update(table_states)
+            for hex_addr, count in local.items():
+                sources[decode_address(hex_addr.decode(), family)] += count
+            for hex_addr, count in remote.items():
+                destinations[decode_address(hex_addr.decode(), family)] += count
+            for port, count in table_ports.items():
+                ports[f"{protocol}/{port}"] += count
+
+        return {
+            "protocols": protocols,
+            "states": {
+                # UDP sockets reuse the TCP state numbers (07 = unconnected, 01 = connected)
+                protocol: {TCP_STATES.get(code, code): count for code, count in counts.items()}
+                for protocol, counts in states.items()
+            },
+            "sources": dict(sources),
+            "destinations": dict(destinations),
+            "ports": dict(ports)
+        }
+
+
+# Create instance
+proc_net_collector = ProcNetCollector()
@@ -0,0 +1,189 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+from typing import Dict, Any
+
+from performance_metrics import LATENCY_BOUNDS, LatencyHistogram
+
+# Prometheus buckets: every fourth histogram bound, i.e. one per doubling
+PROMETHEUS_BOUNDS = list(range(3, len(LATENCY_BOUNDS), 4))
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Opt-in timing spans around hot calls and on-demand cProfile captures
+
+    While disabled, span() hands back one shared no-op context manager, so an
+    instrumented call costs an attribute check and two empty method calls.
+    """
+
+    def __init__(self, enabled: bool = False, max_seconds: float = 60.0):
+        self.enabled = enabled
+        self.max_seconds = max_seconds
+        self.lock = threading.Lock()
+        self.spans: Dict[str, LatencyHistogram] = {}
+        self._capturing = False
+
+    def span(self, name: str):
+        """with profiler.span("dns.ptr"): ... records the block's wall time under name"""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def record(self, name: str, ms: float):
+        histogram = self.spans.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.spans.setdefault(name, LatencyHistogram())
+        histogram.record(ms)
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, total, mean and percentiles for every span"""
+        with self.lock:
+            spans = list(self.spans.items())
+        return {
+            name: {
+                "count": h.total,
+                "total_ms": round(h.sum_ms, 3),
+                "mean_ms": round(h.sum_ms / h.total, 3) if h.total else None,
+                "max_ms": round(h.max_ms, 3),
+                **LatencyHistogram.percentiles(h.counts, h.total)
+            } for name, h in sorted(spans)
+        }
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+
+    async def capture(self, seconds: float, sort: str = "cumulative", limit: int = 40,
+                      raw: bool = False):
+        """cProfile the event loop thread for seconds; pstats text, or marshalled stats when raw"""
+        if self._capturing:
+            raise ProfilerBusy("A profile capture is already running")
+        seconds = min(max(seconds, 0.1), self.max_seconds)
+        self._capturing = True
+        profile = cProfile.Profile()
+        try:
+            # Everything the loop runs while this coroutine sleeps lands in the profile
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        finally:
+            self._capturing = False
+        profile.create_stats()
+        if raw:
+            return marshal.dumps(profile.stats)  # Loadable with pstats.Stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "spans": len(self.spans),
+            "capturing": self._capturing,
+            "max_seconds": self.max_seconds
+        }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(metric: str, labels: str, h: LatencyHistogram):
+    counts = h.counts
+    cumulative = 0
+    start = 0
+    for index in PROMETHEUS_BOUNDS:
+        cumulative += sum(counts[start:index + 1])
+        start = index + 1
+        yield f'{metric}_bucket{{{labels},le="{LATENCY_BOUNDS[index] / 1000:.6g}"}} {cumulative}'
+    yield f'{metric}_bucket{{{labels},le="+Inf"}} {h.total}'
+    yield f"{metric}_sum{{{labels}}} {h.sum_ms / 1000:.6f}"
+    yield f"{metric}_count{{{labels}}} {h.total}"
+
+
+def prometheus_text(collector, profiler: Profiler) -> str:
+    """Request and span histograms plus the latest host sample in Prometheus text format"""
+    lines = [
+        "# HELP ina_http_request_duration_seconds Request latency by route",
+        "# TYPE ina_http_request_duration_seconds histogram"
+    ]
+    with collector.lock:
+        routes = sorted(collector.histograms.items())
+    for route, h in routes:
+        method, _, path = route.partition(" ")
+        lines.extend(_histogram_lines("ina_http_request_duration_seconds",
+                                      f'method="{_label(method)}",route="{_label(path)}"', h))
+    lines += ["# HELP ina_http_requests_in_flight Requests being served",
+              "# TYPE ina_http_requests_in_flight gauge",
+              f"ina_http_requests_in_flight {collector.in_flight}"]
+
+    with profiler.lock:
+        spans = sorted(profiler.spans.items())
+    lines += ["# HELP ina_span_duration_seconds Time spent in instrumented calls (subprocess, DNS, model, JSON)",
+              "# TYPE ina_span_duration_seconds histogram"]
+    for name, h in spans:
+        lines.extend(_histogram_lines("ina_span_duration_seconds", f'span="{_label(name)}"', h))
+
+    snapshot = collector.snapshot or {}
+    gauges = [
+        ("ina_host_cpu_percent", "Host CPU utilisation", snapshot.get("host", {}).get("cpu_percent")),
+        ("ina_host_memory_percent", "Host memory utilisation", snapshot.get("host", {}).get("memory_percent")),
+        ("ina_process_cpu_percent", "Backend process CPU utilisation",
+         snapshot.get("process", {}).get("cpu_percent")),
+        ("ina_process_resident_memory_bytes", "Backend process RSS", snapshot.get("process", {}).get("rss_bytes"))
+    ]
+    for name, help_text, value in gauges:
+        if value is not None:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    interfaces = snapshot.get("interfaces", {})
+    for key, help_text in (("rx_bps", "Interface receive rate"), ("tx_bps", "Interface transmit rate")):
+        lines += [f"# HELP ina_interface_{key} {help_text} in bits per second", f"# TYPE ina_interface_{key} gauge"]
+        lines += [f'ina_interface_{key}{{interface="{_label(nic)}"}} {rates[key]}'
+                  for nic, rates in sorted(interfaces.items())]
+    return "\n".join(lines) + "\n"
+
+
+# Create instance
+profiler = Profiler(
+    enabled=os.getenv("INA_PROFILING", "").lower() in ("1", "true", "yes"),
+    max_seconds=float(os.getenv("INA_PROFILE_MAX_SECONDS", "60"))
+)
@@ -1,3 +1,5 @@
+import os
+import time
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from joblib import dump
@@ -17,7 +19,15 @@ training_data = np.vstack((normal_data, anomalies))
 model = IsolationForest(n_estimators=100, contamination=0.05, random_state=42)
 model.fit(training_data)
 
-# Step 3: Save the trained model
-dump(model, "network_anomaly_model.pkl")
+# Step 3: Save the trained model with its version and feature schema
+# (the API validates both before hot-swapping the new file in). Write to a
+# temporary file and rename so a running API never reads a partial file.
+# Left uncompressed (joblib's default) so the API can memory-map it.
+dump({
+    "model": model,
+    "version": time.strftime("%Y%m%d%H%M%S"),
+    "features": ["avg_rtt", "max_rtt", "num_hops"]
+}, "network_anomaly_model.pkl.tmp")
+os.replace("network_anomaly_model.pkl.tmp", "network_anomaly_model.pkl")
 
 print("✅ Model retrained and saved successfully!")
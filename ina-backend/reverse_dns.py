@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+from profiling import profiler
+
+
+def system_lookup(ip: str) -> str:
+    """Blocking PTR lookup through the system resolver (honours /etc/hosts)"""
+    try:
+        hostname, _, _ = socket.gethostbyaddr(ip)
+        return hostname
+    except (socket.herror, socket.gaierror):
+        return ""
+
+
+class ReverseResolver:
+    """Non-blocking reverse-DNS lookups with bounded parallelism and an LRU/TTL cache"""
+
+    def __init__(self, lookup: Callable[[str], str] = system_lookup, max_workers: int = 16,
+                 positive_ttl: float = 3600, negative_ttl: float = 300, max_entries: int = 4096):
+        self.lookup = lookup
+        self.max_workers = max_workers
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ina-rdns")
+        # ip -> (hostname, expires_at), oldest first
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # ip -> future of a lookup already in progress
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, ip: str) -> Optional[str]:
+        entry = self.cache.get(ip)
+        if entry is None:
+            return None
+        hostname, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.cache[ip]
+            return None
+        self.cache.move_to_end(ip)
+        return hostname
+
+    def _store(self, ip: str, hostname: str):
+        ttl = self.positive_ttl if hostname else self.negative_ttl
+        self.cache[ip] = (hostname, time.monotonic() + ttl)
+        self.cache.move_to_end(ip)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    async def resolve(self, ip: str) -> str:
+        """Return the PTR name for ip, or "" when it has none"""
+        hostname = self._cached(ip)
+        if hostname is not None:
+            self.hits += 1
+            return hostname
+        self.misses += 1
+
+        # Coalesce concurrent lookups of the same address
+        inflight = self._inflight.get(ip)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The lookup we joined died with its caller: look up again unless we are the one cancelled
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.resolve(ip)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[ip] = future
+        try:
+            hostname = await self._lookup(ip)
+            self._store(ip, hostname)
+            future.set_result(hostname)
+            return hostname
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[ip]
+
+    async def _lookup(self, ip: str) -> str:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            try:
+                with profiler.span("dns.ptr"):
+                    return await loop.run_in_executor(self.executor, self.lookup, ip)
+            except Exception as e:
+                logging.error(f"Reverse DNS lookup failed for {ip}: {str(e)}")
+                return ""
+
+    def invalidate(self, ip: Optional[str] = None):
+        """Drop one cached entry, or the whole cache"""
+        if ip is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(ip, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report cache size and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# Create instance
+reverse_resolver = ReverseResolver(
+    max_workers=int(os.getenv("INA_RDNS_WORKERS", "16")),
+    positive_ttl=float(os.getenv("INA_RDNS_TTL", "3600")),
+    negative_ttl=float(os.getenv("INA_RDNS_NEGATIVE_TTL", "300")),
+    max_entries=int(os.getenv("INA_RDNS_CACHE_SIZE", "4096"))
+)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Backend modules are flat files imported by name, as uvicorn does from ina-backend/
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
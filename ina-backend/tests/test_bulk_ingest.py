@@ -0,0 +1,131 @@
+import random
+import socket
+import struct
+
+import numpy as np
+import pytest
+
+from benchmark import write_pcap
+from bulk_ingest import ingest_csv, ingest_pcap
+
+
+def write_flows(tmp_path, rows):
+    path = tmp_path / "flows.csv"
+    path.write_text("ts,src,dst,dport,proto,bytes,packets\n" + "\n".join(rows) + "\n")
+    return str(path)
+
+
+def test_datetime_timestamps_bucket_by_interval(tmp_path):
+    path = write_flows(tmp_path, [
+        "2024-01-01 00:00:10,10.0.0.1,10.0.0.2,443,TCP,100,1",
+        "2024-01-01 00:00:50,10.0.0.1,10.0.0.2,443,TCP,200,2",
+        "2024-01-01 00:01:30,10.0.0.3,10.0.0.2,53,UDP,50,1"
+    ])
+    result = ingest_csv(path, interval=60)
+    start = 1704067200.0  # 2024-01-01T00:00:00Z
+    assert result["timeseries"] == [
+        {"start": start, "bytes": 300, "packets": 3},
+        {"start": start + 60, "bytes": 50, "packets": 1}
+    ]
+    assert result["untimed_records"] == 0
+
+
+def test_unparseable_timestamp_is_left_out_of_the_time_series(tmp_path):
+    path = write_flows(tmp_path, [
+        "2024-01-01 00:00:10,10.0.0.1,10.0.0.2,443,TCP,100,1",
+        "not a time,10.0.0.9,10.0.0.2,443,TCP,700,7"
+    ])
+    result = ingest_csv(path, interval=60)
+    assert [b["start"] for b in result["timeseries"]] == [1704067200.0]
+    assert result["untimed_records"] == 1
+    # Still counted in the totals and host rankings
+    assert result["records"] == 2
+    assert result["totals"] == {"bytes": 800, "packets": 8}
+    assert result["topSources"][0] == {"ip": "10.0.0.9", "bytes": 700, "packets": 7}
+
+
+def test_epoch_milliseconds(tmp_path):
+    path = write_flows(tmp_path, ["1704067210000,10.0.0.1,10.0.0.2,443,TCP,100,1"])
+    assert ingest_csv(path, interval=60)["timeseries"][0]["start"] == 1704067200.0
+
+
+def frame(src, dst, sport, dport, flags, ttl=64, payload=0):
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, flags, 65535, 0, 0)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 40 + payload, 0, 0, ttl, 6, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + ip + tcp + bytes(payload)
+
+
+def write_frames(tmp_path, packets):
+    """Ethernet pcap from (ts, frame) pairs"""
+    path = tmp_path / "capture.pcap"
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts, data in packets:
+            f.write(struct.pack("<IIII", int(ts), round(ts % 1 * 1e6), len(data), len(data)) + data)
+    return str(path)
+
+
+def handshake(ts, client, server, sport, rtt, ttl, payload):
+    """SYN, SYN-ACK after rtt seconds from a server that sent it with ttl, then one data segment"""
+    return [
+        (ts, frame(client, server, sport, 443, 0x02)),
+        (ts + rtt, frame(server, client, 443, sport, 0x12, ttl=ttl)),
+        (ts + rtt + 0.001, frame(client, server, sport, 443, 0x18, payload=payload))
+    ]
+
+
+class ThresholdModel:
+    """decision_function stand-in: negative (anomalous) past 100 ms average RTT"""
+
+    def decision_function(self, matrix):
+        return 0.5 - matrix[:, 0] / 100.0
+
+
+def test_pcap_hosts_time_series_and_handshake_features(tmp_path):
+    start = 1704067200.0
+    path = write_frames(tmp_path, [
+        *handshake(start + 5, "192.168.1.10", "10.0.0.1", 40000, 0.020, 58, 1000),
+        *handshake(start + 65, "192.168.1.10", "10.0.0.1", 40001, 0.030, 58, 1000),
+        *handshake(start + 70, "192.168.1.11", "10.0.0.2", 40002, 0.400, 110, 200),
+        (start + 71, b"\x00" * 12 + b"\x08\x06" + b"\x00" * 28)  # ARP
+    ])
+    result = ingest_pcap(path, interval=60, model=ThresholdModel())
+
+    assert result["records"] == 9 and result["non_ip_packets"] == 1
+    assert result["topSources"][0] == {"ip": "192.168.1.10", "bytes": 2 * (54 + 1054), "packets": 4}
+    assert [d["ip"] for d in result["topDestinations"]] == ["10.0.0.1", "10.0.0.2", "192.168.1.10",
+                                                             "192.168.1.11"]
+    assert [(b["start"], b["packets"]) for b in result["timeseries"]] == [(start, 3), (start + 60, 6)]
+
+    anomalies = result["anomalies"]
+    assert anomalies["source"] == "tcp-handshakes" and anomalies["scored"] == 2
+    slow, normal = anomalies["top"]
+    # 110 is counted down from an initial TTL of 128
+    assert (slow["target"], slow["num_hops"], slow["label"]) == ("10.0.0.2", 19, -1)
+    assert slow["avg_rtt"] == pytest.approx(400, abs=0.01)
+    assert (normal["target"], normal["num_hops"], normal["label"]) == ("10.0.0.1", 7, 1)
+    assert normal["avg_rtt"] == pytest.approx(25, abs=0.01) and normal["max_rtt"] == pytest.approx(30, abs=0.01)
+    assert anomalies["anomalous"] == 1
+
+
+def test_benchmark_pcap_scores_every_server(tmp_path):
+    IsolationForest = pytest.importorskip("sklearn.ensemble").IsolationForest
+    path = str(tmp_path / "bench.pcap")
+    write_pcap(path, 4000)
+    rng = random.Random(1)
+    rtts = [rng.gauss(20, 2) for _ in range(500)]
+    normal = np.array([[rtt, rtt + abs(rng.gauss(0, 1)), rng.choice((6, 7, 8))] for rtt in rtts])
+    model = IsolationForest(random_state=0).fit(normal)
+
+    result = ingest_pcap(path, interval=1, top=5, model=model)
+    assert result["records"] == 4000 and result["non_ip_packets"] == 0
+    assert result["totals"]["packets"] == 4000
+    assert sum(b["packets"] for b in result["timeseries"]) == 4000
+    assert {p["protocol"] for p in result["topPorts"]} == {"TCP"}
+    # One handshake per 8-packet connection, each with a server 7 hops away
+    anomalies = result["anomalies"]
+    assert 0 < anomalies["scored"] <= 500 and anomalies["anomalous"] == 0
+    assert all(row["num_hops"] == 7 for row in anomalies["top"])
+    assert len(anomalies["top"]) == 5
+    assert ingest_pcap(path)["anomalies"] is None
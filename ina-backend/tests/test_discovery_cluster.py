@@ -0,0 +1,176 @@
+import asyncio
+import ipaddress
+import json
+import time
+import urllib.parse
+
+import pytest
+
+from discovery_cluster import AgentError, DiscoveryCoordinator, http_lines
+from network_discovery import host_slice
+
+SUBNET = "10.9.0.0/24"
+
+
+def chunked(body, size):
+    """body as HTTP/1.1 chunks of at most size bytes, deliberately splitting lines"""
+    pieces = [body[i:i + size] for i in range(0, len(body), size)]
+    return b"".join(b"%x\r\n%s\r\n" % (len(p), p) for p in pieces) + b"0\r\n\r\n"
+
+
+async def serve(handler):
+    """Loopback HTTP server; handler(method, path, query) -> (status, body bytes, delay before the body)"""
+    async def respond(reader, writer):
+        request = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        method, target, _ = request.decode().split(" ", 2)
+        parts = urllib.parse.urlsplit(target)
+        status, body, delay = handler(method, parts.path, dict(urllib.parse.parse_qsl(parts.query)))
+        try:
+            writer.write(f"HTTP/1.1 {status} X\r\nTransfer-Encoding: chunked\r\n\r\n".encode())
+            await writer.drain()
+            await asyncio.sleep(delay)
+            writer.write(chunked(body, 7))
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(respond, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+def agent(delay=0.0, status=200, extra=()):
+    """An agent answering /agent/discover with every host of its shard, plus any extra addresses"""
+    def handler(method, path, query):
+        if status != 200:
+            return status, b"agent exploded", 0
+        first, count = int(query["first"]), int(query["count"])
+        ips = list(host_slice(ipaddress.ip_network(SUBNET), first, count)) + list(extra)
+        events = [{"event": "host", "device": {"ip": ip, "hostname": "", "status": "active", "rtt_ms": 1.0}}
+                  for ip in ips]
+        events += [{"event": "progress", "probed": count}, {"event": "done", "probed": count}]
+        return 200, b"".join(json.dumps(e).encode() + b"\n" for e in events), delay
+    return handler
+
+
+class LocalOnly:
+    """Local sweeper stand-in that finds every host in a slice"""
+
+    def __init__(self):
+        self.shards = []
+
+    async def iter_discovery(self, subnet, rate=None, timeout=None, concurrency=None, progress_interval=0.5,
+                             shard=None, hosts=None):
+        self.shards.append(shard)
+        first, count = shard or (0, 254)
+        for ip in host_slice(ipaddress.ip_network(subnet), first, count):
+            yield {"event": "host", "device": {"ip": ip, "hostname": "", "status": "active", "rtt_ms": 0.5}}
+        yield {"event": "done", "probed": count}
+
+
+async def sweep(coordinator):
+    return [e async for e in coordinator.iter_discovery(SUBNET, progress_interval=0.05)]
+
+
+def hosts_of(events):
+    return [e["device"]["ip"] for e in events if e["event"] == "host"]
+
+
+def test_http_lines_reassembles_lines_split_across_chunks():
+    lines = [json.dumps({"n": n, "pad": "x" * n}).encode() for n in range(30)]
+
+    async def run():
+        server, url = await serve(lambda *_: (200, b"\n".join(lines) + b"\n", 0))
+        async with server:
+            return [line async for line in http_lines(f"{url}/stream")]
+
+    assert asyncio.run(run()) == lines
+
+
+async def run_closed_port():
+    async for _ in http_lines("http://127.0.0.1:9/x", timeout=0.5):
+        pass
+
+
+def test_http_lines_surfaces_errors_and_stalls():
+    async def run(handler, timeout=2.0):
+        server, url = await serve(handler)
+        async with server:
+            return [line async for line in http_lines(f"{url}/x", timeout=timeout)]
+
+    with pytest.raises(AgentError, match="HTTP 503"):
+        asyncio.run(run(lambda *_: (503, b"busy", 0)))
+    with pytest.raises(AgentError, match="No data"):
+        asyncio.run(run(lambda *_: (200, b"late\n", 1.0), timeout=0.2))
+    with pytest.raises(AgentError, match="Cannot connect"):
+        asyncio.run(run_closed_port())
+
+
+def test_shards_are_spread_over_local_agents():
+    async def run():
+        first, url_a = await serve(agent())
+        second, url_b = await serve(agent())
+        async with first, second:
+            coordinator = DiscoveryCoordinator(LocalOnly(), (url_a, url_b), shard_hosts=32, pipeline=1)
+            return coordinator, await sweep(coordinator)
+
+    coordinator, events = asyncio.run(run())
+    assert sorted(hosts_of(events), key=ipaddress.ip_address) == [f"10.9.0.{n}" for n in range(1, 255)]
+    shards = [e for e in events if e["event"] == "shard"]
+    assert len(shards) == 8
+    assert {s["worker"] for s in shards} == set(coordinator.agents)
+    assert events[-1]["shards_done"] == 8 and events[-1]["discovered_hosts"] == 254
+
+
+def test_stragglers_are_re_dispatched_to_idle_agents():
+    async def run():
+        slow, url_slow = await serve(agent(delay=5.0))
+        fast, url_fast = await serve(agent())
+        async with slow, fast:
+            coordinator = DiscoveryCoordinator(LocalOnly(), (url_slow, url_fast), shard_hosts=32, pipeline=1)
+            started = time.monotonic()
+            events = await sweep(coordinator)
+            return coordinator, events, time.monotonic() - started, url_fast
+
+    coordinator, events, elapsed, url_fast = asyncio.run(run())
+    assert len(set(hosts_of(events))) == 254
+    # The slow agent's shard finished on the fast one instead of holding the sweep for 5 s
+    assert coordinator.speculative >= 1
+    assert elapsed < 3
+    assert {e["worker"] for e in events if e["event"] == "shard"} == {url_fast}
+
+
+def test_failed_agent_shards_are_retried_elsewhere():
+    async def run():
+        broken, url_broken = await serve(agent(status=500))
+        good, url_good = await serve(agent())
+        async with broken, good:
+            coordinator = DiscoveryCoordinator(LocalOnly(), (url_broken, url_good), shard_hosts=32, pipeline=1)
+            return coordinator, await sweep(coordinator), url_broken
+
+    coordinator, events, url_broken = asyncio.run(run())
+    assert len(set(hosts_of(events))) == 254
+    assert coordinator.retried >= 1
+    assert not coordinator.agents[url_broken].healthy()
+    assert "HTTP 500" in coordinator.agents[url_broken].last_error
+
+
+def test_hosts_outside_the_shard_are_dropped():
+    async def run():
+        rogue, url_rogue = await serve(agent(extra=["192.168.1.1", "10.9.0.0", "10.9.0.255"]))
+        async with rogue:
+            coordinator = DiscoveryCoordinator(LocalOnly(), (url_rogue,), shard_hosts=32, pipeline=1)
+            return await sweep(coordinator)
+
+    hosts = hosts_of(asyncio.run(run()))
+    assert sorted(hosts, key=ipaddress.ip_address) == [f"10.9.0.{n}" for n in range(1, 255)]
+
+
+def test_without_agents_the_sweep_runs_locally():
+    local = LocalOnly()
+    events = asyncio.run(sweep(DiscoveryCoordinator(local)))
+    assert len(hosts_of(events)) == 254
+    assert local.shards == [None]
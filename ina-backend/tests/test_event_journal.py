@@ -0,0 +1,76 @@
+import time
+
+from event_journal import EventJournal, format_time
+
+
+def test_counters_track_appends_and_survive_reopening(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = EventJournal(path)
+    for ts, severity in [(100, "high"), (200, "high"), (300, "low")]:
+        journal.append_alert(severity, "Test", "description", "Tests", ts=ts)
+    journal.append_event("Ping 10.0.0.1", "ping")
+
+    assert journal.alert_counts() == {"critical": 0, "high": 2, "medium": 0, "low": 1}
+    assert journal.count("alerts") == 3
+    assert journal.count("events") == 1
+    assert journal.count("alerts", severity="high") == 2
+
+    reopened = EventJournal(path)
+    assert reopened.alert_counts() == journal.alert_counts()
+    assert reopened.stats()["alerts"] == 3
+
+
+def test_total_honours_time_range_and_source(tmp_path):
+    journal = EventJournal(str(tmp_path / "journal.db"))
+    for ts, severity, source in [(100, "high", "ML Model"), (200, "high", "Tests"), (300, "low", "Tests")]:
+        journal.append_alert(severity, "Test", "description", source, ts=ts)
+
+    assert journal.count("alerts", 150, None) == 2
+    assert journal.count("alerts", 150, 250, severity="high") == 1
+    assert journal.count("alerts", source="Tests") == 2
+
+
+def test_events_are_batched_off_the_caller_and_visible_to_reads(tmp_path):
+    journal = EventJournal(str(tmp_path / "journal.db"), flush_interval=60)
+    for n in range(5):
+        journal.append_event(f"Ping 10.0.0.{n}", "ping", ts=100 + n)
+
+    # Nothing written yet, but counters and queries already include the queued events
+    assert journal.stats()["queued_events"] == 5 and journal.batches == 0
+    assert journal.count("events") == 5
+    page = journal.events(type_="ping", limit=3)
+    assert [e["event"] for e in page["logs"]] == ["Ping 10.0.0.2", "Ping 10.0.0.3", "Ping 10.0.0.4"]
+    assert journal.batches == 1 and journal.stats()["queued_events"] == 0
+
+
+def test_writer_thread_flushes_full_batches(tmp_path):
+    journal = EventJournal(str(tmp_path / "journal.db"), flush_interval=60, batch_size=10)
+    for n in range(10):
+        journal.append_event("Ping", "ping")
+    deadline = time.monotonic() + 2
+    while journal.batches == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert journal.batches == 1
+
+
+def test_prune_by_age_and_rows_keeps_counters_in_step(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = EventJournal(path, max_age=1000, max_rows=3, flush_interval=60)
+    for ts in range(0, 5000, 500):
+        journal.append_event("Scan", "scan", ts=ts)
+        journal.append_alert("high" if ts < 4000 else "low", "Test", "description", ts=ts)
+    journal.flush()
+
+    removed = journal.prune(now=5000)
+    # Older than 4000 goes by age; of the 4000 and 4500 rows left, all fit under max_rows
+    assert removed == {"events": 8, "alerts": 8}
+    assert journal.count("events") == 2 and journal.count("alerts") == 2
+    assert journal.alert_counts() == {"critical": 0, "high": 0, "medium": 0, "low": 2}
+
+    journal.max_age = 0
+    for ts in range(5000, 5003):
+        journal.append_event("Scan", "scan", ts=ts)
+    journal.flush()
+    assert journal.prune(now=6000)["events"] == 2
+    assert [e["timestamp"] for e in journal.events()["logs"]] == [format_time(ts) for ts in range(5000, 5003)]
+    assert EventJournal(path).count("events") == journal.count("events") == 3
@@ -0,0 +1,82 @@
+import random
+from collections import Counter
+
+import pytest
+
+from heavy_hitters import CountMinSketch, HyperLogLog, SpaceSaving, WindowedHeavyHitters, hash_key
+
+
+def zipf_stream(n, keys, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return Counter(f"10.0.{i // 256}.{i % 256}" for i in rng.choices(range(keys), weights, k=n))
+
+
+def test_count_min_never_under_counts_and_stays_within_its_bound():
+    exact = zipf_stream(50000, 5000, seed=1)
+    sketch = CountMinSketch(width=512, depth=4)
+    keys = list(exact)
+    sketch.add_many([hash_key(k) for k in keys], [exact[k] for k in keys])
+
+    estimates = sketch.estimate_many([hash_key(k) for k in keys]).tolist()
+    over = [est - exact[k] for k, est in zip(keys, estimates)]
+    assert min(over) >= 0
+    # The e/width bound holds per key with probability 1 - e^-depth
+    bound = sketch.error * sum(exact.values())
+    assert sum(o > bound for o in over) / len(over) < 0.05
+    assert sketch.estimate_many([]).size == 0
+
+
+def test_space_saving_keeps_the_heavy_keys():
+    exact = zipf_stream(50000, 5000, seed=2)
+    summary = SpaceSaving(k=50)
+    for key, count in random.Random(5).sample(list(exact.items()), len(exact)):
+        summary.add(key, count)
+
+    assert len(summary.counters) == 50
+    # Any key above total/k is guaranteed a counter
+    heavy = {key for key, count in exact.items() if count > sum(exact.values()) / 50}
+    assert len(heavy) >= 3 and heavy <= set(summary.counters)
+    for key, (count, error) in summary.counters.items():
+        # Counts are over-estimates by at most the recorded error
+        assert count - error <= exact[key] <= count
+
+
+@pytest.mark.parametrize("distinct", [100, 50000])
+def test_hyperloglog_counts_distinct_keys(distinct):
+    hll = HyperLogLog(precision=12)
+    hashes = [hash_key(f"host-{n}") for n in range(distinct)]
+    hll.add_many(hashes)
+    hll.add_many(hashes[:distinct // 2])  # Repeats change nothing
+    assert HyperLogLog.count(hll.registers) == pytest.approx(distinct, rel=0.05)
+
+
+def test_window_drops_expired_panes():
+    hitters = WindowedHeavyHitters(window=60, panes=6, k=10, width=256)
+    for second in range(0, 60, 5):
+        hitters.update({"old": 10, f"once-{second}": 1}, now=1000 + second)
+    for second in range(60, 120, 5):
+        hitters.update({"new": 20}, now=1000 + second)
+
+    result = hitters.query(n=3, now=1119)
+    assert result["samples"] == 12 and result["total"] == 240
+    assert [t["key"] for t in result["top"]] == ["new"]
+    assert result["distinct"] == 1
+    assert len(hitters.panes) <= 7
+    assert hitters.query(now=2000)["top"] == []
+
+
+def test_query_reports_counts_means_and_shares():
+    hitters = WindowedHeavyHitters(window=300, panes=10, k=10, width=1024)
+    for n in range(10):
+        hitters.update({"10.0.0.1": 300, "10.0.0.2": 100, f"10.0.1.{n}": 10}, now=500 + n)
+
+    result = hitters.query(n=2, now=510)
+    assert result["total"] == 4100 and result["samples"] == 10
+    assert result["distinct"] == 12
+    first, second = result["top"]
+    assert (first["key"], second["key"]) == ("10.0.0.1", "10.0.0.2")
+    assert first["count"] >= 3000 and first["count"] - 3000 <= result["error"]
+    assert first["value"] == pytest.approx(first["count"] / 10)
+    assert first["share"] == pytest.approx(first["count"] / 4100, abs=1e-4)
+    assert hitters.stats()["panes"] == 1
@@ -0,0 +1,43 @@
+from history_store import HistoryStore
+
+TIERS = [("raw", 0, 8), ("1m", 60, 4)]
+
+
+def test_least_recently_updated_series_is_evicted():
+    store = HistoryStore(TIERS, max_series=3)
+    store.record("traffic.bps", 1, ts=100)
+    for n in range(10):
+        store.record(f"rtt.host-{n}", n, ts=101 + n)
+        store.record("traffic.bps", 1, ts=101 + n)
+    assert store.names() == ["rtt.host-8", "rtt.host-9", "traffic.bps"]
+    assert store.evicted == 8
+    assert store.summary("traffic.bps", 0, 200)["count"] == 11
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = HistoryStore(TIERS, path=path)
+    # Wrap the raw ring so the saved columns have to be re-ordered
+    for n in range(12):
+        store.record("rtt.a", n, ts=60 * n)
+    store.record("events.scan", 1, ts=30)
+    store.save()
+
+    restored = HistoryStore(TIERS, path=path)
+    restored.load()
+    assert restored.names() == ["events.scan", "rtt.a"]
+    for name in ("rtt.a", "events.scan"):
+        assert restored.query(name, 0, 1000) == store.query(name, 0, 1000)
+        assert restored.query(name, 0, 1000, step=60) == store.query(name, 0, 1000, step=60)
+    restored.record("rtt.a", 99, ts=720)
+    assert restored.query("rtt.a", 0, 1000)["points"][-1] == {"timestamp": 720, "value": 99.0}
+
+
+def test_load_skips_a_changed_tier_layout(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = HistoryStore(TIERS, path=path)
+    store.record("rtt.a", 1, ts=10)
+    store.save()
+    other = HistoryStore([("raw", 0, 16)], path=path)
+    other.load()
+    assert other.names() == []
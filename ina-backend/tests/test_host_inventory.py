@@ -0,0 +1,149 @@
+import asyncio
+
+import host_inventory as host_inventory_module
+from host_inventory import HostInventory
+
+SUBNET = "10.9.0.0/29"
+
+
+class FakeDiscovery:
+    """Answers for a fixed set of live addresses and records what each scan probed"""
+
+    def __init__(self, live):
+        self.live = set(live)
+        self.scans = []
+
+    async def iter_discovery(self, subnet, rate=None, timeout=None, concurrency=None, hosts=None):
+        probed = list(hosts) if hosts is not None else [f"10.9.0.{n}" for n in range(1, 7)]
+        self.scans.append(probed)
+        yield {"event": "start", "subnet": subnet, "total_hosts": len(probed), "probed": 0, "discovered_hosts": 0}
+        for ip in probed:
+            if ip in self.live:
+                yield {"event": "host", "device": {"ip": ip, "hostname": "", "status": "active", "rtt_ms": 1.0}}
+        yield {"event": "done", "subnet": subnet, "total_hosts": len(probed), "probed": len(probed),
+               "discovered_hosts": 0}
+
+
+def collect(inventory, discovery, **kwargs):
+    async def run():
+        return [event async for event in inventory.iter_refresh(discovery, SUBNET, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_second_scan_streams_every_live_device(monkeypatch):
+    monkeypatch.setattr(host_inventory_module, "read_arp_table", lambda: {})
+    inventory = HostInventory(live_interval=60, dead_interval=1800)
+    discovery = FakeDiscovery(["10.9.0.2", "10.9.0.5"])
+
+    first = collect(inventory, discovery)
+    assert first[0]["event"] == "start" and first[0]["mode"] == "full"
+    assert sorted(e["device"]["ip"] for e in first if e["event"] == "host") == ["10.9.0.2", "10.9.0.5"]
+
+    # Nothing is due straight away, yet the stream still lists the known devices
+    second = collect(inventory, discovery)
+    assert [e["event"] for e in second].count("start") == 1
+    assert second[0]["mode"] == "refresh"
+    hosts = [e["device"]["ip"] for e in second if e["event"] == "host"]
+    assert sorted(hosts) == ["10.9.0.2", "10.9.0.5"]
+    done = second[-1]
+    assert done["event"] == "done" and done["discovered_hosts"] == 2
+    assert [d["ip"] for d in done["devices"]] == ["10.9.0.2", "10.9.0.5"]
+
+
+def test_refresh_reports_each_device_once(monkeypatch):
+    monkeypatch.setattr(host_inventory_module, "read_arp_table", lambda: {})
+    inventory = HostInventory(live_interval=0, dead_interval=1800)
+    discovery = FakeDiscovery(["10.9.0.2", "10.9.0.5"])
+    collect(inventory, discovery)
+
+    # Both hosts are due; .5 misses one echo but stays active
+    discovery.live = {"10.9.0.2"}
+    events = collect(inventory, discovery)
+    assert set(discovery.scans[-1]) >= {"10.9.0.2", "10.9.0.5"}
+    hosts = [e["device"]["ip"] for e in events if e["event"] == "host"]
+    assert sorted(hosts) == ["10.9.0.2", "10.9.0.5"]
+    assert not [e for e in events if e["event"] == "leave"]
+
+
+WIDE = "10.9.1.0/28"  # 14 hosts: .1 - .14
+
+
+def seeded(**kwargs):
+    """Inventory with a baseline sweep of WIDE at t=0 that found .2 and .10"""
+    inventory = HostInventory(**{"live_interval": 60, "dead_interval": 140, "min_dead_interval": 20, **kwargs})
+    replies = {ip: {"ip": ip, "hostname": "", "rtt_ms": 1.0} for ip in ("10.9.1.2", "10.9.1.10")}
+    changes = inventory.apply(WIDE, None, replies, {}, now=0)
+    return inventory, changes
+
+
+def test_plan_needs_a_full_sweep_for_an_unknown_subnet():
+    assert HostInventory().plan(WIDE, now=0) is None
+
+
+def test_plan_walks_the_dead_space_with_a_cursor():
+    inventory, _ = seeded()
+    # 30 of 140 seconds elapsed: 3 of 14 addresses, skipping the live .2
+    assert inventory.plan(WIDE, now=30) == ["10.9.1.1", "10.9.1.3"]
+    assert inventory.plan(WIDE, now=30) == ["10.9.1.4", "10.9.1.5", "10.9.1.6"]
+    assert inventory.subnets[WIDE]["cursor"] == 6
+
+    # The cursor wraps around the end of the range
+    inventory.subnets[WIDE]["cursor"] = 12
+    assert inventory.plan(WIDE, now=30) == ["10.9.1.13", "10.9.1.14", "10.9.1.1"]
+    assert inventory.subnets[WIDE]["cursor"] == 1
+
+
+def test_plan_includes_due_live_hosts_and_caps_the_budget():
+    inventory, _ = seeded()
+    assert inventory.plan(WIDE, now=0) == []
+    planned = inventory.plan(WIDE, now=10000)
+    assert sorted(planned[:2]) == ["10.9.1.10", "10.9.1.2"]
+    # A long gap sweeps the dead space exactly once
+    assert len(planned) == 14 and len(set(planned)) == 14
+
+
+def test_apply_reports_joins_leaves_and_changes():
+    inventory, baseline = seeded(leave_after=2)
+    assert [(c["event"], c["baseline"]) for c in baseline] == [("join", True), ("join", True)]
+
+    # One lost echo is tolerated, the second is a departure
+    assert inventory.apply(WIDE, ["10.9.1.2"], {}, {}, now=60) == []
+    left = inventory.apply(WIDE, ["10.9.1.2"], {}, {}, now=120)
+    assert [(c["event"], c["device"]["ip"]) for c in left] == [("leave", "10.9.1.2")]
+    assert [d["ip"] for d in inventory.devices(WIDE)] == ["10.9.1.10"]
+
+    back = inventory.apply(WIDE, ["10.9.1.2"], {"10.9.1.2": {"hostname": "nas", "rtt_ms": 2.0}}, {}, now=180)
+    assert [(c["event"], c["baseline"], c["returning"]) for c in back] == [("join", False, True)]
+    assert inventory.host("10.9.1.2")["first_seen"] == 0
+
+    changed = inventory.apply(WIDE, ["10.9.1.2"], {"10.9.1.2": {"hostname": "backup", "rtt_ms": 2.0}},
+                              {"10.9.1.2": "aa:bb:cc:dd:ee:ff"}, now=240)
+    assert [c["event"] for c in changed] == ["changed"]
+    # The MAC was unknown before, so only the hostname counts as a change
+    assert changed[0]["changes"] == {"hostname": ["nas", "backup"]}
+    assert inventory.host("10.9.1.2")["mac"] == "aa:bb:cc:dd:ee:ff"
+
+
+def test_apply_drops_stale_hosts():
+    inventory, _ = seeded(leave_after=1, stale_after=1000)
+    inventory.apply(WIDE, ["10.9.1.2"], {}, {}, now=60)
+    inventory.apply(WIDE, [], {}, {}, now=900)
+    assert inventory.host("10.9.1.2")["status"] == "inactive"
+    inventory.apply(WIDE, [], {}, {}, now=1100)
+    assert inventory.host("10.9.1.2") is None
+    assert [d["ip"] for d in inventory.devices(WIDE, include_inactive=True)] == ["10.9.1.10"]
+
+
+def test_dead_interval_shrinks_on_new_hosts_and_relaxes_when_quiet():
+    inventory, _ = seeded()
+    assert inventory.subnets[WIDE]["dead_interval"] == 140
+    for n, expected in ((3, 70), (4, 35), (5, 20), (6, 20)):
+        ip = f"10.9.1.{n}"
+        inventory.apply(WIDE, [ip], {ip: {"rtt_ms": 1.0}}, {}, now=n)
+        assert inventory.subnets[WIDE]["dead_interval"] == expected
+    for expected in (25, 31.25, 39.0625):
+        inventory.apply(WIDE, [], {}, {}, now=10)
+        assert inventory.subnets[WIDE]["dead_interval"] == expected
+    for _ in range(10):
+        inventory.apply(WIDE, [], {}, {}, now=10)
+    assert inventory.subnets[WIDE]["dead_interval"] == 140
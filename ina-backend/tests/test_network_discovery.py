@@ -0,0 +1,169 @@
+import asyncio
+import ipaddress
+import time
+
+import pytest
+
+from icmp_sweep import IcmpSweeper, build_echo_request, icmp_checksum
+from network_discovery import NetworkDiscovery, bounded_map, host_count, host_slice
+
+LOOPBACK = "127.0.0.0/29"
+
+
+class StubResolver:
+    async def resolve(self, ip):
+        return f"host-{ip.rsplit('.', 1)[1]}"
+
+
+class NoSweeper:
+    def available(self):
+        return False
+
+
+def test_echo_request_checksum_verifies():
+    packet = build_echo_request(0x1234, 7)
+    assert packet[0] == 8 and icmp_checksum(packet) == 0
+
+
+def test_host_slice_matches_hosts():
+    network = ipaddress.ip_network("10.1.0.0/22")
+    hosts = [str(ip) for ip in network.hosts()]
+    assert host_count(network) == len(hosts) == 1022
+    assert list(host_slice(network, 500, 10)) == hosts[500:510]
+    assert list(host_slice(network, 1020, 10)) == hosts[1020:]
+
+
+def test_bounded_map_caps_in_flight_calls():
+    state = {"running": 0, "peak": 0}
+    pulled = []
+
+    async def work(n):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return n * 2
+
+    def items():
+        for n in range(50):
+            pulled.append(n)
+            yield n
+
+    async def run():
+        return sorted([r async for r in bounded_map(work, items(), 5)])
+
+    assert asyncio.run(run()) == [n * 2 for n in range(50)]
+    assert state["peak"] == 5
+    assert pulled == list(range(50))
+
+
+def test_fallback_path_probes_every_host_with_check_host():
+    class Discovery(NetworkDiscovery):
+        async def check_host(self, ip):
+            # Only odd addresses answer
+            if int(ip.rsplit(".", 1)[1]) % 2:
+                return await self._device_info(ip, 1.0)
+            return None
+
+    async def run():
+        discovery = Discovery(sweeper=NoSweeper(), resolver=StubResolver())
+        return [e async for e in discovery.iter_discovery("10.0.0.0/28", concurrency=4, progress_interval=5)]
+
+    events = asyncio.run(run())
+    found = {(e["device"]["ip"], e["device"]["hostname"]) for e in events if e["event"] == "host"}
+    assert found == {(f"10.0.0.{n}", f"host-{n}") for n in range(1, 15, 2)}
+    assert events[-1] == {"event": "done", "subnet": "10.0.0.0/28", "total_hosts": 14,
+                          "probed": 14, "discovered_hosts": 7}
+
+
+@pytest.mark.parametrize("subnet, hosts", [("10.0.0.0/31", 2), ("10.0.0.5/32", 1), ("fd00::/126", 3)])
+def test_total_hosts_matches_hosts_for_small_and_ipv6_prefixes(subnet, hosts):
+    class Discovery(NetworkDiscovery):
+        async def check_host(self, ip):
+            return None
+
+    async def run():
+        discovery = Discovery(sweeper=NoSweeper(), resolver=StubResolver())
+        return [e async for e in discovery.iter_discovery(subnet, progress_interval=5)]
+
+    done = asyncio.run(run())[-1]
+    assert done["total_hosts"] == done["probed"] == hosts
+
+
+@pytest.fixture
+def sweeper():
+    sweeper = IcmpSweeper(rate=1000, timeout=0.5)
+    if not sweeper.available():
+        pytest.skip("ICMP sockets are not permitted here")
+    return sweeper
+
+
+def test_loopback_sweep_answers_every_host(sweeper):
+    async def run():
+        discovery = NetworkDiscovery(sweeper=sweeper, resolver=StubResolver())
+        return await discovery.discover_network(LOOPBACK, timeout=0.5)
+
+    result = asyncio.run(run())
+    assert result["total_hosts"] == 6
+    assert [d["ip"] for d in result["devices"]] == [f"127.0.0.{n}" for n in range(1, 7)]
+    assert all(d["hostname"] == f"host-{n}" and d["rtt_ms"] is not None
+               for n, d in enumerate(result["devices"], 1))
+    assert not sweeper._pending
+
+
+def test_loopback_shard_sweeps_only_its_slice(sweeper):
+    async def run():
+        discovery = NetworkDiscovery(sweeper=sweeper, resolver=StubResolver())
+        return [e async for e in discovery.iter_discovery(LOOPBACK, timeout=0.5, shard=(2, 3))]
+
+    events = asyncio.run(run())
+    assert sorted(e["device"]["ip"] for e in events if e["event"] == "host") == ["127.0.0.3", "127.0.0.4",
+                                                                                  "127.0.0.5"]
+    assert events[-1]["total_hosts"] == 3 and events[-1]["probed"] == 3
+
+
+def test_concurrent_sweeps_share_the_global_rate(sweeper):
+    sweeper.max_rate = 500
+
+    async def sweep(subnet):
+        hosts = [str(ip) for ip in ipaddress.ip_network(subnet).hosts()]
+        return [ip async for ip, _ in sweeper.sweep(hosts, rate=100000, timeout=0.2)]
+
+    async def run():
+        started = time.monotonic()
+        results = await asyncio.gather(sweep("127.0.1.0/25"), sweep("127.0.2.0/25"))
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(run())
+    assert all(len(replies) == 126 for replies in results)
+    # 252 echoes at 500/s between them (the first batch of each goes out unpaced)
+    assert elapsed >= 0.4
+
+
+def test_icmp_replies_are_enriched_within_the_concurrency_limit():
+    state = {"running": 0, "peak": 0}
+
+    class InstantSweeper:
+        def available(self):
+            return True
+
+        async def sweep(self, hosts, rate=None, timeout=None, progress=None):
+            for ip in hosts:
+                progress["sent"] += 1
+                yield ip, 1.0
+
+    class Discovery(NetworkDiscovery):
+        async def _device_info(self, ip, rtt):
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(0.01)
+            state["running"] -= 1
+            return {"ip": ip, "rtt_ms": rtt}
+
+    async def run():
+        discovery = Discovery(sweeper=InstantSweeper(), resolver=StubResolver())
+        return [e async for e in discovery.iter_discovery("10.0.0.0/26", concurrency=4, progress_interval=5)]
+
+    events = asyncio.run(run())
+    assert len([e for e in events if e["event"] == "host"]) == 62
+    assert state["peak"] == 4
@@ -0,0 +1,134 @@
+import random
+import statistics
+
+import pytest
+
+from online_detector import Ewma, OnlineDetector, P2Quantile, parse_ping_output, parse_traceroute_output
+
+LINUX_PING = """PING 10.0.0.1 (10.0.0.1) 56(84) bytes of data.
+64 bytes from 10.0.0.1: icmp_seq=1 ttl=64 time=1.10 ms
+64 bytes from 10.0.0.1: icmp_seq=2 ttl=64 time=1.30 ms
+
+--- 10.0.0.1 ping statistics ---
+4 packets transmitted, 2 received, 50% packet loss, time 3004ms
+rtt min/avg/max/mdev = 1.100/1.200/1.300/0.100 ms
+"""
+
+WINDOWS_PING = """Reply from 10.0.0.1: bytes=32 time=12ms TTL=64
+Reply from 10.0.0.1: bytes=32 time<1ms TTL=64
+    Packets: Sent = 2, Received = 2, Lost = 0 (0% loss),
+"""
+
+TRACEROUTE = """traceroute to 8.8.8.8 (8.8.8.8), 30 hops max, 60 byte packets
+ 1  192.168.1.1  0.512 ms  0.401 ms  0.388 ms
+ 2  * * *
+ 3  8.8.8.8  9.100 ms  9.300 ms  9.200 ms
+"""
+
+
+@pytest.mark.parametrize("p", [0.5, 0.95])
+def test_p2_quantile_tracks_the_exact_quantile(p):
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(3, 0.5) for _ in range(20000)]
+    estimate = P2Quantile(p)
+    for x in samples:
+        estimate.add(x)
+    exact = statistics.quantiles(samples, n=100)[int(p * 100) - 1]
+    assert estimate.value() == pytest.approx(exact, rel=0.03)
+    # Five markers, whatever the stream length
+    assert len(estimate.heights) == 5
+
+
+def test_p2_quantile_before_five_samples():
+    estimate = P2Quantile(0.5)
+    assert estimate.value() is None
+    for x in (30, 10, 20):
+        estimate.add(x)
+    assert estimate.value() == 20
+
+
+def test_ewma_mean_variance_and_zscore():
+    ewma = Ewma(0.1)
+    assert ewma.zscore(5) == 0.0
+    for _ in range(200):
+        ewma.add(10.0)
+    # A constant stream has no spread, so nothing is an outlier
+    assert ewma.mean == pytest.approx(10.0) and ewma.zscore(50) == 0.0
+
+    rng = random.Random(3)
+    ewma = Ewma(0.05)
+    for _ in range(5000):
+        ewma.add(rng.gauss(20, 2))
+    assert ewma.mean == pytest.approx(20, abs=1)
+    assert ewma.var ** 0.5 == pytest.approx(2, rel=0.3)
+    assert ewma.zscore(ewma.mean + 10) > 3 and ewma.zscore(ewma.mean - 10) < -3
+
+
+def test_parse_ping_output_linux_and_windows():
+    linux = parse_ping_output(LINUX_PING)
+    assert (linux["sent"], linux["received"], linux["loss_percent"]) == (4, 2, 50.0)
+    assert (linux["min_rtt"], linux["avg_rtt"], linux["max_rtt"]) == (1.1, 1.2, 1.3)
+    assert linux["rtts"] == [1.1, 1.3]
+
+    windows = parse_ping_output(WINDOWS_PING)
+    assert (windows["sent"], windows["received"], windows["loss_percent"]) == (2, 2, 0.0)
+    assert windows["avg_rtt"] == pytest.approx(6.5)
+
+    silent = parse_ping_output("Request timed out.\n")
+    assert silent["loss_percent"] == 100.0 and silent["avg_rtt"] is None
+
+
+def test_parse_traceroute_output_keeps_silent_hops():
+    result = parse_traceroute_output(TRACEROUTE)
+    assert [h["ip"] for h in result["hops"]] == ["192.168.1.1", None, "8.8.8.8"]
+    assert result["num_hops"] == 3
+    assert result["max_rtt"] == 9.3
+    assert result["final_rtt"] == pytest.approx(9.2)
+
+
+def steady(detector, host, n=30, rtt=10.0):
+    rng = random.Random(1)
+    for _ in range(n):
+        detector.observe_ping(host, {"avg_rtt": rtt + rng.uniform(-0.5, 0.5), "loss_percent": 0.0})
+
+
+def test_rtt_spike_after_warmup_alerts_once_per_cooldown():
+    alerts = []
+    detector = OnlineDetector(alert=lambda *args: alerts.append(args), warmup=10, cooldown=300)
+    steady(detector, "10.0.0.1")
+
+    first = detector.observe_ping("10.0.0.1", {"avg_rtt": 80.0, "loss_percent": 0.0})
+    # Let the spike decay out of the variance, then spike again inside the cooldown
+    steady(detector, "10.0.0.1", n=80)
+    second = detector.observe_ping("10.0.0.1", {"avg_rtt": 90.0, "loss_percent": 0.0})
+    assert first["anomalous"] and "sigma" in first["reasons"][0]
+    assert second["anomalous"]
+    assert len(alerts) == 1 and alerts[0][0] == "medium" and alerts[0][2].startswith("10.0.0.1: ")
+    assert detector.anomalies == 2
+
+
+def test_nothing_is_flagged_during_warmup():
+    detector = OnlineDetector(warmup=10)
+    steady(detector, "10.0.0.1", n=5)
+    assert not detector.observe_ping("10.0.0.1", {"avg_rtt": 500.0, "loss_percent": 100.0})["anomalous"]
+
+
+def test_loss_jump_and_path_change_are_flagged():
+    detector = OnlineDetector(warmup=5)
+    steady(detector, "10.0.0.1", n=10)
+    lossy = detector.observe_ping("10.0.0.1", {"avg_rtt": 10.0, "loss_percent": 75.0})
+    assert lossy["reasons"] == ["Packet loss jumped to 75%"]
+
+    for _ in range(10):
+        assert not detector.observe_traceroute("10.0.0.1", {"num_hops": 8})["anomalous"]
+    changed = detector.observe_traceroute("10.0.0.1", {"num_hops": 14})
+    assert changed["reasons"] == ["Path length changed to 14 hops (usually 8)"]
+    assert detector.host_stats("10.0.0.1")["hops"] == 14
+
+
+def test_least_recently_seen_hosts_are_dropped():
+    detector = OnlineDetector(max_hosts=2)
+    for host in ("a", "b", "a", "c"):
+        detector.observe_ping(host, {"avg_rtt": 1.0, "loss_percent": 0.0})
+    assert list(detector.hosts) == ["a", "c"]
+    assert detector.host_stats("b") is None
@@ -0,0 +1,98 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from packet_capture import LINKTYPE_ETHERNET, FlowTable, PacketCapture, parse_packet
+
+MACS = b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02"
+
+
+def ipv4(src, dst, protocol, l4, ttl=64):
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4), 1, 0, ttl, protocol, 0,
+                         socket.inet_aton(src), socket.inet_aton(dst))
+    return MACS + b"\x08\x00" + header + l4
+
+
+def tcp(sport, dport, flags=0x10, payload=b""):
+    return struct.pack("!HHIIBBHHH", sport, dport, 1, 0, 5 << 4, flags, 65535, 0, 0) + payload
+
+
+def udp(sport, dport, payload=b""):
+    return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+
+def ipv6_udp(src, dst, sport, dport):
+    l4 = udp(sport, dport, b"x" * 12)
+    header = struct.pack("!IHBB16s16s", 6 << 28, len(l4), 17, 64,
+                         socket.inet_pton(socket.AF_INET6, src), socket.inet_pton(socket.AF_INET6, dst))
+    return MACS + b"\x86\xdd" + header + l4
+
+
+def vlan(frame, tag=100):
+    return frame[:12] + struct.pack("!HH", 0x8100, tag) + frame[12:]
+
+
+def write_pcap(path, frames):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack("<IIII", 1700000000 + i, 0, len(frame), len(frame)))
+            f.write(frame)
+
+
+def test_parse_packet_handles_vlan_tags_and_ipv6():
+    frame = ipv4("10.0.0.1", "10.0.0.2", 6, tcp(40000, 443, flags=0x02), ttl=63)
+    expected = (6, socket.inet_aton("10.0.0.1"), socket.inet_aton("10.0.0.2"), 40000, 443, 63, 0x02)
+    assert parse_packet(frame, LINKTYPE_ETHERNET) == expected
+    assert parse_packet(vlan(frame), LINKTYPE_ETHERNET) == expected
+    assert parse_packet(ipv6_udp("fd00::1", "fd00::2", 5353, 53), LINKTYPE_ETHERNET)[3:5] == (5353, 53)
+    assert parse_packet(MACS + b"\x08\x06" + b"\x00" * 28, LINKTYPE_ETHERNET) is None  # ARP
+    assert parse_packet(frame[:20], LINKTYPE_ETHERNET) is None  # Truncated
+
+
+def test_flow_table_reuses_expired_slots_and_caps_flows():
+    table = FlowTable(max_flows=2)
+    table.add((6, b"a", b"b", 1, 2), 100, 1, 10.0, 10.0)
+    table.add((6, b"a", b"c", 1, 2), 100, 1, 10.0, 50.0)
+    table.add((6, b"a", b"d", 1, 2), 100, 1, 60.0, 60.0)
+    assert table.dropped == 1
+    assert table.expire(before=20.0) == 1
+    table.add((6, b"a", b"d", 1, 2), 100, 1, 60.0, 60.0)
+    assert len(table) == 2 and len(table.keys) == 2
+
+
+def test_pcap_replay_aggregates_flows(tmp_path):
+    pytest.importorskip("scapy")  # Replay reads the file with scapy's RawPcapReader
+    frames = (
+        [ipv4("10.0.0.1", "10.0.0.2", 6, tcp(40000, 443, payload=b"x" * 100))] * 5
+        + [vlan(ipv4("10.0.0.3", "10.0.0.2", 17, udp(5000, 53, b"q" * 20)))] * 2
+        + [ipv6_udp("fd00::1", "fd00::2", 5353, 5353)]
+        + [MACS + b"\x08\x06" + b"\x00" * 28]
+    )
+    path = str(tmp_path / "replay.pcap")
+    write_pcap(path, frames)
+
+    async def run():
+        capture = PacketCapture(batch_interval=0.05)
+        capture.start(pcap=path)
+        for _ in range(200):
+            if capture.finished:
+                break
+            await asyncio.sleep(0.01)
+        await capture.stop()
+        return capture.summary()
+
+    summary = asyncio.run(run())
+    assert summary["finished"] and summary["error"] is None
+    assert summary["packets"] == len(frames)
+    assert summary["bytes"] == sum(len(f) for f in frames)
+    assert summary["non_ip_bytes"] == 42
+    assert summary["flows"] == 3
+    assert [p["name"] for p in summary["protocols"]] == ["TCP", "UDP"]
+    top = summary["topFlows"][0]
+    assert (top["src"], top["sport"], top["dst"], top["dport"], top["packets"]) == ("10.0.0.1", 40000,
+                                                                                 "10.0.0.2", 443, 5)
+    assert summary["topDestinations"][0]["ip"] == "10.0.0.2"
+    assert {t["ip"] for t in summary["topTalkers"]} == {"10.0.0.1", "10.0.0.3", "fd00::1"}
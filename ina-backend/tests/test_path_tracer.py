@@ -0,0 +1,155 @@
+import asyncio
+import socket
+import struct
+
+from icmp_sweep import ICMP_ECHO_REPLY, icmp_checksum
+from path_tracer import (ICMP_DEST_UNREACHABLE, ICMP_TIME_EXCEEDED, PAYLOAD, PathTracer, Trace,
+                         build_paris_probe, format_trace)
+
+DESTINATION = "198.51.100.7"
+ROUTERS = ["10.0.0.1", "192.0.2.1"]
+
+
+def ip_header(src, dst, protocol=socket.IPPROTO_ICMP, ttl=64):
+    return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 0, 0, 0, ttl, protocol, 0,
+                       socket.inet_aton(src), socket.inet_aton(dst))
+
+
+def echo_reply(src, probe):
+    ident, seq = struct.unpack("!HH", probe[4:8])
+    return ip_header(src, "192.0.2.200") + struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, 0, ident, seq) + PAYLOAD
+
+
+def icmp_error(src, icmp_type, probe, quoted_protocol=socket.IPPROTO_ICMP):
+    """Time Exceeded / Unreachable quoting the probe's IP header and first 8 ICMP bytes"""
+    quoted = ip_header("192.0.2.200", DESTINATION, quoted_protocol, ttl=1) + probe[:8]
+    return ip_header(src, "192.0.2.200") + struct.pack("!BBHI", icmp_type, 0, 0, 0) + quoted
+
+
+class FakeNetwork:
+    """Raw-socket stand-in: routers on ROUTERS answer Time Exceeded, the destination echoes"""
+
+    def __init__(self, tracer, path=ROUTERS, silent=()):
+        self.tracer = tracer
+        self.path = list(path)
+        self.silent = set(silent)
+        self.ttl = 64
+        self.inbox = []
+        self.sent = []
+
+    def setsockopt(self, level, option, value):
+        if option == socket.IP_TTL:
+            self.ttl = value
+
+    def sendto(self, packet, address):
+        self.sent.append((self.ttl, packet))
+        if self.ttl in self.silent:
+            return
+        if self.ttl <= len(self.path):
+            reply = (icmp_error(self.path[self.ttl - 1], ICMP_TIME_EXCEEDED, packet), (self.path[self.ttl - 1], 0))
+        else:
+            reply = (echo_reply(address[0], packet), (address[0], 0))
+        self.inbox.append(reply)
+        asyncio.get_running_loop().call_soon(self.tracer._on_readable)
+
+    def recvfrom(self, size):
+        if not self.inbox:
+            raise BlockingIOError
+        return self.inbox.pop(0)
+
+
+def fake_tracer(**kwargs):
+    tracer = PathTracer(**kwargs)
+    network = FakeNetwork(tracer)
+    tracer.sock = network
+    tracer._ensure_socket = lambda: network
+    return tracer, network
+
+
+def test_paris_probe_checksum_is_valid_and_fixed_per_flow():
+    probes = [build_paris_probe(0x1234, seq, 0x5A5A) for seq in (1, 2, 300, 65535)]
+    assert all(icmp_checksum(p) == 0 for p in probes)
+    assert {struct.unpack("!H", p[2:4])[0] for p in probes} == {0x5A5A}
+    assert [struct.unpack("!H", p[6:8])[0] for p in probes] == [1, 2, 300, 65535]
+    other_flow = build_paris_probe(0x1234, 1, 0x5B5B)
+    assert icmp_checksum(other_flow) == 0 and other_flow[2:4] != probes[0][2:4]
+
+
+def test_replies_are_matched_to_their_probe():
+    async def run():
+        tracer, network = fake_tracer(probes=1)
+        trace = Trace(DESTINATION, 5, 1, 1)
+        probe = build_paris_probe(tracer.ident, 9, 0x5A5A)
+        stranger = build_paris_probe(tracer.ident ^ 1, 10, 0x5A5A)
+        udp_error = icmp_error("10.0.0.9", ICMP_TIME_EXCEEDED, probe, quoted_protocol=socket.IPPROTO_UDP)
+        tracer._pending[9] = (trace, 2, 0, 0.0)
+        tracer._pending[10] = (trace, 3, 0, 0.0)
+        network.inbox = [
+            (udp_error, ("10.0.0.9", 0)),  # Quotes a UDP packet: not ours
+            (icmp_error("10.0.0.8", ICMP_TIME_EXCEEDED, stranger), ("10.0.0.8", 0)),  # Another tracer's ident
+            (icmp_error("10.0.0.1", ICMP_TIME_EXCEEDED, probe), ("10.0.0.1", 0)),
+            (icmp_error("10.0.0.1", ICMP_TIME_EXCEEDED, probe), ("10.0.0.1", 0)),  # Duplicate
+        ]
+        tracer._on_readable()
+        return tracer, trace
+
+    tracer, trace = asyncio.run(run())
+    assert list(trace.replies) == [2]
+    assert [(flow, ip) for flow, ip, _ in trace.replies[2]] == [(0, "10.0.0.1")]
+    assert 9 not in tracer._pending and 10 in tracer._pending
+    assert trace.dest_ttl is None
+
+
+def test_unreachable_ends_the_path():
+    async def run():
+        tracer, network = fake_tracer(probes=1)
+        trace = Trace(DESTINATION, 10, 1, 1)
+        first, second = (build_paris_probe(tracer.ident, seq, 0x5A5A) for seq in (1, 2))
+        tracer._pending[1] = (trace, 1, 0, 0.0)
+        tracer._pending[2] = (trace, 2, 0, 0.0)
+        network.inbox = [
+            (icmp_error("10.0.0.1", ICMP_TIME_EXCEEDED, first), ("10.0.0.1", 0)),
+            (icmp_error("192.0.2.1", ICMP_DEST_UNREACHABLE, second), ("192.0.2.1", 0)),
+        ]
+        tracer._on_readable()
+        return trace
+
+    trace = asyncio.run(run())
+    assert trace.finished.is_set() and not trace.reached and trace.dest_ttl == 2
+    result = trace.result()
+    assert [h["ip"] for h in result["hops"]] == ["10.0.0.1", "192.0.2.1"]
+    assert result["num_hops"] == 2
+
+
+def test_trace_streams_hops_and_caches_the_path():
+    async def run():
+        tracer, network = fake_tracer(probes=2, timeout=1.0)
+        events = [e async for e in tracer.trace_iter(DESTINATION, max_hops=6)]
+        again = [e async for e in tracer.trace_iter(DESTINATION)]
+        return tracer, network, events, again
+
+    tracer, network, events, again = asyncio.run(run())
+    # Every TTL goes out at once, each with its own TTL
+    assert sorted({ttl for ttl, _ in network.sent}) == list(range(1, 7)) and len(network.sent) == 12
+    assert [e["event"] for e in events] == ["start", "hop", "hop", "done"]
+    assert [e["hop"]["ip"] for e in events if e["event"] == "hop"] == ROUTERS
+    done = events[-1]
+    assert done["reached"] and done["num_hops"] == 3 and not done["cached"]
+    assert [h["ip"] for h in done["hops"]] == ROUTERS + [DESTINATION]
+    assert all(h["lost"] == 0 and len(h["rtts"]) == 2 for h in done["hops"])
+    assert not tracer._pending
+
+    assert again[-1]["cached"] and tracer.hits == 1 and len(network.sent) == 12
+    assert [h["ip"] for h in tracer.paths()[0]["hops"]] == ROUTERS + [DESTINATION]
+
+
+def test_silent_hops_are_reported_as_lost():
+    async def run():
+        tracer, network = fake_tracer(probes=1, timeout=0.2)
+        network.silent = {2}
+        return await tracer.trace(DESTINATION, max_hops=5)
+
+    result = asyncio.run(run())
+    assert [h["ip"] for h in result["hops"]] == ["10.0.0.1", None, DESTINATION]
+    assert result["hops"][1]["lost"] == 1
+    assert format_trace(result).splitlines()[2] == " 2  *"
@@ -0,0 +1,138 @@
+import asyncio
+import socket
+
+import pytest
+
+from port_scanner import PortScanner, fingerprint, parse_ports
+
+
+class QuietDiscovery:
+    """Discovery stand-in whose hosts never answer ping"""
+
+    def __init__(self):
+        self.checked = []
+
+    async def check_host(self, ip):
+        self.checked.append(ip)
+        return None
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    """A loopback port with nothing listening on it"""
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Echo(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(b"pong", addr)
+
+
+async def listeners():
+    async def ssh(reader, writer):
+        writer.write(b"SSH-2.0-OpenSSH_9.6\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(ssh, "127.0.0.1", 0)
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(Echo, local_addr=("127.0.0.1", 0))
+    return server, transport, server.sockets[0].getsockname()[1], transport.get_extra_info("sockname")[1]
+
+
+def test_scan_reports_open_closed_and_udp_ports():
+    async def run():
+        server, udp, tcp_port, udp_port = await listeners()
+        scanner = PortScanner(QuietDiscovery(), timeout=1, banner_timeout=1)
+        closed, closed_udp = free_port(), free_port(socket.SOCK_DGRAM)
+        try:
+            first = await scanner.scan("127.0.0.1", [tcp_port, closed], [udp_port, closed_udp])
+            again = await scanner.scan("127.0.0.1", [tcp_port, closed], [udp_port, closed_udp])
+        finally:
+            server.close()
+            udp.close()
+        return first, again, tcp_port, udp_port
+
+    first, again, tcp_port, udp_port = asyncio.run(run())
+    assert first["states"] == {"open": 2, "closed": 2, "filtered": 0, "open|filtered": 0}
+    ssh, echo = first["ports"]
+    assert (ssh["protocol"], ssh["port"], ssh["service"], ssh["product"]) == ("tcp", tcp_port, "ssh", "OpenSSH_9.6")
+    assert (echo["protocol"], echo["port"], echo["response_bytes"]) == ("udp", udp_port, 4)
+    assert first["cached"] == 0
+    assert again["cached"] == 4
+
+
+def test_concurrent_scans_share_probes():
+    async def run():
+        server, udp, tcp_port, _ = await listeners()
+        scanner = PortScanner(QuietDiscovery(), timeout=1, banner_timeout=1)
+        try:
+            await asyncio.gather(*(scanner.scan("127.0.0.1", [tcp_port]) for _ in range(5)))
+        finally:
+            server.close()
+            udp.close()
+        return scanner
+
+    assert asyncio.run(run()).probes == 1
+
+
+def test_waiters_survive_a_cancelled_leader():
+    async def run():
+        scanner = PortScanner(QuietDiscovery(), timeout=1)
+        calls = []
+
+        async def slow_tcp(ip, port, timeout):
+            calls.append(port)
+            await asyncio.sleep(0.1)
+            return {"state": "open", "service": "http"}
+
+        scanner._tcp = slow_tcp
+        leader = asyncio.create_task(scanner.probe("127.0.0.1", "tcp", 80))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(scanner.probe("127.0.0.1", "tcp", 80))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await waiter
+        return leader, result, calls
+
+    leader, result, calls = asyncio.run(run())
+    assert leader.cancelled()
+    assert result["state"] == "open" and not result["cached"]
+    assert calls == [80, 80]
+
+
+def test_device_details_accepts_host_names():
+    async def run():
+        server, udp, tcp_port, _ = await listeners()
+        discovery = QuietDiscovery()
+        scanner = PortScanner(discovery, timeout=1, banner_timeout=1)
+        try:
+            device = await scanner.device_details("localhost", tcp_ports=[tcp_port])
+            missing = await scanner.device_details("no-such-host.invalid", tcp_ports=[tcp_port])
+        finally:
+            server.close()
+            udp.close()
+        return device, missing, discovery.checked
+
+    device, missing, checked = asyncio.run(run())
+    assert device["ip"] in ("127.0.0.1", "::1") and device["hostname"] == "localhost"
+    assert [p["service"] for p in device["open_ports"]] == ["ssh"]
+    assert checked == [device["ip"]]
+    assert missing is None
+
+
+def test_parse_ports():
+    assert parse_ports("22, 80,8000-8002", [1], 100) == [22, 80, 8000, 8001, 8002]
+    assert parse_ports(None, [1, 2], 100) == [1, 2]
+    for spec in ("abc", "0", "70000", "10-5"):
+        with pytest.raises(ValueError):
+            parse_ports(spec, [], 100)
+    with pytest.raises(ValueError):
+        parse_ports("1-200", [], 100)
+
+
+def test_fingerprint_http_server_header():
+    assert fingerprint(8080, "tcp", "HTTP/1.1 200 OK\r\nServer: nginx/1.25.3") == ("http", "nginx/1.25.3")
@@ -0,0 +1,43 @@
+import asyncio
+
+from probe_scheduler import ProbeScheduler
+
+
+def test_every_target_keeps_its_own_rtt_history():
+    async def run():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        scheduler = ProbeScheduler(rate=10000, min_interval=0.1, max_targets=400)
+        targets = [scheduler.add_target("127.0.0.1", "tcp", 0.1, port) for _ in range(300)]
+        scheduler.start()
+        await asyncio.sleep(1.5)
+        await scheduler.stop()
+        server.close()
+        return scheduler, targets
+
+    scheduler, targets = asyncio.run(run())
+    # More targets than the shared store's default 256 series, none evicted
+    assert scheduler.history.evicted == 0
+    assert all(scheduler.history.summary(t.id)["count"] >= 1 for t in targets)
+    assert not scheduler._probes
+
+    assert scheduler.remove_target(targets[0].id)
+    assert targets[0].id not in scheduler.history.names()
+
+
+def test_hostnames_resolve_once_per_ttl(monkeypatch):
+    calls = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+
+        async def getaddrinfo(host, port, **kwargs):
+            calls.append(host)
+            return [(2, 1, 6, "", ("192.0.2.7", 0))]
+
+        monkeypatch.setattr(loop, "getaddrinfo", getaddrinfo)
+        scheduler = ProbeScheduler(resolve_ttl=60)
+        return [await scheduler.resolve("router.example") for _ in range(3)] + [await scheduler.resolve("10.0.0.1")]
+
+    assert asyncio.run(run()) == ["192.0.2.7"] * 3 + ["10.0.0.1"]
+    assert calls == ["router.example"]
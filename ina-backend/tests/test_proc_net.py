@@ -0,0 +1,89 @@
+import socket
+
+import pytest
+
+from proc_net import ProcNetCollector, decode_address, parse_table
+
+HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def hex4(ip):
+    """IPv4 address as the kernel prints it (little-endian word)"""
+    return socket.inet_aton(ip)[::-1].hex().upper()
+
+
+def hex6(ip):
+    """IPv6 address as four little-endian words"""
+    raw = socket.inet_pton(socket.AF_INET6, ip)
+    return b"".join(raw[i:i + 4][::-1] for i in range(0, 16, 4)).hex().upper()
+
+
+def table(rows):
+    lines = [f"{n:4}: {local}:{lport:04X} {remote}:{rport:04X} {state} 00000000:00000000 00:00000000 00000000  "
+             f"1000        0 {1000 + n} 1 0000000000000000 20 4 30 10 -1\n"
+             for n, (local, lport, remote, rport, state) in enumerate(rows)]
+    return (HEADER + "".join(lines)).encode()
+
+
+def test_decode_address_handles_both_families_and_mapped_v4():
+    assert decode_address(hex4("192.168.1.20"), socket.AF_INET) == "192.168.1.20"
+    assert decode_address(hex6("2001:db8::1"), socket.AF_INET6) == "2001:db8::1"
+    assert decode_address(hex6("::ffff:10.0.0.7"), socket.AF_INET6) == "10.0.0.7"
+
+
+def test_parse_table_counts_states_and_active_endpoints():
+    local, web, db = hex4("10.0.0.5"), hex4("93.184.216.34"), hex4("10.0.0.9")
+    data = table([
+        (local, 51000, web, 443, "01"),
+        (local, 51001, web, 443, "01"),
+        (local, 51002, db, 5432, "02"),
+        (local, 22, hex4("0.0.0.0"), 0, "0A"),
+        (local, 51003, web, 443, "06"),
+    ])
+    states, sources, destinations, ports = parse_table(data)
+    assert states == {"01": 2, "02": 1, "0A": 1, "06": 1}
+    # Only ESTABLISHED and SYN_SENT count towards endpoints
+    assert sources == {local.encode(): 3}
+    assert destinations == {web.encode(): 2, db.encode(): 1}
+    assert ports == {443: 2, 5432: 1}
+
+
+def test_collect_merges_tables_and_skips_missing_ones(tmp_path):
+    local = hex4("10.0.0.5")
+    (tmp_path / "tcp").write_bytes(table([
+        (local, 51000, hex4("93.184.216.34"), 443, "01"),
+        (local, 80, hex4("0.0.0.0"), 0, "0A"),
+    ]))
+    (tmp_path / "tcp6").write_bytes(table([
+        (hex6("2001:db8::5"), 51010, hex6("2001:db8::80"), 443, "01"),
+        (hex6("::ffff:10.0.0.5"), 51011, hex6("::ffff:93.184.216.34"), 443, "01"),
+    ]))
+    (tmp_path / "udp").write_bytes(table([(local, 5353, hex4("0.0.0.0"), 0, "07")]))
+
+    collector = ProcNetCollector(str(tmp_path))
+    assert collector.available()
+    result = collector.collect()
+    assert result["protocols"] == {"TCP": 4, "UDP": 1}
+    assert result["states"] == {"TCP": {"ESTABLISHED": 3, "LISTEN": 1}, "UDP": {"CLOSE": 1}}
+    assert result["sources"] == {"10.0.0.5": 2, "2001:db8::5": 1}
+    assert result["destinations"] == {"93.184.216.34": 2, "2001:db8::80": 1}
+    assert result["ports"] == {"TCP/443": 3}
+    assert not ProcNetCollector(str(tmp_path / "missing")).available()
+
+
+def test_collect_sees_a_live_loopback_connection():
+    collector = ProcNetCollector()
+    if not collector.available():
+        pytest.skip("/proc/net is not available here")
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        with socket.create_connection(server.getsockname()) as client:
+            accepted, _ = server.accept()
+            with accepted:
+                result = collector.collect()
+                # Both ends of the connection report the lower of the two ports
+                service = min(server.getsockname()[1], client.getsockname()[1])
+    assert result["states"]["TCP"]["LISTEN"] >= 1
+    assert result["ports"][f"TCP/{service}"] >= 2
+    assert result["sources"]["127.0.0.1"] >= 2
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+
+from reverse_dns import ReverseResolver
+
+
+class StubLookup:
+    """Blocking PTR lookup stand-in that counts calls and can be held open"""
+
+    def __init__(self, names=None, delay=0.0):
+        self.names = names or {}
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, ip):
+        with self.lock:
+            self.calls.append(ip)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if ip == "10.0.0.99":
+            raise OSError("resolver down")
+        return self.names.get(ip, "")
+
+
+def test_concurrent_lookups_of_one_address_share_a_call():
+    lookup = StubLookup({"10.0.0.1": "router.lan"}, delay=0.05)
+    resolver = ReverseResolver(lookup)
+
+    async def run():
+        return await asyncio.gather(*(resolver.resolve("10.0.0.1") for _ in range(20)))
+
+    assert asyncio.run(run()) == ["router.lan"] * 20
+    assert lookup.calls == ["10.0.0.1"]
+    assert not resolver._inflight
+
+
+def test_positive_and_negative_answers_are_cached():
+    lookup = StubLookup({"10.0.0.1": "router.lan"})
+    resolver = ReverseResolver(lookup, negative_ttl=0)
+
+    async def run():
+        return [await resolver.resolve(ip) for ip in ("10.0.0.1", "10.0.0.1", "10.0.0.2", "10.0.0.2")]
+
+    assert asyncio.run(run()) == ["router.lan", "router.lan", "", ""]
+    # The negative TTL of 0 expires "10.0.0.2" at once, the positive answer is reused
+    assert lookup.calls == ["10.0.0.1", "10.0.0.2", "10.0.0.2"]
+    assert resolver.stats()["hits"] == 1
+
+
+def test_lookups_are_bounded_by_max_workers():
+    lookup = StubLookup(delay=0.02)
+    resolver = ReverseResolver(lookup, max_workers=4)
+
+    async def run():
+        await asyncio.gather(*(resolver.resolve(f"10.0.1.{n}") for n in range(40)))
+
+    asyncio.run(run())
+    assert len(lookup.calls) == 40
+    assert lookup.peak <= 4
+
+
+def test_failed_lookup_is_an_empty_name():
+    resolver = ReverseResolver(StubLookup())
+    assert asyncio.run(resolver.resolve("10.0.0.99")) == ""
+
+
+def test_waiters_outlive_a_cancelled_lookup():
+    lookup = StubLookup({"10.0.0.1": "router.lan"}, delay=0.1)
+    resolver = ReverseResolver(lookup)
+
+    async def run():
+        leader = asyncio.create_task(resolver.resolve("10.0.0.1"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(resolver.resolve("10.0.0.1"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.wait_for(waiter, 1), leader.cancelled()
+
+    assert asyncio.run(run()) == ("router.lan", True)
+    assert not resolver._inflight
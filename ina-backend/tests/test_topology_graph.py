@@ -0,0 +1,22 @@
+from topology_graph import TopologyGraph
+
+SUBNET = "10.0.0.0/24"
+
+
+def test_version_and_tombstones_survive_a_restart(tmp_path):
+    path = str(tmp_path / "topology.json")
+    graph = TopologyGraph(path=path, stale_after=0)
+    graph.merge_device(SUBNET, {"ip": "10.0.0.5", "hostname": "printer", "rtt_ms": 1.0})
+    graph.merge_device(SUBNET, {"ip": "10.0.0.6", "hostname": "nas", "rtt_ms": 1.0})
+    before_removal = graph.version
+    graph.finish_discovery(SUBNET, ["10.0.0.5"])  # 10.0.0.6 is stale and gets pruned
+    view = graph.view(SUBNET)
+    graph.save()
+
+    restored = TopologyGraph(path=path, stale_after=0)
+    restored.load()
+    assert restored.version == graph.version > before_removal
+    assert restored.view(SUBNET)["etag"] == view["etag"]
+    delta = restored.view(SUBNET, since=before_removal)
+    assert delta["delta"] and delta["removed"]["nodes"] == ["10.0.0.6"]
+    assert delta["removed"]["links"] == [{"source": "local", "target": "10.0.0.6"}]
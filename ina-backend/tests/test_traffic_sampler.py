@@ -0,0 +1,42 @@
+import asyncio
+
+from traffic_sampler import TrafficSampler
+
+
+class SlowAnalyzer:
+    def __init__(self):
+        self.runs = 0
+
+    async def analyze_network_traffic(self):
+        self.runs += 1
+        await asyncio.sleep(0.05)
+        return {"run": self.runs}
+
+
+def test_concurrent_refreshes_share_one_run():
+    async def run():
+        sampler = TrafficSampler(SlowAnalyzer())
+        results = await asyncio.gather(*(sampler.refresh() for _ in range(10)))
+        return sampler, results
+
+    sampler, results = asyncio.run(run())
+    assert sampler.analyzer.runs == 1
+    assert results == [{"run": 1}] * 10
+
+
+def test_waiters_survive_the_leading_caller_being_cancelled():
+    async def run():
+        sampler = TrafficSampler(SlowAnalyzer())
+        leader = asyncio.create_task(sampler.refresh())
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(sampler.refresh()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*waiters), 1)
+        return sampler, leader, results
+
+    sampler, leader, results = asyncio.run(run())
+    assert leader.cancelled()
+    # One waiter re-runs the analysis and the others join it
+    assert results == [{"run": 2}] * 3
+    assert sampler.snapshot == {"run": 2}
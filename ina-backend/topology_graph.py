@@ -0,0 +1,290 @@
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# This machine: the root of every traced path
+LOCAL_ID = "local"
+
+
+class TopologyGraph:
+    """L3 graph merged from traceroute paths and discovery results
+
+    Nodes are keyed by IP and links carry the RTT added by that hop. Every
+    change bumps a version so clients can poll with an ETag or ask for the
+    changes since a version they already hold.
+    """
+
+    def __init__(self, path: Optional[str] = None, stale_after: float = 86400.0,
+                 tombstones: int = 10000):
+        self.path = path
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.version = 0
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.links: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Inbound link sources per node, for walking paths back to the local host
+        self.parents: Dict[str, set] = {}
+        # subnet -> node id that discovered hosts on it hang off (gateway, local, or None until traced)
+        self.gateways: Dict[str, Optional[str]] = {}
+        # (version, "node" | "link", key) for delta responses
+        self.removed = deque(maxlen=tombstones)
+        self._touch_node(LOCAL_ID, ip=None, name="INA Server", type="server", status="active")
+
+    def _bump(self) -> int:
+        self.version += 1
+        return self.version
+
+    def _touch_node(self, node_id: str, **fields) -> Dict[str, Any]:
+        node = self.nodes.get(node_id)
+        now = time.time()
+        if node is None:
+            node = self.nodes[node_id] = {"id": node_id, "ip": node_id, "name": node_id, "type": "host",
+                                          "status": "active", "rtt_ms": None, "subnet": None}
+            node.update(fields)
+            node["version"] = self._bump()
+        else:
+            changed = {k: v for k, v in fields.items() if v is not None and node.get(k) != v}
+            # RTT drifts on every probe; only republish it when it moves by 20%
+            rtt = changed.get("rtt_ms")
+            if rtt is not None and node["rtt_ms"] and abs(rtt - node["rtt_ms"]) < 0.2 * node["rtt_ms"]:
+                changed.pop("rtt_ms")
+            if changed:
+                node.update(changed)
+                node["version"] = self._bump()
+        node["last_seen"] = now
+        return node
+
+    def _touch_link(self, source: str, target: str, rtt: Optional[float], inferred: bool = False):
+        key = (source, target)
+        link = self.links.get(key)
+        if link is None:
+            link = self.links[key] = {"source": source, "target": target, "value": 1,
+                                      "rtt_ms": rtt, "inferred": inferred, "samples": 0}
+            self.parents.setdefault(target, set()).add(source)
+            link["version"] = self._bump()
+        elif rtt is not None:
+            previous = link["rtt_ms"]
+            link["rtt_ms"] = rtt if previous is None else 0.8 * previous + 0.2 * rtt
+            if previous is None or abs(link["rtt_ms"] - previous) >= 0.2 * previous:
+                link["version"] = self._bump()
+        link["samples"] += 1
+        link["last_seen"] = time.time()
+
+    def _drop_link(self, key: Tuple[str, str]):
+        if self.links.pop(key, None) is not None:
+            self.parents.get(key[1], set()).discard(key[0])
+            self.removed.append((self._bump(), "link", key))
+
+    def _drop_node(self, node_id: str):
+        for key in [k for k in self.links if node_id in k]:
+            self._drop_link(key)
+        self.parents.pop(node_id, None)
+        if self.nodes.pop(node_id, None) is not None:
+            self.removed.append((self._bump(), "node", node_id))
+
+    def _attach(self, node_id: str, parent: str, rtt: Optional[float]):
+        """Hang a discovered host off its subnet gateway, replacing a stale inferred link"""
+        for source in list(self.parents.get(node_id, ())):
+            if source != parent and self.links[(source, node_id)]["inferred"]:
+                self._drop_link((source, node_id))
+        if not self.parents.get(node_id):
+            self._touch_link(parent, node_id, rtt, inferred=True)
+
+    def merge_path(self, result: Dict[str, Any]):
+        """Add the routers and per-hop latencies of a traceroute result"""
+        with self.lock:
+            previous, previous_rtt = LOCAL_ID, 0.0
+            destination = result["destination"]
+            answered = [h for h in result["hops"] if h.get("ip")]
+            for hop in answered:
+                ip = hop["ip"]
+                is_destination = ip == destination
+                self._touch_node(ip, type="host" if is_destination else "router",
+                                 status="active", rtt_ms=hop["avg_rtt"])
+                if ip == previous:
+                    continue
+                # Link latency is the RTT this hop adds over the previous answered one
+                rtt = max(0.0, hop["avg_rtt"] - previous_rtt) if hop["avg_rtt"] is not None else None
+                self._touch_link(previous, ip, rtt)
+                # A traced path replaces the gateway guess for this host
+                for source in list(self.parents.get(ip, ())):
+                    if source != previous and self.links[(source, ip)]["inferred"]:
+                        self._drop_link((source, ip))
+                previous, previous_rtt = ip, hop["avg_rtt"] or previous_rtt
+
+            if not result.get("reached"):
+                return
+            gateway = answered[-2]["ip"] if len(answered) > 1 else LOCAL_ID
+            for subnet in self.gateways:
+                if ipaddress.ip_address(destination) in ipaddress.ip_network(subnet, strict=False) \
+                        and self.gateways[subnet] != gateway:
+                    self.gateways[subnet] = gateway
+                    for node in self.nodes.values():
+                        if node["subnet"] == subnet and node["id"] != gateway:
+                            self._attach(node["id"], gateway, None)
+
+    def merge_device(self, subnet: str, device: Dict[str, Any]):
+        """Add or refresh one discovered host"""
+        with self.lock:
+            parent = self.gateways.setdefault(subnet, None) or LOCAL_ID
+            self._touch_node(device["ip"], name=device.get("hostname") or device["ip"],
+                             status=device.get("status", "active"), rtt_ms=device.get("rtt_ms"),
+                             subnet=subnet)
+            self._attach(device["ip"], parent, device.get("rtt_ms"))
+
+    def finish_discovery(self, subnet: str, seen: Iterable[str]):
+        """Mark the subnet's hosts missing from a completed sweep inactive and prune stale ones"""
+        seen = set(seen)
+        now = time.time()
+        with self.lock:
+            for node in list(self.nodes.values()):
+                if node["subnet"] != subnet or node["id"] in seen:
+                    continue
+                if now - node["last_seen"] > self.stale_after:
+                    self._drop_node(node["id"])
+                elif node["status"] != "inactive":
+                    node["status"] = "inactive"
+                    node["version"] = self._bump()
+
+    def has_subnet(self, subnet: str) -> bool:
+        return subnet in self.gateways
+
+    def needs_gateway(self, subnet: str) -> bool:
+        """True until a traced path into the subnet has shown its gateway"""
+        return self.gateways.get(subnet) is None
+
+    def observe_rtt(self, ip: str, rtt: Optional[float]):
+        """Refresh a known node from a probe result"""
+        with self.lock:
+            if ip in self.nodes:
+                self._touch_node(ip, status="active" if rtt is not None else "inactive", rtt_ms=rtt)
+
+    def node_links(self, node_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """A node and the links into it"""
+        with self.lock:
+            node = self.nodes.get(node_id)
+            links = [dict(self.links[(source, node_id)]) for source in self.parents.get(node_id, ())]
+            return (dict(node) if node else None), links
+
+    def _members(self, subnet: Optional[str]) -> set:
+        """Node ids inside the subnet plus every node on a path from the local host to them"""
+        if subnet is None:
+            return set(self.nodes)
+        network = ipaddress.ip_network(subnet, strict=False)
+        members = set()
+        stack = [n["id"] for n in self.nodes.values()
+                 if n["ip"] and ipaddress.ip_address(n["ip"]) in network]
+        while stack:
+            node_id = stack.pop()
+            if node_id not in members:
+                members.add(node_id)
+                stack.extend(self.parents.get(node_id, ()))
+        members.add(LOCAL_ID)
+        return members
+
+    @staticmethod
+    def _in_view(node_id: str, subnet: Optional[str], members: set) -> bool:
+        if subnet is None or node_id in members:
+            return True
+        try:
+            return ipaddress.ip_address(node_id) in ipaddress.ip_network(subnet, strict=False)
+        except ValueError:
+            return False
+
+    def view(self, subnet: Optional[str] = None, since: Optional[int] = None) -> Dict[str, Any]:
+        """Nodes and links for a subnet; with since, only what changed after that version"""
+        with self.lock:
+            members = self._members(subnet)
+            nodes = [self.nodes[m] for m in members]
+            links = [l for k, l in self.links.items() if k[0] in members and k[1] in members]
+            etag = max([n["version"] for n in nodes] + [l["version"] for l in links], default=0)
+            removed = [(v, kind, key) for v, kind, key in self.removed
+                       if self._in_view(key if kind == "node" else key[1], subnet, members)]
+            if removed:
+                etag = max(etag, removed[-1][0])
+            view = {"version": self.version, "etag": etag}
+
+            # A delta is only possible while the tombstones still cover the requested version
+            horizon = self.removed[0][0] if len(self.removed) == self.removed.maxlen else 0
+            if since is not None and since >= horizon:
+                view.update({
+                    "delta": True,
+                    "since": since,
+                    "nodes": [dict(n) for n in nodes if n["version"] > since],
+                    "links": [dict(l) for l in links if l["version"] > since],
+                    "removed": {
+                        "nodes": [key for v, kind, key in removed if kind == "node" and v > since],
+                        "links": [{"source": key[0], "target": key[1]}
+                                  for v, kind, key in removed if kind == "link" and v > since]
+                    }
+                })
+            else:
+                view.update({"delta": False, "nodes": [dict(n) for n in nodes],
+                             "links": [dict(l) for l in links]})
+            return view
+
+    def save(self):
+        """Write the graph to disk so it survives restarts"""
+        if not self.path:
+            return
+        with self.lock:
+            data = {
+                "version": self.version,
+                "nodes": list(self.nodes.values()),
+                "links": list(self.links.values()),
+                "gateways": self.gateways,
+                "removed": list(self.removed)
+            }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Restore a graph saved by save()"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Topology load error: {str(e)}")
+            return
+        with self.lock:
+            for node in data.get("nodes", []):
+                self.nodes[node["id"]] = node
+            for link in data.get("links", []):
+                self.links[(link["source"], link["target"])] = link
+                self.parents.setdefault(link["target"], set()).add(link["source"])
+            self.gateways.update(data.get("gateways", {}))
+            self.removed.extend((v, kind, tuple(key) if kind == "link" else key)
+                                for v, kind, key in data.get("removed", []))
+            # Removals bump the version too, so the saved counter can be ahead of every node and link
+            self.version = max([data.get("version", 0)]
+                               + [n["version"] for n in self.nodes.values()]
+                               + [l["version"] for l in self.links.values()])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "nodes": len(self.nodes),
+            "links": len(self.links),
+            "subnets": len(self.gateways),
+            "path": self.path
+        }
+
+
+# Create instance
+topology_graph = TopologyGraph(
+    path=os.getenv(
+        "INA_TOPOLOGY_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ina_topology.json")
+    ),
+    stale_after=float(os.getenv("INA_TOPOLOGY_STALE_AFTER", "86400"))
+)
+topology_graph.load()
@@ -1,86 +1,151 @@
 import logging
 import asyncio
+import heapq
 import json
+import os
 from typing import Dict, Any, List
 import time
 
+from proc_net import proc_net_collector
+from profiling import profiler
+from packet_capture import packet_capture
+from heavy_hitters import WindowedHeavyHitters
+
+# Sketched dimension -> key name in responses
+HEAVY_HITTER_KEYS = {"sources": "ip", "destinations": "ip", "ports": "port"}
+
 class TrafficAnalyzer:
-    def __init__(self):
+    def __init__(self, collector=proc_net_collector, capture=packet_capture, window: float = 300.0,
+                 panes: int = 10, k: int = 50):
+        self.collector = collector
+        self.capture = capture
+        # Sliding-window sketches: fixed memory however many distinct addresses show up
+        self.heavy_hitters = {
+            dimension: WindowedHeavyHitters(window, panes, k) for dimension in HEAVY_HITTER_KEYS
+        }
         self.current_traffic_data = {
             "protocols": {},
             "sources": {},
             "destinations": {}
         }
-    
+
     async def analyze_network_traffic(self) -> Dict[str, Any]:
         """Analyze current network traffic using simple tools"""
         try:
-            # Using netstat to gather connection information
-            proc = await asyncio.create_subprocess_exec(
-                "netstat", "-tn",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
-            
-            if proc.returncode != 0:
-                return {"error": f"Failed to analyze traffic: {stderr.decode()}"}
-            
-            output = stdout.decode().splitlines()
-            
-            # Reset counters
-            protocols = {"TCP": 0, "UDP": 0}
-            sources = {}
-            destinations = {}
-            
-            # Parse netstat output
-            for line in output:
-                if "ESTABLISHED" in line or "SYN_SENT" in line:
-                    parts = line.split()
-                    if len(parts) >= 5:
-                        # Extract source and destination addresses
-                        src_full = parts[3]
-                        dst_full = parts[4]
-                        
-                        src_parts = src_full.split(":")
-                        dst_parts = dst_full.split(":")
-                        
-                        if len(src_parts) >= 2 and len(dst_parts) >= 2:
-                            src_ip = src_parts[0]
-                            dst_ip = dst_parts[0]
-                            
-                            # Update counters
-                            protocols["TCP"] += 1
-                            sources[src_ip] = sources.get(src_ip, 0) + 1
-                            destinations[dst_ip] = destinations.get(dst_ip, 0) + 1
-            
+            if self.collector.available():
+                # Read the kernel socket tables directly, off the event loop
+                snapshot = await asyncio.to_thread(self.collector.collect)
+            else:
+                snapshot = await self._netstat_snapshot()
+                if "error" in snapshot:
+                    return snapshot
+
+            protocols = snapshot["protocols"]
+            sources = snapshot["sources"]
+            destinations = snapshot["destinations"]
+            await asyncio.to_thread(self.observe, snapshot)
+
             # Format for frontend display
             result = {
                 "timestamp": time.time(),
                 "protocols": [{"name": k, "value": v} for k, v in protocols.items()],
-                "topSources": sorted(
-                    [{"ip": k, "value": v} for k, v in sources.items()],
-                    key=lambda x: x["value"],
-                    reverse=True
-                )[:5],
-                "topDestinations": sorted(
-                    [{"ip": k, "value": v} for k, v in destinations.items()],
-                    key=lambda x: x["value"],
-                    reverse=True
-                )[:5]
+                "states": snapshot.get("states", {}),
+                "topSources": self._top(sources),
+                "topDestinations": self._top(destinations),
+                "heavyHitters": self.heavy_hitter_summary()
             }
-            
-            # Update current traffic data
+
+            # Byte-level bandwidth and top talkers when passive capture has run
+            if self.capture.source is not None:
+                result["capture"] = self.capture.summary()
+
+            # Update current traffic data (top entries only; the sketches hold the rest)
             self.current_traffic_data = {
                 "protocols": protocols,
-                "sources": sources,
-                "destinations": destinations
+                "sources": {e["ip"]: e["value"] for e in result["topSources"]},
+                "destinations": {e["ip"]: e["value"] for e in result["topDestinations"]}
             }
-            
+
             return result
         except Exception as e:
             logging.error(f"Traffic analysis error: {str(e)}")
             return {"error": str(e)}
 
+    def observe(self, snapshot: Dict[str, Any]):
+        """Fold one sample's source/destination/port counts into the windowed sketches"""
+        for dimension, sketch in self.heavy_hitters.items():
+            sketch.update(snapshot.get(dimension, {}))
+
+    def heavy_hitter_summary(self, n: int = 5) -> Dict[str, Any]:
+        """Windowed top-n, mean connections per sample and distinct count for each dimension"""
+        summary = {}
+        for dimension, sketch in self.heavy_hitters.items():
+            window = sketch.query(n)
+            name = HEAVY_HITTER_KEYS[dimension]
+            window["top"] = [{name: e.pop("key"), **e} for e in window["top"]]
+            summary[dimension] = window
+        return summary
+
+    def _top(self, counts: Dict[str, int], n: int = 5) -> List[Dict[str, Any]]:
+        """Return the n largest counters in frontend format"""
+        return [
+            {"ip": k, "value": v}
+            for k, v in heapq.nlargest(n, counts.items(), key=lambda item: item[1])
+        ]
+
+    async def _netstat_snapshot(self) -> Dict[str, Any]:
+        """Fallback for hosts without /proc/net: parse `netstat -tn` output"""
+        # Using netstat to gather connection information
+        with profiler.span("subprocess.netstat"):
+            proc = await asyncio.create_subprocess_exec(
+                "netstat", "-tn",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await proc.communicate()
+
+        if proc.returncode != 0:
+            return {"error": f"Failed to analyze traffic: {stderr.decode()}"}
+
+        output = stdout.decode().splitlines()
+
+        # Reset counters
+        protocols = {"TCP": 0, "UDP": 0}
+        sources = {}
+        destinations = {}
+        ports = {}
+
+        # Parse netstat output
+        for line in output:
+            if "ESTABLISHED" in line or "SYN_SENT" in line:
+                parts = line.split()
+                if len(parts) >= 5:
+                    # Extract source and destination addresses (port is after the last colon)
+                    src_parts = parts[3].rsplit(":", 1)
+                    dst_parts = parts[4].rsplit(":", 1)
+
+                    if len(src_parts) == 2 and len(dst_parts) == 2:
+                        src_ip = src_parts[0]
+                        dst_ip = dst_parts[0]
+
+                        # Update counters
+                        protocols["TCP"] += 1
+                        sources[src_ip] = sources.get(src_ip, 0) + 1
+                        destinations[dst_ip] = destinations.get(dst_ip, 0) + 1
+                        if src_parts[1].isdigit() and dst_parts[1].isdigit():
+                            port = f"TCP/{min(int(src_parts[1]), int(dst_parts[1]))}"
+                            ports[port] = ports.get(port, 0) + 1
+
+        return {
+            "protocols": protocols,
+            "sources": sources,
+            "destinations": destinations,
+            "ports": ports
+        }
+
 # Create instance
-traffic_analyzer = TrafficAnalyzer()
\ No newline at end of file
+traffic_analyzer = TrafficAnalyzer(
+    window=float(os.getenv("INA_SKETCH_WINDOW", "300")),
+    panes=int(os.getenv("INA_SKETCH_PANES", "10")),
+    k=int(os.getenv("INA_SKETCH_TOP_K", "50"))
+)
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+class TrafficSampler:
+    """Refreshes traffic analysis in the background and serves the latest snapshot"""
+
+    def __init__(self, analyzer, interval: float = 5.0):
+        self.analyzer = analyzer
+        self.interval = interval
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.sampled_at = 0.0
+        self.samples = 0
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._refreshing: Optional[asyncio.Future] = None
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call listener(snapshot) once for every fresh sample"""
+        self.listeners.append(listener)
+
+    def start(self):
+        """Start the background sampling task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background sampling task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Take a new sample; concurrent callers share a single analysis run"""
+        refreshing = self._refreshing
+        if refreshing is not None:
+            try:
+                return await asyncio.shield(refreshing)
+            except asyncio.CancelledError:
+                # The run we joined died with its caller (e.g. a client disconnect): run our own
+                if not refreshing.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.refresh()
+
+        self._refreshing = asyncio.get_running_loop().create_future()
+        try:
+            result = await self.analyzer.analyze_network_traffic()
+            if "error" not in result:
+                self.snapshot = result
+                self.sampled_at = time.monotonic()
+                self.samples += 1
+                for listener in self.listeners:
+                    try:
+                        listener(result)
+                    except Exception as e:
+                        logging.error(f"Traffic sample listener error: {str(e)}")
+            self._refreshing.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            self._refreshing.cancel()
+            raise
+        except Exception as e:
+            logging.error(f"Traffic sampling error: {str(e)}")
+            result = {"error": str(e)}
+            self._refreshing.set_result(result)
+            return result
+        finally:
+            self._refreshing = None
+
+    async def get(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Return the latest snapshot with its age, refreshing only if it is too old"""
+        max_age = max_age if max_age is not None else self.interval * 2
+        if self.snapshot is None or self.age() > max_age:
+            result = await self.refresh()
+            if "error" in result:
+                return result
+        return {**self.snapshot, "age": round(self.age(), 3)}
+
+    def age(self) -> float:
+        """Seconds since the latest successful sample"""
+        return time.monotonic() - self.sampled_at if self.snapshot else float("inf")
+
+    def stats(self) -> Dict[str, Any]:
+        """Report sampler state"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "samples": self.samples,
+            "age": round(self.age(), 3) if self.snapshot else None
+        }
@@ -6,7 +6,7 @@ import {
   getHistoricalLogs,
   parsePingData,
   parseTracerouteData,
-  discoverNetwork,
+  streamNetworkDiscovery,
   analyzeTraffic,
   getSecurityAlerts,
   getDashboardSummary,
@@ -366,11 +366,26 @@ const fetchNetworkTopology = async (subnet) => {
     toast.info(`Starting network discovery on ${subnet}...`);
     
     try {
-      const result = await discoverNetwork(subnet);
+      // Render devices as they answer instead of waiting for the full sweep
+      setDiscoveryResults({ subnet, total_hosts: 0, discovered_hosts: 0, probed: 0, devices: [] });
+      const result = await streamNetworkDiscovery(subnet, {
+        onHost: (device) =>
+          setDiscoveryResults((prev) => ({
+            ...prev,
+            discovered_hosts: prev.discovered_hosts + 1,
+            devices: [...prev.devices, device],
+          })),
+        onProgress: (progress) =>
+          setDiscoveryResults((prev) => ({
+            ...prev,
+            total_hosts: progress.total_hosts,
+            probed: progress.probed,
+          })),
+      });
       if (result.error) {
         toast.error(`Network discovery failed: ${result.error}`);
       } else {
-        setDiscoveryResults(result);
+        setDiscoveryResults((prev) => ({ ...prev, ...result }));
         toast.success(`Found ${result.discovered_hosts} devices on ${subnet}`);
       }
     } catch (error) {
@@ -96,6 +96,25 @@ export const discoverNetwork = async (subnet) => {
   }
 };
 
+// 🆕 Streaming Network Discovery (Server-Sent Events)
+// Calls onHost for each live device as soon as it answers and onProgress with
+// scan counters; resolves with the final summary when the sweep completes.
+export const streamNetworkDiscovery = (subnet, { onHost, onProgress } = {}) =>
+  new Promise((resolve) => {
+    const source = new EventSource(`${BASE_URL}/network/discover/stream/${subnet}`);
+    source.addEventListener("host", (e) => onHost && onHost(JSON.parse(e.data).device));
+    source.addEventListener("progress", (e) => onProgress && onProgress(JSON.parse(e.data)));
+    source.addEventListener("done", (e) => {
+      source.close();
+      resolve(JSON.parse(e.data));
+    });
+    source.addEventListener("error", (e) => {
+      source.close();
+      console.error("Network discovery stream error:", e);
+      resolve({ error: (e.data && JSON.parse(e.data).error) || "Failed to perform network discovery." });
+    });
+  });
+
 // 🆕 Get Device Details
 export const getDeviceDetails = async (ip) => {
   try {